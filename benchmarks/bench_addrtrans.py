@@ -0,0 +1,86 @@
+"""
+Micro-benchmark of translating ppns to machine addresses.
+
+    python -m benchmarks.bench_addrtrans [pages per call] [repeat]
+"""
+import sys
+import time
+
+import config
+from wiscsim import addrtrans
+
+
+def loop_location(page_hierarchy, page_no):
+    """
+    The per-page loop that Controller.physical_to_machine_page() used
+    """
+    location = [0] * (len(page_hierarchy) + 1)
+    for i, count in enumerate(page_hierarchy):
+        location[i] = page_no / count
+        page_no = page_no % count
+    location[-1] = page_no
+    return location
+
+
+def pages_per_sec(translate, ppn_lists, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        for ppns in ppn_lists:
+            translate(ppns)
+        duration = time.time() - start
+        if best is None or duration < best:
+            best = duration
+    return sum(len(ppns) for ppns in ppn_lists) / best
+
+
+def main():
+    pages_per_call = 256
+    repeat = 5
+    if len(sys.argv) > 1:
+        pages_per_call = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        repeat = int(sys.argv[2])
+
+    conf = config.ConfigNCQFTL()
+    flash = conf['flash_config']
+    n_pages_per_block = flash['n_pages_per_block']
+    n_pages_per_plane = n_pages_per_block * flash['n_blocks_per_plane']
+    n_pages_per_chip = n_pages_per_plane * flash['n_planes_per_chip']
+    n_pages_per_package = n_pages_per_chip * flash['n_chips_per_package']
+    n_pages_per_channel = n_pages_per_package * \
+            flash['n_packages_per_channel']
+    hierarchy = [n_pages_per_channel, n_pages_per_package, n_pages_per_chip,
+            n_pages_per_plane, n_pages_per_block]
+    n_pages = n_pages_per_channel * flash['n_channels_per_dev']
+
+    step = max(n_pages / 2000, pages_per_call)
+    ppn_lists = [range(start, start + pages_per_call)
+            for start in range(0, n_pages - pages_per_call, step)][:2000]
+
+    python = addrtrans.AddressTranslator(hierarchy, use_numpy=False)
+    vectorized = addrtrans.AddressTranslator(hierarchy)
+
+    loop = pages_per_sec(
+            lambda ppns: [loop_location(hierarchy, ppn) for ppn in ppns],
+            ppn_lists, repeat)
+    plain = pages_per_sec(python.locations, ppn_lists, repeat)
+    fast = pages_per_sec(vectorized.locations, ppn_lists, repeat)
+    counts_plain = pages_per_sec(python.channel_counts, ppn_lists, repeat)
+    counts_fast = pages_per_sec(vectorized.channel_counts, ppn_lists, repeat)
+
+    print 'pages per call:', pages_per_call
+    print 'numpy:', vectorized.use_numpy
+    print 'locations, old loop:  {:>12.0f} pages/sec'.format(loop)
+    print 'locations, python:    {:>12.0f} pages/sec ({:.2f}x)'.format(
+            plain, plain / loop)
+    print 'locations, vectorized:{:>12.0f} pages/sec ({:.2f}x)'.format(
+            fast, fast / loop)
+    print 'channel counts, python:     {:>12.0f} pages/sec'.format(
+            counts_plain)
+    print 'channel counts, vectorized: {:>12.0f} pages/sec ({:.2f}x)'.format(
+            counts_fast, counts_fast / counts_plain)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+"""
+Micro-benchmark of the per-request overhead of Ssd._process, i.e. the time
+spent on a host event outside of the FTL, and of the dispatching part of it.
+
+    python -m benchmarks.bench_dispatch [n events] [repeat]
+"""
+import sys
+import time
+
+import simpy
+
+from commons import *
+from utilities import utils
+from wiscsim import dftldes, hostevent, ssdframework
+from wiscsim.ftlsim_commons import NCQSingleQueue
+
+
+class NullFtl(object):
+    """
+    An FTL that takes no time, so only the dispatching is measured
+    """
+    def read_ext(self, extent):
+        return
+        yield
+
+    def write_ext(self, extent):
+        return
+        yield
+
+    def discard_ext(self, extent):
+        return
+        yield
+
+    def is_cleaning_needed(self):
+        return False
+
+
+class NullFtlSsd(ssdframework.Ssd):
+    def _create_ftl(self):
+        return NullFtl()
+
+
+# the operations Ssd._process compared a data event with, in order, when it
+# was a chain of elifs
+ELIF_CHAIN = [OP_ENABLE_RECORDER, OP_DISABLE_RECORDER, OP_WORKLOADSTART,
+        OP_SHUT_SSD, OP_BARRIER, OP_NOOP, OP_CALC_GC_DURATION,
+        OP_CALC_NON_MERGE_GC_DURATION, OP_FLUSH_TRANS_CACHE,
+        OP_PURGE_TRANS_CACHE, OP_DROP_TRANS_CACHE, OP_REC_TIMESTAMP,
+        OP_REC_FLASH_OP_CNT, OP_REC_FOREGROUND_OP_CNT, OP_REC_CACHE_HITMISS,
+        OP_END_SSD_PROCESS, OP_CLEAN, OP_REC_BW, OP_NON_MERGE_CLEAN,
+        OP_READ, OP_WRITE, OP_DISCARD]
+
+
+def elif_chain_dispatch(conf, host_event):
+    operation = host_event.get_operation()
+    for op in ELIF_CHAIN:
+        if operation == op:
+            break
+    return host_event.get_lpn_extent(conf)
+
+
+def table_dispatch(ssd, host_event):
+    ssd._data_handlers.get(host_event.operation)
+    return ssd.lpn_extent(host_event)
+
+
+def usec_per_dispatch(dispatch, events, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        for event in events:
+            dispatch(event)
+        duration = time.time() - start
+        if best is None or duration < best:
+            best = duration
+    return best * 1e6 / len(events)
+
+
+def create_config():
+    conf = dftldes.Config()
+    conf['ftl_type'] = 'dftldes'
+    conf['flash_config']['n_channels_per_dev'] = 4
+    conf['SSDFramework']['ncq_depth'] = 8
+    utils.set_exp_metadata(conf, save_data=False,
+            expname='bench_dispatch', subexpname='bench_dispatch')
+    conf.n_cache_entries = conf.n_mapping_entries_per_page
+    conf.set_flash_num_blocks_by_bytes(128*MB)
+    utils.runtime_update(conf)
+    return conf
+
+
+def create_events(conf, n_events):
+    """
+    Mostly 4KB reads and writes, with a control event in every 16 events
+    """
+    events = []
+    operations = [OP_WRITE, OP_READ, OP_WRITE, OP_DISCARD]
+    for i in range(n_events):
+        if i % 16 == 15:
+            events.append(hostevent.ControlEvent(OP_NOOP))
+        else:
+            events.append(hostevent.Event(conf['sector_size'], 1,
+                operations[i % len(operations)], (i % 4096) * 4*KB, 4*KB))
+    return events
+
+
+def feed(env, ncq, events):
+    for event in events:
+        yield ncq.queue.put(event)
+    for i in range(ncq.ncq_depth):
+        yield ncq.queue.put(hostevent.ControlEvent(OP_END_SSD_PROCESS))
+
+
+def usec_per_request(conf, events, repeat):
+    best = None
+    for _ in range(repeat):
+        env = simpy.Environment()
+        ncq = NCQSingleQueue(conf['SSDFramework']['ncq_depth'], env)
+        ssd = NullFtlSsd(conf, env, ncq, None)
+
+        env.process(feed(env, ncq, events))
+        for i in range(ncq.ncq_depth):
+            env.process(ssd._process(i))
+
+        start = time.time()
+        env.run()
+        duration = time.time() - start
+        if best is None or duration < best:
+            best = duration
+    return best * 1e6 / len(events)
+
+
+def main():
+    n_events = 100000
+    repeat = 3
+    if len(sys.argv) > 1:
+        n_events = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        repeat = int(sys.argv[2])
+
+    conf = create_config()
+    events = create_events(conf, n_events)
+
+    data_events = [e for e in events if e.get_type() == 'Event']
+    env = simpy.Environment()
+    ssd = NullFtlSsd(conf, env,
+            NCQSingleQueue(conf['SSDFramework']['ncq_depth'], env), None)
+    chain = usec_per_dispatch(lambda e: elif_chain_dispatch(conf, e),
+            data_events, repeat)
+    table = usec_per_dispatch(lambda e: table_dispatch(ssd, e),
+            data_events, repeat)
+
+    print 'events:', n_events
+    print 'per-request overhead: {:.2f} usec'.format(
+            usec_per_request(conf, events, repeat))
+    print 'dispatch of data events:'
+    print '  elif chain + get_lpn_extent: {:.2f} usec'.format(chain)
+    print '  handler table + lpn_extent:  {:.2f} usec ({:.2f}x)'.format(
+            table, chain / table)
+
+
+if __name__ == '__main__':
+    main()
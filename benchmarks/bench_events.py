@@ -0,0 +1,66 @@
+"""
+Micro-benchmark of converting event file lines to Events.
+
+    python -m benchmarks.bench_events [event file] [repeat]
+"""
+import sys
+import time
+
+import config
+from wiscsim import hostevent
+
+
+DEFAULT_EVENT_FILE = "tests/testdata/sqlitewal-update/subexp-7928737328932659543-ext4-10-07-23-50-10--2726320246496492803/blkparse-events-for-ftlsim.txt"
+
+
+class DictEvent(object):
+    """
+    An event with a __dict__, i.e. what Event looked like before __slots__
+    """
+    def __init__(self, event):
+        for name in hostevent.Event.__slots__[:-2]:
+            setattr(self, name, getattr(event, name))
+
+
+def events_per_sec(convert, lines, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        for line in lines:
+            convert(line)
+        duration = time.time() - start
+        if best is None or duration < best:
+            best = duration
+    return len(lines) / best
+
+
+def main():
+    path = DEFAULT_EVENT_FILE
+    repeat = 5
+    if len(sys.argv) > 1:
+        path = sys.argv[1]
+    if len(sys.argv) > 2:
+        repeat = int(sys.argv[2])
+
+    conf = config.ConfigNCQFTL()
+    lines = list(hostevent.FileLineIterator(path))
+    event_iter = hostevent.EventIterator(conf, lines)
+
+    slow = events_per_sec(event_iter.str_to_event_slow, lines, repeat)
+    fast = events_per_sec(event_iter.str_to_event, lines, repeat)
+
+    event = event_iter.str_to_event(lines[0])
+    dict_event = DictEvent(event)
+    slotted_bytes = sys.getsizeof(event)
+    dict_bytes = sys.getsizeof(dict_event) + sys.getsizeof(dict_event.__dict__)
+
+    print 'events:', len(lines)
+    print 'dict + Event(**kwargs): {:>12.0f} events/sec'.format(slow)
+    print 'precompiled decoder:    {:>12.0f} events/sec ({:.2f}x)'.format(
+            fast, fast / slow)
+    print 'bytes per event object: {} with __dict__, {} with __slots__'\
+            .format(dict_bytes, slotted_bytes)
+
+
+if __name__ == '__main__':
+    main()
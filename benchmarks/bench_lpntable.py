@@ -0,0 +1,93 @@
+"""
+Micro-benchmark of inserting mappings into a half full dftldes.LpnTable,
+as MappingCache.update() does for an lpn not in the cache.
+
+    python -m benchmarks.bench_lpntable [n rows] [n inserts] [repeat]
+
+The default 2**20 rows are the mapping cache of 2GB of data in 2KB pages.
+"""
+import collections
+import sys
+import time
+
+from wiscsim import dftldes
+from wiscsim.dftldes import FREE, FREE_AND_LOCKED
+
+
+class ScanLpnTable(dftldes.LpnTable):
+    """
+    The LpnTable that counted and searched the rows on each call
+    """
+    def _count_states(self):
+        counter = collections.Counter()
+        for row in self._rows:
+            counter[row.state] += 1
+        return counter
+
+    def n_free_rows(self):
+        return self._count_states()[FREE]
+
+    def lock_free_row(self):
+        for row in self._rows:
+            if row.state == FREE:
+                row.state = FREE_AND_LOCKED
+                return row.rowid
+        return None
+
+    def lock_free_rows(self, n):
+        row_ids = []
+        for row in self._rows:
+            if row.state == FREE:
+                row.state = FREE_AND_LOCKED
+                row_ids.append(row.rowid)
+                if len(row_ids) == n:
+                    break
+        return row_ids
+
+
+def half_full_table(cls, n_rows):
+    table = cls(n_rows)
+    row_ids = table.lock_free_rows(n_rows / 2)
+    for lpn, rowid in enumerate(row_ids):
+        table.add_lpn(rowid, lpn, lpn, dirty=False)
+    return table
+
+
+def usec_per_insert(cls, n_rows, n_inserts, repeat):
+    best = None
+    for _ in range(repeat):
+        table = half_full_table(cls, n_rows)
+        start = time.time()
+        for lpn in range(n_rows, n_rows + n_inserts):
+            if table.n_free_rows() > 0:
+                rowid = table.lock_free_row()
+                table.add_lpn(rowid, lpn, lpn, dirty=True)
+        duration = time.time() - start
+        if best is None or duration < best:
+            best = duration
+    return best * 1e6 / n_inserts
+
+
+def main():
+    n_rows = 2**20
+    n_inserts = 10
+    repeat = 1
+    if len(sys.argv) > 1:
+        n_rows = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        n_inserts = int(sys.argv[2])
+    if len(sys.argv) > 3:
+        repeat = int(sys.argv[3])
+
+    scan = usec_per_insert(ScanLpnTable, n_rows, n_inserts, repeat)
+    indexed = usec_per_insert(dftldes.LpnTable, n_rows, n_inserts, repeat)
+
+    print 'rows: {}, inserts: {}'.format(n_rows, n_inserts)
+    print 'insert into a half full table:'
+    print '  scanning rows:       {:.2f} usec'.format(scan)
+    print '  state counts + stack: {:.2f} usec ({:.0f}x)'.format(
+            indexed, scan / indexed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Memory per entry and time per lookup of a full dftldes.LpnTable and
+dftldes.CompactLpnTable.
+
+    python -m benchmarks.bench_lpntable_memory [n rows] [n lookups]
+
+Each table is built in its own process, and its memory is the growth of
+the process' resident set (Linux only).
+"""
+import random
+import subprocess
+import sys
+import time
+
+from wiscsim import dftldes
+
+
+CLASSES = ['LpnTable', 'CompactLpnTable']
+
+
+def rss_bytes():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) * 1024
+    raise RuntimeError("No VmRSS in /proc/self/status")
+
+
+def full_table(cls, n_rows):
+    table = cls(n_rows)
+    row_ids = table.lock_free_rows(n_rows)
+    for lpn, rowid in enumerate(row_ids):
+        table.add_lpn(rowid, lpn, lpn, dirty=False)
+    return table
+
+
+def measure(class_name, n_rows, n_lookups):
+    """
+    Bytes per entry and usec per lookup
+    """
+    cls = getattr(dftldes, class_name)
+    start_rss = rss_bytes()
+    table = full_table(cls, n_rows)
+    bytes_per_entry = (rss_bytes() - start_rss) / float(n_rows)
+
+    rand = random.Random(0)
+    lpns = [rand.randrange(n_rows) for _ in range(n_lookups)]
+    start = time.time()
+    for lpn in lpns:
+        table.lpn_to_ppn(lpn)
+    duration = time.time() - start
+    return bytes_per_entry, duration * 1e6 / n_lookups
+
+
+def main():
+    n_rows = 2**20
+    n_lookups = 100000
+    if len(sys.argv) > 1:
+        n_rows = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        n_lookups = int(sys.argv[2])
+
+    if len(sys.argv) > 3:
+        # child process
+        print '{} {}'.format(*measure(sys.argv[3], n_rows, n_lookups))
+        return
+
+    print 'rows: {}, lookups: {}'.format(n_rows, n_lookups)
+    for class_name in CLASSES:
+        output = subprocess.check_output([sys.executable, '-m',
+            'benchmarks.bench_lpntable_memory', str(n_rows), str(n_lookups),
+            class_name])
+        bytes_per_entry, usec = [float(v) for v in output.split()]
+        print '  {:16} {:6.0f} bytes/entry {:6.2f} usec/lookup'.format(
+                class_name, bytes_per_entry, usec)
+
+
+if __name__ == '__main__':
+    main()
@@ -38,6 +38,8 @@ OP_REC_CACHE_HITMISS = 'OP_REC_CACHE_HITMISS'
 OP_NON_MERGE_CLEAN = 'OP_NON_MERGE_CLEAN'
 OP_CALC_NON_MERGE_GC_DURATION = 'OP_CALC_NON_MERGE_GC_DURATION'
 OP_REC_BW = 'OP_REC_BW'
+OP_CHECKPOINT = 'OP_CHECKPOINT'
+OP_SAMPLING = 'OP_SAMPLING'
 
 TAG_BACKGROUND = "BACKGROUND"
 TAG_FOREGROUND = "FOREGROUND"
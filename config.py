@@ -60,15 +60,25 @@ class Config(dict):
         with open(file_path, "w") as f:
             json.dump(self, f, indent=4)
 
+    def _blkparse_output_ext(self):
+        "'.gz', '.bz2' or '.xz' if blkparse output is compressed"
+        compression = self.get('compress_blkparse_output', None)
+        if compression is None:
+            return ''
+        return '.' + compression.lstrip('.')
+
     def get_blkparse_result_path(self):
-        return os.path.join(self['result_dir'], 'blkparse-output.txt')
+        return os.path.join(self['result_dir'],
+            'blkparse-output.txt' + self._blkparse_output_ext())
 
     def get_blkparse_result_path_aging(self):
-        return os.path.join(self['result_dir'], 'blkparse-output-aging.txt')
+        return os.path.join(self['result_dir'],
+            'blkparse-output-aging.txt' + self._blkparse_output_ext())
 
     def get_blkparse_result_path_mkfs(self):
         "for file system making"
-        return os.path.join(self['result_dir'], 'blkparse-output-mkfs.txt')
+        return os.path.join(self['result_dir'],
+            'blkparse-output-mkfs.txt' + self._blkparse_output_ext())
 
     def get_blkparse_result_table_path(self):
         return os.path.join(self['result_dir'], 'blkparse-output-table.txt')
@@ -204,6 +214,15 @@ class Config(dict):
             "ftl_type"              : "nkftl2",
             "sector_size"           : 512,
             "sort_block_trace"      : True,
+            # bytes of memory used to sort block trace. None: sort in memory
+            "sort_block_trace_mem_budget": None,
+            # number of processes to convert blkparse output to events
+            "blkparse_workers"      : 1,
+            # compress blkparse output while capturing: None, 'gz', 'bz2'
+            # or 'xz'
+            "compress_blkparse_output": None,
+            # parse blktrace binary output directly, without blkparse
+            "blktrace_binary_output": False,
             "trace_issue_and_complete": False,
 
             ############## For wiscsim ######
@@ -256,6 +275,63 @@ class Config(dict):
 
             "event_file_column_names"    : ['pid', 'action', 'operation', 'offset', 'size',
                     'timestamp', 'pre_wait_time', 'sync'],
+            # also convert event files to the binary trace format
+            # (wiscsim/bintrace.py), which is much faster to read
+            "binary_event_file"     : False,
+            # directory of decoded event files shared by simulations of the
+            # same trace (wiscsim/tracecache.py). None: no cache
+            "trace_cache_dir"       : None,
+            "trace_cache_max_bytes" : 10*GB,
+            # events between two entries of the seek index of an event file
+            "trace_index_interval"  : 10000,
+            # 'Controller3' simulates every flash operation with SimPy
+            # processes. 'ControllerBatched' takes each channel once per
+            # call for all of the call's operations on it.
+            # 'ControllerAnalytical' computes Controller3's timing from the
+            # time each channel becomes free, which is much faster.
+            "flash_controller_class": 'Controller3',
+            # merge adjacent, contiguous requests of the same operation
+            # before they reach the simulated host (wiscsim/coalesce.py),
+            # like the block layer's plug merging. Faster, but not exact.
+            "coalesce_requests"     : False,
+            "coalesce_max_bytes"    : 512*KB,
+            # max time between two merged requests, None: no limit
+            "coalesce_window_sec"   : 0.001,
+            # simulate while the workload runs, from blkparse's stdout,
+            # instead of from event files (workrunner/onlinesim.py)
+            "online_simulation"     : False,
+            # the simulator is fed batches of events through a queue of at
+            # most online_queue_batches batches
+            "online_batch_events"   : 1000,
+            "online_queue_batches"  : 256,
+            # blkparse output is not strictly in time order; events are
+            # sorted within a window of this many events
+            "online_reorder_events" : 1000,
+            # save the simulated device after the mkfs events to this file
+            # (wiscsim/checkpoint.py). Simulations with
+            # checkpoint_restore_path set to it skip the mkfs events and
+            # start from the saved device. Only for SimulatorDESNew, the
+            # other simulators refuse both options.
+            "checkpoint_save_path"  : None,
+            "checkpoint_restore_path": None,
+            # write events/sec, simulated ns/sec, trace bytes read and the
+            # ETA to result_dir/progress.log every this many wall-clock
+            # seconds (wiscsim/progress.py). None: no progress log.
+            "progress_interval_sec" : 10,
+            # run the events before OP_ENABLE_RECORDER (mkfs, aging) in
+            # the functional mode: mappings, OOB and block pools are
+            # updated with no simulated time and no flash channel
+            # (wiscsim/functional.py). Only for SimulatorDESNew.
+            "functional_warmup"     : False,
+            # SimulatorDESSampled (wiscsim/sampling.py): after
+            # OP_ENABLE_RECORDER, every sampling_period data events,
+            # sampling_warmup events are simulated in detail, then
+            # sampling_window events are measured and the rest run in the
+            # functional mode. Estimates are given at sampling_confidence.
+            "sampling_period"       : None,
+            "sampling_window"       : 1000,
+            "sampling_warmup"       : 200,
+            "sampling_confidence"   : 0.95,
 
             "fs_mount_point"        : "/mnt/fsonloop",
             "mnt_opts" : {
@@ -339,6 +415,10 @@ class Config(dict):
             "lba_workload_configs"  : {},
 
             ############# PERF #####################
+            # profile Simulator.run with cProfile and write the wall time of
+            # each subsystem (trace ingest, mapping cache, gc, ...) to
+            # result_dir/profile-subsystems.txt (wiscsim/profiling.py)
+            "profile_simulation" : False,
             "wrap_by_perf" : False,
             "perf" : {
                     "perf_path"         : "perf",
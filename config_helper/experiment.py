@@ -8,6 +8,7 @@ from utilities.utils import *
 from commons import *
 from config import MountOption as MOpt
 from config import LBAGENERATOR
+from pyreuse.sysutils import tracestats
 
 class Experiment(object):
     def __init__(self, para):
@@ -49,6 +50,9 @@ class Experiment(object):
 
         self.conf['sort_block_trace'] = self.para.sort_block_trace
 
+        self.conf['trace_cache_dir'] = getattr(self.para, 'trace_cache_dir',
+                None)
+
         if self.para.filesystem == 'ext4-nj':
             self.conf['filesystem'] = 'ext4'
 
@@ -137,6 +141,8 @@ class Experiment(object):
         self.conf['wear_leveling_factor'] = self.para.wear_leveling_factor
         self.conf['wear_leveling_diff'] = self.para.wear_leveling_diff
         self.conf['only_get_traffic'] = self.para.only_get_traffic
+        self.conf['flash_controller_class'] = getattr(self.para,
+                'flash_controller_class', 'Controller3')
 
         if self.para.ftl == 'dftldes':
             self.conf['simulator_class'] = 'SimulatorDESNew'
@@ -147,6 +153,8 @@ class Experiment(object):
             self.conf.cache_mapped_data_bytes = int(self.para.cache_mapped_data_bytes)
             self.conf['write_gc_log'] = self.para.write_gc_log
             self.conf['n_gc_procs'] = self.para.n_gc_procs
+            self.conf['lpn_table_class'] = getattr(self.para,
+                    'lpn_table_class', 'LpnTableMvpn')
 
         elif self.para.ftl == 'nkftl2':
             self.conf['simulator_class'] = 'SimulatorDESNew'
@@ -186,6 +194,14 @@ class Experiment(object):
         else:
             raise NotImplementedError()
 
+        if getattr(self.para, 'sampling_period', None) is not None:
+            # sampled simulation of the workload, see wiscsim/sampling.py
+            self.conf['simulator_class'] = 'SimulatorDESSampled'
+            for name in ['sampling_period', 'sampling_window',
+                    'sampling_warmup', 'sampling_confidence']:
+                if hasattr(self.para, name):
+                    self.conf[name] = getattr(self.para, name)
+
         logicsize_mb = self.conf['dev_size_mb']
         self.conf.set_flash_num_blocks_by_bytes(
                 int(logicsize_mb * 2**20 * self.para.over_provisioning))
@@ -193,10 +209,12 @@ class Experiment(object):
     def check_config(self):
         if self.conf['ftl_type'] == 'dftldes':
             assert isinstance(self.conf, wiscsim.dftldes.Config)
-            assert self.conf['simulator_class'] == 'SimulatorDESNew'
+            assert self.conf['simulator_class'] in ('SimulatorDESNew',
+                    'SimulatorDESSampled')
         elif self.conf['ftl_type'] == 'nkftl2':
             assert isinstance(self.conf, wiscsim.nkftl2.Config)
-            assert self.conf['simulator_class'] == 'SimulatorDESNew'
+            assert self.conf['simulator_class'] in ('SimulatorDESNew',
+                    'SimulatorDESSampled')
         elif self.conf['ftl_type'] == 'dftlext':
             assert isinstance(self.conf, wiscsim.dftlext.Config)
             assert self.conf['simulator_class'] == 'SimulatorNonDESSpeed'
@@ -218,6 +236,9 @@ class Experiment(object):
                 expname = self.para.expname,
                 subexpname = 'subexp-' + str(hash(chain_items_as_filename(self.para))))
         runtime_update(self.conf)
+        # set by sweep.SweepExecutor to keep the results of each point apart
+        if getattr(self.para, 'result_dir', None) is not None:
+            self.conf['result_dir'] = self.para.result_dir
 
         self.check_config()
 
@@ -288,6 +309,8 @@ def get_shared_para_dict(expname, lbabytes):
             'rm_blkparse_events': [False],
             'sort_block_trace': [True],
             'n_gc_procs': [16],
+            # decoded traces shared by all simulations of a sweep
+            'trace_cache_dir': ['/tmp/trace-cache'],
             }
     return para_dict
 
@@ -330,6 +353,11 @@ class StatsMixin(object):
         else:
             filepath = os.path.join(self.conf['result_dir'],
                     'blkparse-events-for-ftlsim.txt')
+            summary = tracestats.load_stats(filepath)
+            if summary is not None:
+                return summary['ops']['write']['bytes']
+
+            # no statistics were written with this event file
             with open(filepath, 'rb') as f:
                 reader = csv.reader(f, delimiter=' ')
                 total = 0
@@ -82,17 +82,24 @@ class EventFileSets(object):
         pairs = []
         for root, dirs, files in os.walk(self.dirpath, topdown=False):
             for name in files:
-                if name == 'blkparse-events-for-ftlsim-mkfs.txt':
-                    mkfs_path = os.path.join(root, 'blkparse-events-for-ftlsim-mkfs.txt')
-                    ftlsim_path = os.path.join(root, 'blkparse-events-for-ftlsim.txt')
-
-                    confjson = self._get_confjson(root)
-                    d = {'mkfs_path': mkfs_path,
-                         'ftlsim_path': ftlsim_path,
-                         'original_config': confjson,
-                         }
-
-                    pairs.append(d)
+                # event files may be compressed
+                for ext in ('', '.gz', '.bz2', '.xz'):
+                    if name == 'blkparse-events-for-ftlsim-mkfs.txt' + ext:
+                        break
+                else:
+                    continue
+
+                mkfs_path = os.path.join(root, name)
+                ftlsim_path = os.path.join(root,
+                        'blkparse-events-for-ftlsim.txt' + ext)
+
+                confjson = self._get_confjson(root)
+                d = {'mkfs_path': mkfs_path,
+                     'ftlsim_path': ftlsim_path,
+                     'original_config': confjson,
+                     }
+
+                pairs.append(d)
         return pairs
 
     def _get_confjson(self, subexp_path):
@@ -0,0 +1,224 @@
+"""
+Run the parameter points of a sweep (e.g. rule_parameter.ParaDict) in
+parallel processes and collect one summary row per point.
+
+    executor = SweepExecutor('/tmp/results/mysweep', n_workers=8,
+            mem_limit_mb=4096)
+    executor.run(rule_parameter.ParaDict(expname, trace_expnames, rule))
+
+Each point runs in a process of its own with result_dir
+<sweep_dir>/point-<index>[-try<n>], so a point that crashes, or is killed
+for running out of memory, only fails itself. Failed points are retried up
+to max_attempts times and are then marked failed in the table
+<sweep_dir>/summary.txt.
+"""
+import collections
+import os
+import resource
+import sys
+import time
+import traceback
+import multiprocessing
+
+from commons import *
+from utilities import utils
+import experiment
+
+
+SUMMARY_COLUMNS = ['write_amplification', 'n_erases', 'gc_page_moves',
+        'gc_merges', 'mapping_cache_hit_ratio', 'simulation_duration',
+        'workload_duration_sec', 'events_per_sec', 'wall_time_sec']
+
+
+def _ratio(a, b):
+    if b == 0:
+        return 'NA'
+    return float(a) / b
+
+
+def summarize(result_dir):
+    """
+    Summary of the simulation results in result_dir
+    """
+    rec = utils.load_json(os.path.join(result_dir, 'recorder.json'))
+    conf = utils.load_json(os.path.join(result_dir, 'config.json'))
+    counters = rec['general_accumulator']
+
+    def count(counter_name, item):
+        return counters.get(counter_name, {}).get(item, 0)
+
+    page_size = conf['flash_config']['page_size']
+    cache = counters.get('Mapping_Cache', {})
+    throughput = rec.get('simulation_throughput', {})
+
+    return {
+        'write_amplification': _ratio(
+            count('flash_ops', OP_WRITE) * page_size,
+            count('traffic', 'write')),
+        'n_erases': count('flash_ops', OP_ERASE),
+        'gc_page_moves': count('gc', 'user.page.moves') +
+            count('gc', 'trans.page.moves'),
+        'gc_merges': sum(counters.get('garbage_collection', {}).values()),
+        'mapping_cache_hit_ratio': _ratio(cache.get('hit', 0),
+            cache.get('hit', 0) + cache.get('miss', 0)),
+        'simulation_duration': rec.get('simulation_duration', 'NA'),
+        'workload_duration_sec': rec.get('workload_duration_sec', 'NA'),
+        'events_per_sec': throughput.get('events_per_sec', 'NA'),
+        }
+
+
+def _run_point(run_func, para, result_dir, mem_limit_mb):
+    if mem_limit_mb is not None:
+        limit = mem_limit_mb * MB
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+    try:
+        para = dict(para, result_dir=result_dir)
+        run_func(para)
+    except BaseException:
+        with open(os.path.join(result_dir, 'error.txt'), 'w') as f:
+            f.write(traceback.format_exc())
+        sys.exit(1)
+
+
+class _Point(object):
+    def __init__(self, index, para):
+        self.index = index
+        self.para = para
+        self.attempts = 0
+        self.result_dir = None
+        self.proc = None
+        self.start_time = None
+        self.wall_time = None
+        self.error = None
+
+
+class SweepExecutor(object):
+    def __init__(self, sweep_dir, n_workers=None, mem_limit_mb=None,
+            max_attempts=2, run_func=experiment.execute_simulation,
+            poll_interval=1):
+        """
+        run_func(para) runs one point; para has 'result_dir' added.
+        mem_limit_mb limits the address space of each worker.
+        """
+        self.sweep_dir = sweep_dir
+        if n_workers is None:
+            n_workers = multiprocessing.cpu_count()
+        self.n_workers = n_workers
+        self.mem_limit_mb = mem_limit_mb
+        self.max_attempts = max_attempts
+        self.run_func = run_func
+        self.poll_interval = poll_interval
+
+    def _start(self, point):
+        point.attempts += 1
+        name = 'point-{:04d}'.format(point.index)
+        if point.attempts > 1:
+            name += '-try{}'.format(point.attempts)
+        point.result_dir = os.path.join(self.sweep_dir, name)
+        os.makedirs(point.result_dir)
+
+        point.proc = multiprocessing.Process(target=_run_point,
+                args=(self.run_func, point.para, point.result_dir,
+                    self.mem_limit_mb))
+        point.start_time = time.time()
+        point.proc.start()
+
+    def _error_of(self, point):
+        path = os.path.join(point.result_dir, 'error.txt')
+        if os.path.exists(path):
+            with open(path) as f:
+                lines = f.read().strip().splitlines()
+            return lines[-1] if len(lines) > 0 else 'unknown error'
+        # killed, e.g. by the OOM killer
+        return 'exit code {}'.format(point.proc.exitcode)
+
+    def _row(self, point):
+        row = collections.OrderedDict()
+        row['point'] = point.index
+        row['status'] = 'failed' if point.error is not None else 'ok'
+        row['attempts'] = point.attempts
+        for name in SUMMARY_COLUMNS:
+            row[name] = 'NA'
+
+        if point.error is None:
+            try:
+                row.update(summarize(point.result_dir))
+            except Exception as e:
+                row['status'] = 'failed'
+                point.error = 'no results: {}'.format(e)
+        row['wall_time_sec'] = point.wall_time
+        row['error'] = point.error if point.error is not None else ''
+        row['result_dir'] = point.result_dir
+        return row
+
+    def run(self, para_iter):
+        """
+        Run all points of para_iter, return the summary rows, which are
+        also written to <sweep_dir>/summary.txt
+        """
+        if not os.path.exists(self.sweep_dir):
+            os.makedirs(self.sweep_dir)
+
+        pending = collections.deque(
+                _Point(i, para) for i, para in enumerate(para_iter))
+        n_points = len(pending)
+        running = []
+        finished = []
+
+        while len(pending) > 0 or len(running) > 0:
+            while len(pending) > 0 and len(running) < self.n_workers:
+                point = pending.popleft()
+                self._start(point)
+                running.append(point)
+
+            time.sleep(self.poll_interval)
+
+            for point in [p for p in running if not p.proc.is_alive()]:
+                running.remove(point)
+                point.proc.join()
+                point.wall_time = time.time() - point.start_time
+
+                if point.proc.exitcode == 0:
+                    finished.append(point)
+                    continue
+
+                point.error = self._error_of(point)
+                print 'sweep point {} failed ({}): {}'.format(point.index,
+                        point.attempts, point.error)
+                if point.attempts < self.max_attempts:
+                    point.error = None
+                    pending.append(point)
+                else:
+                    finished.append(point)
+
+            print 'sweep: {} of {} points done, {} running'.format(
+                    len(finished), n_points, len(running))
+
+        rows = [self._row(point)
+                for point in sorted(finished, key=lambda p: p.index)]
+        self._add_para_columns(rows, finished)
+        utils.table_to_file(rows, os.path.join(self.sweep_dir, 'summary.txt'),
+                width=0)
+        return rows
+
+    def _add_para_columns(self, rows, points):
+        """
+        Add the parameters that differ between points to rows
+        """
+        paras = dict((p.index, p.para) for p in points)
+        names = set()
+        for para in paras.values():
+            names.update(para.keys())
+        varying = sorted(name for name in names
+                if len(set(repr(para.get(name)) for para in paras.values()))
+                > 1)
+
+        for row in rows:
+            para = paras[row['point']]
+            items = row.items()
+            row.clear()
+            row.update(items[:3])
+            for name in varying:
+                row[name] = para.get(name, 'NA')
+            row.update(items[3:])
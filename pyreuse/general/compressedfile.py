@@ -0,0 +1,168 @@
+"""
+Open plain, gzip, bzip2 and xz files the same way, chosen by extension.
+
+Compressed files are streamed through the gzip/bzip2/xz programs when they
+are installed. The (de)compression then runs in another process and lines
+are read from a large pipe buffer at the speed of a plain file. Python's
+own modules are used as a fallback.
+"""
+import bz2
+import gzip
+import os
+import signal
+import subprocess
+from distutils.spawn import find_executable
+
+BUFFER_BYTES = 1024 * 1024
+
+# extension: (program, python module name)
+COMPRESSIONS = {
+    '.gz':  ('gzip', 'gzip'),
+    '.bz2': ('bzip2', 'bz2'),
+    '.xz':  ('xz', 'lzma'),
+    }
+
+
+def compression_of(path):
+    """
+    Return the extension ('.gz', '.bz2', '.xz') if path is compressed,
+    otherwise None
+    """
+    ext = os.path.splitext(path)[1]
+    if ext in COMPRESSIONS:
+        return ext
+    return None
+
+
+def is_compressed(path):
+    return compression_of(path) is not None
+
+
+def compress_command(ext):
+    """
+    Shell command that compresses stdin to stdout, e.g. for
+    `blkparse ... | gzip -c >> out.gz`
+    """
+    return COMPRESSIONS[ext][0] + ' -c'
+
+
+def _default_sigpipe():
+    # python ignores SIGPIPE and children inherit it; let the decompressor
+    # die quietly if we stop reading early
+    signal.signal(signal.SIGPIPE, signal.SIG_DFL)
+
+
+class PipedFile(object):
+    """
+    A file read from the stdout of a decompressor, or written to the stdin
+    of a compressor.
+    """
+    def __init__(self, path, mode, program):
+        self.path = path
+        self.mode = mode
+        self.program = program
+
+        if 'r' in mode:
+            self._target = None
+            self._proc = subprocess.Popen([program, '-dc', path],
+                    stdout=subprocess.PIPE, bufsize=BUFFER_BYTES,
+                    preexec_fn=_default_sigpipe)
+            self._file = self._proc.stdout
+        else:
+            if 'a' in mode:
+                target_mode = 'ab'
+            else:
+                target_mode = 'wb'
+            # concatenated streams are valid for all of gzip, bzip2 and xz
+            self._target = open(path, target_mode)
+            self._proc = subprocess.Popen([program, '-c'],
+                    stdin=subprocess.PIPE, stdout=self._target,
+                    bufsize=BUFFER_BYTES)
+            self._file = self._proc.stdin
+
+    def __iter__(self):
+        return iter(self._file)
+
+    def read(self, *args):
+        return self._file.read(*args)
+
+    def readline(self, *args):
+        return self._file.readline(*args)
+
+    def write(self, data):
+        self._file.write(data)
+
+    def writelines(self, lines):
+        self._file.writelines(lines)
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self, sync=False):
+        if self._proc is None:
+            return
+        self._file.close()
+        ret = self._proc.wait()
+        self._proc = None
+        if self._target is not None:
+            if sync is True:
+                os.fsync(self._target.fileno())
+            self._target.close()
+        # reading may stop early and kill the decompressor with SIGPIPE
+        if ret != 0 and not (self._target is None and ret == -signal.SIGPIPE):
+            raise RuntimeError("{} failed on {} ({})".format(
+                self.program, self.path, ret))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, etype, value, traceback):
+        self.close()
+
+
+def _open_with_module(path, mode, module_name):
+    if module_name == 'gzip':
+        return gzip.open(path, mode + 'b')
+    elif module_name == 'bz2':
+        return bz2.BZ2File(path, mode + 'b', buffering=BUFFER_BYTES)
+    else:
+        try:
+            import lzma
+        except ImportError:
+            try:
+                from backports import lzma
+            except ImportError:
+                raise RuntimeError("Cannot open {}: neither the xz program "
+                        "nor the lzma module is available".format(path))
+        return lzma.open(path, mode + 'b')
+
+
+def open_file(path, mode='r'):
+    """
+    Open path for reading ('r'), writing ('w') or appending ('a'). The
+    returned object supports iteration over lines, read(), readline(),
+    write() and close(), and is a context manager.
+    """
+    mode = mode.replace('b', '').replace('t', '')
+    ext = compression_of(path)
+    if ext is None:
+        return open(path, mode, BUFFER_BYTES)
+
+    program, module_name = COMPRESSIONS[ext]
+    if find_executable(program) is not None:
+        return PipedFile(path, mode, program)
+    return _open_with_module(path, mode, module_name)
+
+
+def close_file(f, sync=True):
+    """
+    Flush, fsync (if sync is True) and close a file from open_file()
+    """
+    if isinstance(f, PipedFile):
+        f.close(sync=sync)
+        return
+
+    f.flush()
+    if sync is True and isinstance(f, file):
+        os.fsync(f.fileno())
+    f.close()
@@ -0,0 +1,287 @@
+"""
+Read the binary per-CPU files written by `blktrace -d <dev> -o <name>`
+(<name>.blktrace.<cpu>) directly, without going through blkparse.
+
+Each file is a sequence of struct blk_io_trace (include/uapi/linux/blktrace_api.h),
+each followed by pdu_len bytes of payload:
+
+    __u32 magic;     /* MAGIC << 8 | version */
+    __u32 sequence;  /* event number */
+    __u64 time;      /* in nanoseconds */
+    __u64 sector;    /* disk offset, in 512-byte sectors */
+    __u32 bytes;     /* transfer length */
+    __u32 action;    /* what happened */
+    __u32 pid;       /* who did it */
+    __u32 device;    /* device identifier (dev_t) */
+    __u32 cpu;       /* on what cpu did it happen */
+    __u16 error;     /* completion error */
+    __u16 pdu_len;   /* length of data after this trace */
+
+The files use the byte order of the traced machine; it is detected from
+the magic.
+"""
+import glob
+import heapq
+import mmap
+import os
+import re
+import struct
+
+
+BLK_IO_TRACE_MAGIC = 0x65617400
+BLK_IO_TRACE_VERSION = 0x07
+
+TRACE_FORMAT = 'IIQQIIIIIHH'
+TRACE_SIZE = struct.calcsize('<' + TRACE_FORMAT)
+
+# action types, the low 16 bits of action
+BLK_TA_QUEUE = 1
+BLK_TA_BACKMERGE = 2
+BLK_TA_FRONTMERGE = 3
+BLK_TA_GETRQ = 4
+BLK_TA_SLEEPRQ = 5
+BLK_TA_REQUEUE = 6
+BLK_TA_ISSUE = 7
+BLK_TA_COMPLETE = 8
+BLK_TA_PLUG = 9
+BLK_TA_UNPLUG_IO = 10
+BLK_TA_UNPLUG_TIMER = 11
+BLK_TA_INSERT = 12
+BLK_TA_SPLIT = 13
+BLK_TA_BOUNCE = 14
+BLK_TA_REMAP = 15
+
+# the action letters printed by blkparse
+ACTION_LETTERS = {
+    BLK_TA_QUEUE: 'Q',
+    BLK_TA_BACKMERGE: 'M',
+    BLK_TA_FRONTMERGE: 'F',
+    BLK_TA_GETRQ: 'G',
+    BLK_TA_SLEEPRQ: 'S',
+    BLK_TA_REQUEUE: 'R',
+    BLK_TA_ISSUE: 'D',
+    BLK_TA_COMPLETE: 'C',
+    BLK_TA_PLUG: 'P',
+    BLK_TA_UNPLUG_IO: 'U',
+    BLK_TA_UNPLUG_TIMER: 'UT',
+    BLK_TA_INSERT: 'I',
+    BLK_TA_SPLIT: 'X',
+    BLK_TA_BOUNCE: 'B',
+    BLK_TA_REMAP: 'A',
+    }
+
+# categories, the high 16 bits of action
+BLK_TC_SHIFT = 16
+BLK_TC_READ = 1 << 0
+BLK_TC_WRITE = 1 << 1
+BLK_TC_FLUSH = 1 << 2
+BLK_TC_SYNC = 1 << 3
+BLK_TC_QUEUE = 1 << 4
+BLK_TC_REQUEUE = 1 << 5
+BLK_TC_ISSUE = 1 << 6
+BLK_TC_COMPLETE = 1 << 7
+BLK_TC_FS = 1 << 8
+BLK_TC_PC = 1 << 9
+BLK_TC_NOTIFY = 1 << 10
+BLK_TC_AHEAD = 1 << 11
+BLK_TC_META = 1 << 12
+BLK_TC_DISCARD = 1 << 13
+BLK_TC_DRV_DATA = 1 << 14
+BLK_TC_FUA = 1 << 15
+
+SECTOR_BYTES = 512
+
+MINORBITS = 20
+MINORMASK = (1 << MINORBITS) - 1
+
+
+def tc_act(category):
+    return category << BLK_TC_SHIFT
+
+
+def action_type(action):
+    return action & 0xffff
+
+
+def action_letter(action):
+    return ACTION_LETTERS.get(action_type(action), '?')
+
+
+def fill_rwbs(action, nbytes):
+    """
+    The RWBS string printed by blkparse, e.g. 'WS', 'R', 'FWFS'
+    """
+    rwbs = ''
+    if action & tc_act(BLK_TC_FLUSH):
+        rwbs += 'F'
+    if action & tc_act(BLK_TC_DISCARD):
+        rwbs += 'D'
+    elif action & tc_act(BLK_TC_WRITE):
+        rwbs += 'W'
+    elif nbytes > 0:
+        rwbs += 'R'
+    else:
+        rwbs += 'N'
+    if action & tc_act(BLK_TC_FUA):
+        rwbs += 'F'
+    if action & tc_act(BLK_TC_AHEAD):
+        rwbs += 'A'
+    if action & tc_act(BLK_TC_SYNC):
+        rwbs += 'S'
+    if action & tc_act(BLK_TC_META):
+        rwbs += 'M'
+    return rwbs
+
+
+def devid_str(device):
+    return '{},{}'.format(device >> MINORBITS, device & MINORMASK)
+
+
+def detect_byte_order(data):
+    """
+    Return '<' or '>' by looking at the magic of the first trace
+    """
+    for order in ('<', '>'):
+        magic, = struct.unpack_from(order + 'I', data, 0)
+        if magic & 0xffffff00 == BLK_IO_TRACE_MAGIC:
+            if magic & 0xff != BLK_IO_TRACE_VERSION:
+                raise RuntimeError("blktrace version {} is not supported"\
+                        .format(magic & 0xff))
+            return order
+    raise RuntimeError("Not a blktrace binary file (bad magic)")
+
+
+def iter_cpu_file(path):
+    """
+    Yield (time, cpu, sequence, sector, bytes, action, pid, device, error)
+    for every trace in one per-CPU file, in file order.
+    """
+    if os.path.getsize(path) == 0:
+        return
+
+    with open(path, 'rb') as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            order = detect_byte_order(data)
+            trace_struct = struct.Struct(order + TRACE_FORMAT)
+            size = len(data)
+            pos = 0
+            while pos + TRACE_SIZE <= size:
+                magic, sequence, t, sector, nbytes, action, pid, device, \
+                    cpu, error, pdu_len = trace_struct.unpack_from(data, pos)
+                if magic & 0xffffff00 != BLK_IO_TRACE_MAGIC:
+                    raise RuntimeError("Bad magic at byte {} of {}".format(
+                        pos, path))
+                pos += TRACE_SIZE + pdu_len
+                yield (t, cpu, sequence, sector, nbytes, action, pid,
+                        device, error)
+        finally:
+            data.close()
+
+
+def cpu_file_paths(trace_dir, name):
+    """
+    Return the per-CPU files of trace `name` in trace_dir, ordered by CPU
+    """
+    paths = glob.glob(os.path.join(trace_dir, name + '.blktrace.*'))
+    pat = re.compile(r'\.blktrace\.(\d+)$')
+    cpu_paths = []
+    for path in paths:
+        mo = pat.search(path)
+        if mo is not None:
+            cpu_paths.append((int(mo.group(1)), path))
+    return [path for _, path in sorted(cpu_paths)]
+
+
+def merged_traces(paths):
+    """
+    Merge the traces of per-CPU files by time. Each file is already sorted
+    by time (it comes from one CPU), so a heap merge is enough.
+    """
+    return heapq.merge(*[iter_cpu_file(path) for path in paths])
+
+
+def genesis_time(paths):
+    """
+    blkparse prints time relative to the earliest trace of all CPUs
+    """
+    times = []
+    for path in paths:
+        for trace in iter_cpu_file(path):
+            times.append(trace[0])
+            break
+    if len(times) == 0:
+        return 0
+    return min(times)
+
+
+def is_data_trace(action, nbytes):
+    """
+    True if blkparse would print 'sector + count' for this trace, i.e. it
+    matches blocktrace.is_data_line().
+    """
+    if action & tc_act(BLK_TC_NOTIFY):
+        return False
+    if action & tc_act(BLK_TC_PC):
+        return False
+    return nbytes > 0
+
+
+def iter_data_rows(paths, sector_size, padding_bytes=0,
+        actions=('D', 'C')):
+    """
+    Yield the same row dicts as blocktrace.parse_data_line(), in time order,
+    for data traces whose action letter is in actions.
+    """
+    genesis = genesis_time(paths)
+    for t, cpu, sequence, sector, nbytes, action, pid, device, error \
+            in merged_traces(paths):
+        if not is_data_trace(action, nbytes):
+            continue
+        letter = action_letter(action)
+        if letter not in actions:
+            continue
+
+        rwbs = fill_rwbs(action, nbytes)
+        sector_count = nbytes / SECTOR_BYTES
+        secs, nsecs = divmod(t - genesis, 10**9)
+        row = {
+            'devid': devid_str(device),
+            'cpuid': str(cpu),
+            'seqid': str(sequence),
+            'timestamp': '{}.{:09d}'.format(secs, nsecs),
+            'pid': str(pid),
+            'action': letter,
+            'RWBS': rwbs,
+            'sector_start': str(sector),
+            'sector_count': str(sector_count),
+            'offset': sector * sector_size - padding_bytes,
+            'size': sector_count * sector_size,
+            'type': 'blkparse',
+            }
+
+        if 'D' in rwbs:
+            row['operation'] = 'discard'
+        elif 'W' in rwbs:
+            row['operation'] = 'write'
+        else:
+            row['operation'] = 'read'
+
+        if 'S' in rwbs:
+            row['sync'] = 'True'
+        else:
+            row['sync'] = 'False'
+
+        yield row
+
+
+def pack_trace(sequence, time, sector, nbytes, action, pid, device, cpu,
+        error=0, pdu='', order='<'):
+    """
+    Build one struct blk_io_trace (plus payload), as blktrace writes it.
+    Handy for making test files.
+    """
+    magic = BLK_IO_TRACE_MAGIC | BLK_IO_TRACE_VERSION
+    return struct.pack(order + TRACE_FORMAT, magic, sequence, time, sector,
+            nbytes, action, pid, device, cpu, error, len(pdu)) + pdu
+
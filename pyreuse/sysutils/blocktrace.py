@@ -1,10 +1,19 @@
+import heapq
+import itertools
+import multiprocessing
 import os
 import re
+import shutil
 import subprocess
+import tempfile
 import time
 
 from pyreuse.helpers import *
 from pyreuse.macros import *
+from pyreuse.general.compressedfile import open_file, close_file, \
+        is_compressed, compression_of, compress_command
+from pyreuse.sysutils import blktracebin
+from pyreuse.sysutils.tracestats import TraceStats
 
 class BlktraceResult(object):
     """
@@ -31,69 +40,28 @@ class BlktraceResult(object):
     def create_event_file(self):
         prepare_dir_for_path(self.parsed_output_path)
 
-        out_file = open(self.parsed_output_path, 'w')
-        in_file = open(self.raw_blkparse_file_path, 'r')
+        out_file = open_file(self.parsed_output_path, 'w')
+        in_file = open_file(self.raw_blkparse_file_path, 'r')
+        self.stats = TraceStats(self.sector_size)
 
         for line in in_file:
             line = line.strip()
             if not is_data_line(line):
                 continue
 
-            # get row dict
-            row_dict = self.__line_to_dic(line)
-            row_dict['type'] = 'blkparse'
+            row_dict = parse_data_line(line, self.sector_size,
+                    self.padding_bytes)
+            self.stats.add(row_dict['operation'], row_dict['offset'],
+                    row_dict['size'], float(row_dict['timestamp']))
 
             line = self.__create_event_line(row_dict)
             out_file.write( line + '\n' )
 
-        out_file.flush()
-        os.fsync(out_file)
-        out_file.close()
+        in_file.close()
+        close_file(out_file)
+        self.stats.dump(self.parsed_output_path)
 
 
-    def __line_to_dic(self, line):
-        """
-        is_data_line() must be true for this line"\
-        ['8,0', '0', '1', '0.000000000', '440', 'A', 'W', '12912077', '+', '8', '<-', '(8,2)', '606224']"
-        """
-        names = ['devid', 'cpuid', 'seqid', 'timestamp', 'pid', 'action', 'RWBS', 'sector_start', 'ignore1', 'sector_count']
-        #        0        1         2       3        4      5         6       7             8          9
-        items = line.split()
-
-        dic = dict(zip(names, items))
-        assert len(items) >= len(names)
-
-        self.__parse_and_add_operation(dic)
-        self.__parse_and_add_offset_size(dic)
-
-        return dic
-
-    def __parse_and_add_operation(self, row):
-        if 'D' in row['RWBS']:
-            operation = 'discard'
-        elif 'W' in row['RWBS']:
-            operation = 'write'
-        elif 'R' in row['RWBS']:
-            operation = 'read'
-        else:
-            raise RuntimeError('unknow operation ' + row['RWBS'])
-
-        row['operation'] = operation
-
-        if 'S' in row['RWBS']:
-            row['sync'] = 'True'
-        else:
-            row['sync'] = 'False'
-
-    def __parse_and_add_offset_size(self, row):
-        sec_start = int(row['sector_start'])
-        sec_count = int(row['sector_count'])
-        byte_offset = sec_start * self.sector_size - self.padding_bytes
-        byte_size = sec_count * self.sector_size
-
-        row['offset'] = byte_offset
-        row['size'] = byte_size
-
     def __create_event_line(self, line_dict):
         columns = [str(line_dict.get(colname, 'NA'))
                 for colname in self.event_file_column_names]
@@ -125,49 +93,6 @@ class BlktraceResultInMem(object):
 
         self.__parse_rawfile()
 
-    def __line_to_dic(self, line):
-        """
-        is_data_line() must be true for this line"\
-        ['8,0', '0', '1', '0.000000000', '440', 'A', 'W', '12912077', '+', '8', '<-', '(8,2)', '606224']"
-        """
-        names = ['devid', 'cpuid', 'seqid', 'timestamp', 'pid', 'action', 'RWBS', 'sector_start', 'ignore1', 'sector_count']
-        #        0        1         2       3        4      5         6       7             8          9
-        items = line.split()
-
-        dic = dict(zip(names, items))
-        assert len(items) >= len(names)
-
-        self.__parse_and_add_operation(dic)
-        self.__parse_and_add_offset_size(dic)
-
-        return dic
-
-    def __parse_and_add_operation(self, row):
-        if 'D' in row['RWBS']:
-            operation = 'discard'
-        elif 'W' in row['RWBS']:
-            operation = 'write'
-        elif 'R' in row['RWBS']:
-            operation = 'read'
-        else:
-            raise RuntimeError('unknow operation ' + row['RWBS'])
-
-        row['operation'] = operation
-
-        if 'S' in row['RWBS']:
-            row['sync'] = 'True'
-        else:
-            row['sync'] = 'False'
-
-    def __parse_and_add_offset_size(self, row):
-        sec_start = int(row['sector_start'])
-        sec_count = int(row['sector_count'])
-        byte_offset = sec_start * self.sector_size - self.padding_bytes
-        byte_size = sec_count * self.sector_size
-
-        row['offset'] = byte_offset
-        row['size'] = byte_size
-
     def __calculate_pre_wait_time(self, event_table):
         if self.do_sort is True:
             event_table.sort(key = lambda k: float(k['timestamp']))
@@ -184,14 +109,14 @@ class BlktraceResultInMem(object):
         return event_table
 
     def __parse_rawfile(self):
-        with open(self.raw_blkparse_file_path, 'r') as line_iter:
+        with open_file(self.raw_blkparse_file_path, 'r') as line_iter:
             table = []
             for line in line_iter:
                 line = line.strip()
                 # print is_data_line(line), line
                 if is_data_line(line):
-                    ret = self.__line_to_dic(line)
-                    ret['type'] = 'blkparse'
+                    ret = parse_data_line(line, self.sector_size,
+                            self.padding_bytes)
                 else:
                     ret = None
 
@@ -202,6 +127,11 @@ class BlktraceResultInMem(object):
 
         self.__parsed_table = table
 
+        self.stats = TraceStats(self.sector_size)
+        for row in table:
+            self.stats.add(row['operation'], row['offset'], row['size'],
+                    float(row['timestamp']))
+
     def __create_event_line(self, line_dict):
         columns = [str(line_dict[colname])
                 for colname in self.event_file_column_names]
@@ -210,7 +140,7 @@ class BlktraceResultInMem(object):
 
     def create_event_file(self):
         prepare_dir_for_path(self.parsed_output_path)
-        out = open(self.parsed_output_path, 'w')
+        out = open_file(self.parsed_output_path, 'w')
         for row_dict in self.__parsed_table:
             if row_dict['type'] == 'blkparse':
                 line = self.__create_event_line(row_dict)
@@ -219,21 +149,463 @@ class BlktraceResultInMem(object):
 
             out.write( line + '\n' )
 
-        out.flush()
-        os.fsync(out)
-        out.close()
+        close_file(out)
+        self.stats.dump(self.parsed_output_path)
 
     def get_duration(self):
-        return float(self.__parsed_table[-1]['timestamp']) - \
-                float(self.__parsed_table[0]['timestamp'])
+        return self.stats.get_duration()
 
     def count_sectors(self, operation):
-        sectors_cnt = 0
-        for row in self.__parsed_table:
-            if row['operation'] == operation:
-                sectors_cnt += int(row['sector_count'])
+        return self.stats.count_sectors(operation)
+
+    def get_bandwidth_mb(self, operation):
+        sec_cnt = self.count_sectors(operation)
+        size_mb = sec_cnt * self.sector_size / float(MB)
+        duration = self.get_duration()
+
+        return size_mb / duration
+
+
+class BlktraceResultExtSort(object):
+    """
+    Parse blkparse output and sort it by timestamp with an external merge
+    sort. It produces the same event file as BlktraceResultInMem, but its
+    memory usage is bounded by mem_budget_bytes instead of the trace length.
+
+    Sorted runs are spilled to temporary files, then merged (k-way) while
+    pre_wait_time is calculated on the fly.
+    """
+    # rough cost of keeping one parsed row in memory, except the strings
+    ROW_OVERHEAD_BYTES = 320
+
+    def __init__(self, sector_size, event_file_column_names,
+            raw_blkparse_file_path, parsed_output_path,
+            padding_bytes=0, mem_budget_bytes=256*MB, tmp_dir=None,
+            max_merge_fanin=64):
+        self.raw_blkparse_file_path = raw_blkparse_file_path
+        self.parsed_output_path = parsed_output_path
+        self.sector_size = sector_size
+        self.event_file_column_names = event_file_column_names
+        self.padding_bytes = padding_bytes
+        self.mem_budget_bytes = mem_budget_bytes
+        self.tmp_dir = tmp_dir
+        self.max_merge_fanin = max_merge_fanin
+
+        # statistics collected in the final merge pass
+        self.n_runs = 0
+        self.stats = TraceStats(sector_size)
+
+    def _row_to_record(self, seq, row):
+        """
+        A record is
+        (timestamp, seq, operation, sector_count, offset, prefix, suffix)
+        where prefix and suffix are the event line columns before and after
+        pre_wait_time. seq keeps the sort stable.
+        """
+        columns = [str(row[colname])
+                for colname in self.event_file_column_names
+                if colname != 'pre_wait_time']
+        if 'pre_wait_time' in self.event_file_column_names:
+            i = self.event_file_column_names.index('pre_wait_time')
+        else:
+            i = len(columns)
+        prefix = ' '.join(columns[:i])
+        suffix = ' '.join(columns[i:])
+
+        return (float(row['timestamp']), seq, row['operation'],
+                int(row['sector_count']), row['offset'], prefix, suffix)
+
+    def _record_bytes(self, record):
+        return self.ROW_OVERHEAD_BYTES + len(record[5]) + len(record[6])
+
+    def _write_run(self, records, dirpath):
+        fd, path = tempfile.mkstemp(prefix='run-', dir=dirpath)
+        with os.fdopen(fd, 'w') as f:
+            for ts, seq, op, cnt, offset, prefix, suffix in records:
+                f.write('\t'.join((repr(ts), str(seq), op, str(cnt),
+                    str(offset), prefix, suffix)) + '\n')
+        return path
+
+    def _read_run(self, path):
+        with open(path, 'r') as f:
+            for line in f:
+                ts, seq, op, cnt, offset, prefix, suffix = \
+                        line.rstrip('\n').split('\t')
+                yield (float(ts), int(seq), op, int(cnt), int(offset),
+                        prefix, suffix)
+
+    def _sorted_runs(self, dirpath):
+        """
+        Return (run paths, records in memory). If the whole trace fits in
+        the memory budget, nothing is spilled.
+        """
+        run_paths = []
+        records = []
+        used_bytes = 0
+        seq = 0
+        with open_file(self.raw_blkparse_file_path, 'r') as line_iter:
+            for line in line_iter:
+                line = line.strip()
+                if not is_data_line(line):
+                    continue
+
+                record = self._row_to_record(seq,
+                    parse_data_line(line, self.sector_size,
+                        self.padding_bytes))
+                seq += 1
+                records.append(record)
+                used_bytes += self._record_bytes(record)
+
+                if used_bytes >= self.mem_budget_bytes:
+                    records.sort()
+                    run_paths.append(self._write_run(records, dirpath))
+                    records = []
+                    used_bytes = 0
+
+        records.sort()
+        if len(run_paths) > 0 and len(records) > 0:
+            run_paths.append(self._write_run(records, dirpath))
+            records = []
+
+        return run_paths, records
+
+    def _reduce_runs(self, run_paths, dirpath):
+        """
+        Merge runs until at most max_merge_fanin are left, so the final
+        merge does not open too many files.
+        """
+        while len(run_paths) > self.max_merge_fanin:
+            group = run_paths[:self.max_merge_fanin]
+            merged = heapq.merge(*[self._read_run(path) for path in group])
+            new_path = self._write_run(merged, dirpath)
+            for path in group:
+                os.remove(path)
+            run_paths = run_paths[self.max_merge_fanin:] + [new_path]
+        return run_paths
+
+    def _write_events(self, records, out):
+        prev_ts = None
+        for ts, seq, op, cnt, offset, prefix, suffix in records:
+            if prev_ts is None:
+                pre_wait_time = 0
+            else:
+                pre_wait_time = ts - prev_ts
+                assert pre_wait_time >= 0, "data is {}".format(pre_wait_time)
+            prev_ts = ts
+
+            self.stats.add(op, offset, cnt * self.sector_size, ts)
+
+            if 'pre_wait_time' in self.event_file_column_names:
+                columns = [prefix, str(pre_wait_time), suffix]
+            else:
+                columns = [prefix, suffix]
+            line = ' '.join(col for col in columns if col != '')
+            out.write( line + '\n' )
+
+    def create_event_file(self):
+        prepare_dir_for_path(self.parsed_output_path)
+        tmp_dir = self.tmp_dir
+        if tmp_dir is None:
+            tmp_dir = os.path.dirname(os.path.abspath(self.parsed_output_path))
+        dirpath = tempfile.mkdtemp(prefix='blktrace-sort-', dir=tmp_dir)
+
+        try:
+            run_paths, records = self._sorted_runs(dirpath)
+            self.n_runs = len(run_paths)
+            if len(run_paths) > 0:
+                run_paths = self._reduce_runs(run_paths, dirpath)
+                records = heapq.merge(
+                    *[self._read_run(path) for path in run_paths])
+
+            out = open_file(self.parsed_output_path, 'w')
+            self._write_events(records, out)
+            close_file(out)
+            self.stats.dump(self.parsed_output_path)
+        finally:
+            shutil.rmtree(dirpath)
+
+    @property
+    def n_events(self):
+        return self.stats.n_events
+
+    def get_duration(self):
+        return self.stats.get_duration()
+
+    def count_sectors(self, operation):
+        return self.stats.count_sectors(operation)
+
+    def get_bandwidth_mb(self, operation):
+        sec_cnt = self.count_sectors(operation)
+        size_mb = sec_cnt * self.sector_size / float(MB)
+        duration = self.get_duration()
+
+        return size_mb / duration
+
+
+class BlktraceResultParallel(BlktraceResultExtSort):
+    """
+    Parse blkparse output with n_workers processes. The raw file is split
+    at line boundaries into byte ranges of about chunk_bytes. Each worker
+    parses one range and writes it as a sorted run; the runs are then
+    merged like in BlktraceResultExtSort.
+
+    The output is the same as BlktraceResultInMem (do_sort=True) or
+    BlktraceResult (do_sort=False).
+    """
+    def __init__(self, sector_size, event_file_column_names,
+            raw_blkparse_file_path, parsed_output_path,
+            padding_bytes=0, do_sort=True, n_workers=None,
+            chunk_bytes=64*MB, tmp_dir=None, max_merge_fanin=64):
+        super(BlktraceResultParallel, self).__init__(sector_size,
+                event_file_column_names, raw_blkparse_file_path,
+                parsed_output_path, padding_bytes=padding_bytes,
+                tmp_dir=tmp_dir, max_merge_fanin=max_merge_fanin)
+        self.do_sort = do_sort
+        if n_workers is None:
+            n_workers = multiprocessing.cpu_count()
+        self.n_workers = n_workers
+        self.chunk_bytes = chunk_bytes
+
+    def split_ranges(self):
+        """
+        Return [(start, end), ...] byte ranges. Every range starts at the
+        beginning of a line and ends right after a newline (or at EOF).
+        """
+        file_size = os.path.getsize(self.raw_blkparse_file_path)
+        n_ranges = max(self.n_workers,
+                (file_size + self.chunk_bytes - 1) / self.chunk_bytes)
+        range_size = max(1, (file_size + n_ranges - 1) / n_ranges)
+
+        ranges = []
+        start = 0
+        with open(self.raw_blkparse_file_path, 'r') as f:
+            while start < file_size:
+                end = start + range_size
+                if end < file_size:
+                    f.seek(end - 1)
+                    f.readline()
+                    end = f.tell()
+                else:
+                    end = file_size
+                ranges.append((start, end))
+                start = end
+        return ranges
+
+    def _line_chunks(self):
+        """
+        Compressed input cannot be split by byte ranges, so it is
+        decompressed here and handed to workers in chunks of lines.
+        Yield (position of the first line, lines).
+        """
+        pos = 0
+        lines = []
+        chunk_size = 0
+        with open_file(self.raw_blkparse_file_path, 'r') as f:
+            for line in f:
+                lines.append(line)
+                chunk_size += len(line)
+                if chunk_size >= self.chunk_bytes:
+                    yield pos, lines
+                    pos += chunk_size
+                    lines = []
+                    chunk_size = 0
+        if len(lines) > 0:
+            yield pos, lines
+
+    def _sorted_runs(self, dirpath):
+        if is_compressed(self.raw_blkparse_file_path):
+            worker = _parse_lines_to_run
+            tasks = ((self.sector_size, self.event_file_column_names,
+                self.padding_bytes, pos, lines, self.do_sort, dirpath)
+                for pos, lines in self._line_chunks())
+        else:
+            worker = _parse_range_to_run
+            tasks = ((self.sector_size, self.event_file_column_names,
+                self.raw_blkparse_file_path, self.padding_bytes, start, end,
+                self.do_sort, dirpath) for start, end in self.split_ranges())
+
+        if self.n_workers <= 1:
+            return [worker(task) for task in tasks], []
+
+        pool = multiprocessing.Pool(self.n_workers)
+        run_paths = []
+        try:
+            # submit n_workers tasks at a time, so at most that many chunks
+            # of lines are held in memory
+            while True:
+                batch = list(itertools.islice(tasks, self.n_workers))
+                if len(batch) == 0:
+                    break
+                run_paths.extend(pool.map(worker, batch))
+        finally:
+            pool.close()
+            pool.join()
+
+        return run_paths, []
+
+    def _write_events(self, records, out):
+        if self.do_sort is True:
+            return super(BlktraceResultParallel, self)._write_events(
+                    records, out)
+
+        # same as BlktraceResult, which does not know pre_wait_time
+        for ts, seq, op, cnt, offset, prefix, suffix in records:
+            self.stats.add(op, offset, cnt * self.sector_size, ts)
+
+            if 'pre_wait_time' in self.event_file_column_names:
+                columns = [prefix, 'NA', suffix]
+            else:
+                columns = [prefix, suffix]
+            line = ' '.join(col for col in columns if col != '')
+            out.write( line + '\n' )
+
+    def create_event_file(self):
+        prepare_dir_for_path(self.parsed_output_path)
+        tmp_dir = self.tmp_dir
+        if tmp_dir is None:
+            tmp_dir = os.path.dirname(os.path.abspath(self.parsed_output_path))
+        dirpath = tempfile.mkdtemp(prefix='blktrace-par-', dir=tmp_dir)
+
+        try:
+            run_paths, _ = self._sorted_runs(dirpath)
+            self.n_runs = len(run_paths)
+            if self.do_sort is True:
+                run_paths = self._reduce_runs(run_paths, dirpath)
+                records = heapq.merge(
+                    *[self._read_run(path) for path in run_paths])
+            else:
+                # runs are in file order
+                records = itertools.chain(
+                    *[self._read_run(path) for path in run_paths])
 
-        return sectors_cnt
+            out = open_file(self.parsed_output_path, 'w')
+            self._write_events(records, out)
+            close_file(out)
+            self.stats.dump(self.parsed_output_path)
+        finally:
+            shutil.rmtree(dirpath)
+
+
+def _parse_range_to_run(task):
+    """
+    Worker of BlktraceResultParallel. Parse lines in [start, end) of the raw
+    file and write them as one run. The byte offset of a line is used as
+    its seq, so ties in timestamp keep the file order.
+    """
+    sector_size, event_file_column_names, raw_path, padding_bytes, \
+            start, end, do_sort, dirpath = task
+    parser = BlktraceResultExtSort(sector_size, event_file_column_names,
+            raw_path, None, padding_bytes=padding_bytes)
+
+    def numbered_lines():
+        with open(raw_path, 'r') as f:
+            f.seek(start)
+            pos = start
+            while pos < end:
+                line = f.readline()
+                if line == '':
+                    break
+                yield pos, line
+                pos += len(line)
+
+    return _lines_to_run(parser, numbered_lines(), do_sort, dirpath)
+
+
+def _parse_lines_to_run(task):
+    """
+    Same as _parse_range_to_run(), but the lines are passed in. pos is the
+    position of the first line in the decompressed stream.
+    """
+    sector_size, event_file_column_names, padding_bytes, pos, lines, \
+            do_sort, dirpath = task
+    parser = BlktraceResultExtSort(sector_size, event_file_column_names,
+            None, None, padding_bytes=padding_bytes)
+
+    def numbered_lines():
+        line_pos = pos
+        for line in lines:
+            yield line_pos, line
+            line_pos += len(line)
+
+    return _lines_to_run(parser, numbered_lines(), do_sort, dirpath)
+
+
+def _lines_to_run(parser, numbered_lines, do_sort, dirpath):
+    records = []
+    for seq, line in numbered_lines:
+        line = line.strip()
+        if not is_data_line(line):
+            continue
+        records.append(parser._row_to_record(seq,
+            parse_data_line(line, parser.sector_size, parser.padding_bytes)))
+
+    if do_sort is True:
+        records.sort()
+    return parser._write_run(records, dirpath)
+
+
+class BlktraceResultBinary(object):
+    """
+    Create the event file directly from the binary per-CPU files of
+    blktrace (<trace_name>.blktrace.<cpu> in trace_dir), skipping blkparse.
+    The output is the same as BlktraceResultInMem with do_sort=True.
+    """
+    def __init__(self, sector_size, event_file_column_names,
+            trace_dir, trace_name, parsed_output_path,
+            padding_bytes=0, actions=('D', 'C')):
+        self.sector_size = sector_size
+        self.event_file_column_names = event_file_column_names
+        self.trace_dir = trace_dir
+        self.trace_name = trace_name
+        self.parsed_output_path = parsed_output_path
+        # event offset + padding_bytes = blktrace addr
+        self.padding_bytes = padding_bytes
+        self.actions = actions
+
+        self.stats = TraceStats(sector_size)
+
+    def cpu_file_paths(self):
+        return blktracebin.cpu_file_paths(self.trace_dir, self.trace_name)
+
+    def iter_rows(self):
+        """
+        Row dicts in time order, with pre_wait_time filled
+        """
+        prev_ts = None
+        for row in blktracebin.iter_data_rows(self.cpu_file_paths(),
+                self.sector_size, self.padding_bytes, self.actions):
+            ts = float(row['timestamp'])
+            if prev_ts is None:
+                row['pre_wait_time'] = 0
+            else:
+                row['pre_wait_time'] = ts - prev_ts
+            prev_ts = ts
+            yield row
+
+    def create_event_file(self):
+        prepare_dir_for_path(self.parsed_output_path)
+        out = open_file(self.parsed_output_path, 'w')
+
+        for row in self.iter_rows():
+            self.stats.add(row['operation'], row['offset'], row['size'],
+                    float(row['timestamp']))
+
+            columns = [str(row[colname])
+                    for colname in self.event_file_column_names]
+            out.write( ' '.join(columns) + '\n' )
+
+        close_file(out)
+        self.stats.dump(self.parsed_output_path)
+
+    @property
+    def n_events(self):
+        return self.stats.n_events
+
+    def get_duration(self):
+        return self.stats.get_duration()
+
+    def count_sectors(self, operation):
+        return self.stats.count_sectors(operation)
 
     def get_bandwidth_mb(self, operation):
         sec_cnt = self.count_sectors(operation)
@@ -247,7 +619,8 @@ class BlockTraceManager(object):
     "This class provides interfaces to interact with blktrace"
     def __init__(self, dev, event_file_column_names,
             resultpath, to_ftlsim_path, sector_size, padding_bytes=0,
-            do_sort=True):
+            do_sort=True, sort_mem_budget=None, binary_trace=False,
+            parse_workers=1):
         self.dev = dev
         self.sector_size = sector_size
         self.event_file_column_names = event_file_column_names
@@ -256,15 +629,63 @@ class BlockTraceManager(object):
         self.sector_size = sector_size
         self.padding_bytes = padding_bytes
         self.do_sort = do_sort
+        # if not None, sort with bounded memory (bytes)
+        self.sort_mem_budget = sort_mem_budget
+        # if True, keep blktrace's binary output and parse it directly
+        # instead of piping it through blkparse
+        self.binary_trace = binary_trace
+        self.binary_trace_dir = os.path.splitext(resultpath)[0] + '-blktrace'
+        self.binary_trace_name = 'trace'
+        # number of processes to parse blkparse output
+        self.parse_workers = parse_workers
 
     def start_tracing_and_collecting(self, trace_filter=None):
-        self.proc = start_blktrace_on_bg(self.dev, self.resultpath, trace_filter)
+        if self.binary_trace is True:
+            self.proc = start_binary_blktrace_on_bg(self.dev,
+                    self.binary_trace_dir, self.binary_trace_name,
+                    trace_filter)
+        else:
+            self.proc = start_blktrace_on_bg(self.dev, self.resultpath,
+                    trace_filter)
 
     def stop_tracing_and_collecting(self):
         stop_blktrace_on_bg()
+        proc = getattr(self, 'proc', None)
+        if is_compressed(self.resultpath) and self.binary_trace is False \
+                and proc is not None:
+            # let the compressor finish the stream
+            proc.wait()
 
     def create_event_file_from_blkparse(self):
-        if self.do_sort is True:
+        if self.binary_trace is True:
+            rawparser = BlktraceResultBinary(self.sector_size,
+                    self.event_file_column_names,
+                    self.binary_trace_dir, self.binary_trace_name,
+                    self.to_ftlsim_path,
+                    padding_bytes=self.padding_bytes
+                    )
+            rawparser.create_event_file()
+
+        elif self.parse_workers is not None and self.parse_workers > 1:
+            rawparser = BlktraceResultParallel(self.sector_size,
+                    self.event_file_column_names,
+                    self.resultpath, self.to_ftlsim_path,
+                    padding_bytes=self.padding_bytes,
+                    do_sort=self.do_sort,
+                    n_workers=self.parse_workers
+                    )
+            rawparser.create_event_file()
+
+        elif self.do_sort is True and self.sort_mem_budget is not None:
+            rawparser = BlktraceResultExtSort(self.sector_size,
+                    self.event_file_column_names,
+                    self.resultpath, self.to_ftlsim_path,
+                    padding_bytes=self.padding_bytes,
+                    mem_budget_bytes=self.sort_mem_budget
+                    )
+            rawparser.create_event_file()
+
+        elif self.do_sort is True:
             rawparser = BlktraceResultInMem(self.sector_size,
                     self.event_file_column_names,
                     self.resultpath, self.to_ftlsim_path,
@@ -294,10 +715,73 @@ def start_blktrace_on_bg(dev, resultpath, trace_filter=None):
     else:
         trace_filter = ' '.join(['-a ' + mask for mask in trace_filter])
 
+    ext = compression_of(resultpath)
+    if ext is None:
+        compress = ''
+    else:
+        # compress as it is captured
+        compress = '| ' + compress_command(ext) + ' '
+
     cmd = "sudo blktrace {filtermask} -d {dev} -o - | "\
-            "blkparse {filtermask} -i - >> "\
+            "blkparse {filtermask} -i - {compress}>> "\
         "{resultpath}".format(dev = dev, resultpath = resultpath,
-        filtermask = trace_filter)
+        filtermask = trace_filter, compress = compress)
+    print cmd
+    p = subprocess.Popen(cmd, shell=True)
+    time.sleep(0.3) # wait to see if there's any immediate error.
+
+    if p.poll() != None:
+        raise RuntimeError("tracing failed to start")
+
+    return p
+
+def start_blktrace_pipe(dev, trace_filter=None):
+    """
+    Start blktrace | blkparse and return the process. Parsed lines are read
+    from its stdout as they come, nothing is written to files. Stop it with
+    stop_blktrace_pipe().
+    """
+    if trace_filter is None:
+        trace_filter = ''
+    else:
+        trace_filter = ' '.join(['-a ' + mask for mask in trace_filter])
+
+    cmd = "sudo blktrace {filtermask} -d {dev} -o - | "\
+            "blkparse {filtermask} -i -".format(dev = dev,
+            filtermask = trace_filter)
+    print cmd
+    p = subprocess.Popen(cmd, shell=True, stdout=subprocess.PIPE,
+            bufsize=1024*1024)
+    time.sleep(0.3) # wait to see if there's any immediate error.
+
+    if p.poll() != None:
+        raise RuntimeError("tracing failed to start")
+
+    return p
+
+def stop_blktrace_pipe():
+    # only stop blktrace, blkparse exits after printing everything it has
+    shcmd('sync')
+    shcmd('pkill blktrace', ignore_error=True)
+
+def start_binary_blktrace_on_bg(dev, trace_dir, trace_name,
+        trace_filter=None):
+    """
+    Let blktrace write its binary per-CPU files to trace_dir, to be parsed
+    later by BlktraceResultBinary.
+    """
+    prepare_dir(trace_dir)
+    shcmd("rm -f {}".format(
+        os.path.join(trace_dir, trace_name + '.blktrace.*')))
+
+    if trace_filter is None:
+        trace_filter = ''
+    else:
+        trace_filter = ' '.join(['-a ' + mask for mask in trace_filter])
+
+    cmd = "sudo blktrace {filtermask} -d {dev} -D {trace_dir} -o {name}"\
+            .format(dev = dev, trace_dir = trace_dir, name = trace_name,
+            filtermask = trace_filter)
     print cmd
     p = subprocess.Popen(cmd, shell=True)
     time.sleep(0.3) # wait to see if there's any immediate error.
@@ -312,6 +796,39 @@ def stop_blktrace_on_bg():
     shcmd('pkill blktrace', ignore_error=True)
     shcmd('sync')
 
+def parse_data_line(line, sector_size, padding_bytes=0):
+    """
+    is_data_line() must be true for this line. Return the row dict of the
+    line, with type 'blkparse'. For example, the line
+    ['8,0', '0', '1', '0.000000000', '440', 'A', 'W', '12912077', '+', '8', '<-', '(8,2)', '606224']
+    is a write of 8 sectors at sector 12912077.
+    """
+    names = ['devid', 'cpuid', 'seqid', 'timestamp', 'pid', 'action', 'RWBS', 'sector_start', 'ignore1', 'sector_count']
+    items = line.split()
+    assert len(items) >= len(names)
+    row = dict(zip(names, items))
+
+    rwbs = row['RWBS']
+    if 'D' in rwbs:
+        row['operation'] = 'discard'
+    elif 'W' in rwbs:
+        row['operation'] = 'write'
+    elif 'R' in rwbs:
+        row['operation'] = 'read'
+    else:
+        raise RuntimeError('unknow operation ' + rwbs)
+
+    if 'S' in rwbs:
+        row['sync'] = 'True'
+    else:
+        row['sync'] = 'False'
+
+    row['offset'] = int(row['sector_start']) * sector_size - padding_bytes
+    row['size'] = int(row['sector_count']) * sector_size
+    row['type'] = 'blkparse'
+
+    return row
+
 def is_data_line(line):
     #                       devid    sector_start + nblocks
     match_obj = re.match( r'\d+,\d+.*\d+\s+\+\s+\d+', line)
@@ -1,7 +1,12 @@
 import sys,os
+import cPickle
 import pprint
 import glob
+import heapq
+import multiprocessing
 import re
+import shutil
+import tempfile
 from collections import Counter
 
 from pyreuse.helpers import *
@@ -271,16 +276,49 @@ def maintain_filep(filep, entrydict):
     entrydict['length'] = length
 
 
-def parse_lines(line_iter, pid=None):
-    unfinished_dic = {} #indexed by call name
-    filep = {}
+def get_dic_from_unfinished_no_pid(line, pid=None):
+    """
+    Same as get_dic_from_unfinished(), for lines of per-pid trace files
+    (strace -ff), which do not start with the pid
+    """
+    mo = re.match(r'(\S+)\s+(\w+)\(', line)
+    dic = {'pid': pid}
+    if mo:
+        dic['time'] = mo.group(1)
+        dic['callname'] = mo.group(2)
 
-    header=['pid', 'time', 'callname',
-            'offset', 'length', 'filepath', 'trace_name']
+    n = len(line)
+    m = len(UNFINISHED_MARK)
+    dic['trimedline'] = line[:(n-m)]
 
-    trace_name = 'tr-name'
+    return dic
+
+def get_dic_from_resumed_no_pid(line, pid=None):
+    """
+    Same as get_dic_from_resumed(), for lines of per-pid trace files
+    """
+    mo = re.match(r'(\S+)\s+\<\.\.\. (\S+) resumed\>', line)
+    dic = {'pid': pid}
+    if mo:
+        dic['time'] = mo.group(1)
+        dic['callname'] = mo.group(2)
+
+    trimedline = re.sub(r'.*\<\.\.\. \S+ resumed\>', "", line)
+    dic['trimedline'] = trimedline
+
+    return dic
+
+def iter_raw_entries(line_iter, pid=None):
+    """
+    Yield the entrydict of every complete call in line_iter, without the
+    file information of maintain_filep(). Only the calls waiting for their
+    '<... resumed>' line are kept in memory.
+
+    pid is the pid of a per-pid trace file (strace -ff), whose lines do
+    not have pids.
+    """
+    unfinished_dic = {} #indexed by (pid, call name)
 
-    ret_table = []
     for line in line_iter:
         line = line.strip()
         if match_line_no_pid(line):
@@ -289,30 +327,63 @@ def parse_lines(line_iter, pid=None):
         elif match_line(line):
             entrydict = line_to_dic(line)
         elif line.endswith(UNFINISHED_MARK):
-            udic = get_dic_from_unfinished(line)
+            if pid is None:
+                udic = get_dic_from_unfinished(line)
+            else:
+                udic = get_dic_from_unfinished_no_pid(line, pid)
             unfinished_dic[(udic['pid'], udic['callname'])] = udic
             continue
         elif 'resumed' in line:
-            udic = get_dic_from_resumed(line)
-            name = udic['callname']
-            pid = udic['pid']
+            if pid is None:
+                udic = get_dic_from_resumed(line)
+            else:
+                udic = get_dic_from_resumed_no_pid(line, pid)
+            key = (udic['pid'], udic['callname'])
             try:
-                completeline = unfinished_dic[(pid, name)]['trimedline'] +\
+                completeline = unfinished_dic[key]['trimedline'] +\
                             udic['trimedline']
-                entrydict = line_to_dic(completeline)
-                del unfinished_dic[(pid, name)]
+                if pid is None:
+                    entrydict = line_to_dic(completeline)
+                else:
+                    entrydict = line_to_dic_no_pid(completeline, pid=pid)
+                del unfinished_dic[key]
             except Exception as ex:
                 print ex
                 print unfinished_dic
                 continue
                 #raise
+        else:
+            # signals, exits, ...
+            continue
+
+        yield entrydict
+
+def track_files(entry_iter, filep=None):
+    """
+    Add filepath, offset and length to the entries of entry_iter, which
+    must be in time order, and yield them
+    """
+    if filep is None:
+        filep = {}
 
+    trace_name = 'tr-name'
+
+    for entrydict in entry_iter:
         maintain_filep( filep, entrydict )
         entrydict['trace_name'] = trace_name
+        yield entrydict
+
+def iter_entries(line_iter, pid=None):
+    """
+    Streaming version of parse_lines()
+    """
+    return track_files(iter_raw_entries(line_iter, pid=pid))
 
-        ret_table.append(entrydict)
+def parse_lines(line_iter, pid=None):
+    header=['pid', 'time', 'callname',
+            'offset', 'length', 'filepath', 'trace_name']
 
-    return ret_table
+    return list(iter_entries(line_iter, pid=pid))
 
 
 class StraceParser(object):
@@ -323,7 +394,10 @@ class StraceParser(object):
         return None
 
 
-def scan_trace(tracepath):
+def pid_of_trace_path(tracepath):
+    """
+    strace -ff -o name writes name.<pid>
+    """
     pid = tracepath.split('.')[-1]
 
     try:
@@ -331,10 +405,86 @@ def scan_trace(tracepath):
     except:
         pid = None
 
+    return pid
+
+def iter_trace(tracepath):
+    """
+    Yield the entries of tracepath one by one
+    """
     with open(tracepath, 'r') as f:
-        table = parse_lines(f, pid=pid)
+        for entrydict in iter_entries(f, pid=pid_of_trace_path(tracepath)):
+            yield entrydict
 
-    return table
+def scan_trace(tracepath):
+    return list(iter_trace(tracepath))
+
+
+def _iter_raw_trace(tracepath):
+    with open(tracepath, 'r') as f:
+        for entrydict in iter_raw_entries(f,
+                pid=pid_of_trace_path(tracepath)):
+            yield entrydict
+
+def _parse_trace_to_file(args):
+    """
+    Worker of iter_traces(): parse one trace file and pickle its raw entries
+    to out_path
+    """
+    tracepath, out_path = args
+    with open(out_path, 'wb') as f:
+        for entrydict in _iter_raw_trace(tracepath):
+            cPickle.dump(entrydict, f, cPickle.HIGHEST_PROTOCOL)
+    return out_path
+
+def _iter_pickled(path):
+    with open(path, 'rb') as f:
+        while True:
+            try:
+                yield cPickle.load(f)
+            except EOFError:
+                break
+
+def _time_keyed(file_no, entry_iter):
+    # the file number and sequence number break ties, so entries are never
+    # compared
+    for seq, entrydict in enumerate(entry_iter):
+        yield float(entrydict['time']), file_no, seq, entrydict
+
+def _merge_by_time(entry_iters):
+    keyed = [_time_keyed(i, it) for i, it in enumerate(entry_iters)]
+    for _, _, _, entrydict in heapq.merge(*keyed):
+        yield entrydict
+
+def iter_traces(tracepaths, n_workers=1):
+    """
+    Yield the entries of several trace files, e.g. the per-pid files of
+    strace -ff, merged by time. Threads share file descriptors, so the file
+    information is tracked on the merged entries.
+
+    With n_workers > 1, the files are parsed by a pool of processes into
+    temporary files first, then merged.
+    """
+    if n_workers <= 1:
+        raw_iters = [_iter_raw_trace(path) for path in tracepaths]
+        for entrydict in track_files(_merge_by_time(raw_iters)):
+            yield entrydict
+        return
+
+    tmpdir = tempfile.mkdtemp(prefix='strace-')
+    pool = multiprocessing.Pool(n_workers)
+    try:
+        args = [(path, os.path.join(tmpdir, '{}.pickle'.format(i)))
+                for i, path in enumerate(tracepaths)]
+        out_paths = pool.map(_parse_trace_to_file, args)
+        pool.close()
+
+        raw_iters = [_iter_pickled(path) for path in out_paths]
+        for entrydict in track_files(_merge_by_time(raw_iters)):
+            yield entrydict
+    finally:
+        pool.terminate()
+        pool.join()
+        shutil.rmtree(tmpdir)
 
 
 def parse_file(filepath):
@@ -0,0 +1,181 @@
+"""
+Statistics of an event file, collected while the event file is written and
+stored next to it as JSON (see stats_path_of()), so nobody has to rescan
+the trace to learn its traffic.
+"""
+import json
+import os
+
+OPERATIONS = ('read', 'write', 'discard')
+
+STATS_SUFFIX = '.stats.json'
+
+
+def stats_path_of(event_file_path):
+    return event_file_path + STATS_SUFFIX
+
+
+def pow2_bucket(value):
+    """
+    The smallest power of 2 >= value (0 for value <= 0)
+    """
+    if value <= 0:
+        return 0
+    bucket = 1
+    while bucket < value:
+        bucket <<= 1
+    return bucket
+
+
+class ExtentSet(object):
+    """
+    Union of [start, end) extents, for the footprint. Extents are buffered
+    and merged every max_pending additions, so memory is bounded by the
+    number of disjoint extents, not the number of requests.
+    """
+    def __init__(self, max_pending=100000):
+        self.extents = []
+        self.pending = []
+        self.max_pending = max_pending
+
+    def add(self, start, end):
+        self.pending.append((start, end))
+        if len(self.pending) >= self.max_pending:
+            self._merge()
+
+    def _merge(self):
+        extents = sorted(self.extents + self.pending)
+        self.pending = []
+        merged = []
+        for start, end in extents:
+            if merged and start <= merged[-1][1]:
+                if end > merged[-1][1]:
+                    merged[-1][1] = end
+            else:
+                merged.append([start, end])
+        # tuples, so they sort with the pending ones
+        self.extents = [tuple(e) for e in merged]
+
+    def total_bytes(self):
+        self._merge()
+        return sum(end - start for start, end in self.extents)
+
+
+class TraceStats(object):
+    """
+    Add every row of an event file with add(), then dump().
+
+    Summary:
+        n_events, first_timestamp, last_timestamp, duration
+        ops: per operation count, bytes and sectors
+        size_histogram: per operation, request sizes in power-of-2 buckets
+        inter_arrival_histogram: time between consecutive requests, in
+            power-of-2 microsecond buckets
+        footprint_bytes: per operation and 'all', bytes touched at least once
+        sequential_ratio: per operation and 'all', fraction of requests
+            starting where the previous request of the same operation ended
+    """
+    def __init__(self, sector_size):
+        self.sector_size = sector_size
+
+        self.n_events = 0
+        self.first_timestamp = None
+        self.last_timestamp = None
+
+        self.ops = dict((op, {'count': 0, 'bytes': 0, 'sectors': 0})
+                for op in OPERATIONS)
+        self.size_histogram = dict((op, {}) for op in OPERATIONS)
+        self.inter_arrival_histogram = {}
+
+        self._footprints = dict((op, ExtentSet()) for op in OPERATIONS)
+        self._all_footprint = ExtentSet()
+        self._next_offset = {}
+        self._sequential = dict((op, 0) for op in OPERATIONS)
+
+    def add(self, operation, offset, size, timestamp=None):
+        self.n_events += 1
+
+        op_stats = self.ops[operation]
+        op_stats['count'] += 1
+        op_stats['bytes'] += size
+        op_stats['sectors'] += size / self.sector_size
+
+        bucket = str(pow2_bucket(size))
+        hist = self.size_histogram[operation]
+        hist[bucket] = hist.get(bucket, 0) + 1
+
+        if timestamp is not None:
+            if self.first_timestamp is None:
+                self.first_timestamp = timestamp
+            else:
+                usec = (timestamp - self.last_timestamp) * 1000000
+                bucket = str(pow2_bucket(usec))
+                self.inter_arrival_histogram[bucket] = \
+                        self.inter_arrival_histogram.get(bucket, 0) + 1
+            self.last_timestamp = timestamp
+
+        if self._next_offset.get(operation, None) == offset:
+            self._sequential[operation] += 1
+        self._next_offset[operation] = offset + size
+
+        self._footprints[operation].add(offset, offset + size)
+        self._all_footprint.add(offset, offset + size)
+
+    def get_duration(self):
+        if self.first_timestamp is None:
+            return 0
+        return self.last_timestamp - self.first_timestamp
+
+    def count_sectors(self, operation):
+        return self.ops[operation]['sectors']
+
+    def summary(self):
+        footprint = dict((op, self._footprints[op].total_bytes())
+                for op in OPERATIONS)
+        footprint['all'] = self._all_footprint.total_bytes()
+
+        sequential_ratio = {}
+        for op in OPERATIONS:
+            count = self.ops[op]['count']
+            sequential_ratio[op] = \
+                    self._sequential[op] / float(count) if count > 0 else 0
+        n_seq = sum(self._sequential.values())
+        sequential_ratio['all'] = \
+                n_seq / float(self.n_events) if self.n_events > 0 else 0
+
+        return {
+            'n_events': self.n_events,
+            'sector_size': self.sector_size,
+            'first_timestamp': self.first_timestamp,
+            'last_timestamp': self.last_timestamp,
+            'duration': self.get_duration(),
+            'ops': self.ops,
+            'size_histogram': self.size_histogram,
+            'inter_arrival_histogram_usec': self.inter_arrival_histogram,
+            'footprint_bytes': footprint,
+            'sequential_ratio': sequential_ratio,
+            }
+
+    def dump(self, event_file_path):
+        with open(stats_path_of(event_file_path), 'w') as f:
+            json.dump(self.summary(), f, indent=4)
+
+
+def load_stats(event_file_path):
+    """
+    Return the summary stored next to event_file_path, or None if there is
+    none or it is older than the event file.
+    """
+    path = stats_path_of(event_file_path)
+    if not os.path.exists(path):
+        return None
+    if os.path.exists(event_file_path) and \
+            os.path.getmtime(path) < os.path.getmtime(event_file_path):
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def bandwidth_mb(summary, operation):
+    size_mb = summary['ops'][operation]['bytes'] / float(2**20)
+    return size_mb / summary['duration']
@@ -1,4 +1,5 @@
 import config
+import random
 import unittest
 import simpy
 
@@ -440,6 +441,177 @@ class TestControllerTag(unittest.TestCase):
         self.my_run()
 
 
+class TestControllerAnalyticalTag(TestControllerTag):
+    controller_class = 'ControllerAnalytical'
+
+    def my_run(self):
+        env = simpy.Environment()
+        set_exp_metadata(self.conf, save_data = False,
+                expname = 'default',
+                subexpname = 'default-sub')
+        runtime_update(self.conf)
+        rec = wiscsim.recorder.Recorder(output_target = self.conf['output_target'],
+            output_directory = self.conf['result_dir'],
+            verbose_level = self.conf['verbose_level'],
+            print_when_finished = False
+            )
+        rec.enable()
+
+        self.conf['flash_controller_class'] = self.controller_class
+        controller = wiscsim.controller.create_controller(env, self.conf, rec)
+        self.assertEqual(type(controller).__name__, self.controller_class)
+        env.process(self.access(env, controller))
+        env.run()
+
+
+class TestControllerBatchedTag(TestControllerAnalyticalTag):
+    controller_class = 'ControllerBatched'
+
+
+class TestControllerBatched(unittest.TestCase):
+    def create_controller(self):
+        conf = config.ConfigNewFlash()
+        conf['flash_config']['n_pages_per_block'] = 2
+        conf['flash_config']['n_blocks_per_plane'] = 2
+        conf['flash_config']['n_planes_per_chip'] = 1
+        conf['flash_config']['n_chips_per_package'] = 1
+        conf['flash_config']['n_packages_per_channel'] = 1
+        conf['flash_config']['n_channels_per_dev'] = 2
+        set_exp_metadata(conf, save_data = False,
+                expname = 'default',
+                subexpname = 'default-sub')
+        runtime_update(conf)
+        rec = wiscsim.recorder.Recorder(output_target = conf['output_target'],
+            output_directory = conf['result_dir'],
+            verbose_level = conf['verbose_level'],
+            print_when_finished = False
+            )
+        rec.enable()
+
+        env = simpy.Environment()
+        return env, wiscsim.controller.ControllerBatched(env, conf, rec)
+
+    def test_one_timeout_per_channel(self):
+        env, controller = self.create_controller()
+        rec = controller.recorder
+        wt = controller.channels[0].program_time
+
+        # 3 pages on channel 0, 1 page on channel 1
+        env.process(controller.rw_ppns([0, 1, 4, 2], 'write', tag = 'mytag'))
+        env.run()
+
+        self.assertEqual(env.now, wt * 3)
+        busy = rec.general_accumulator['channel_busy_time']
+        self.assertEqual(busy['channel_0-write-mytag'], wt * 3)
+        self.assertEqual(busy['channel_1-write-mytag'], wt)
+        self.assertEqual(rec.general_accumulator['flash_ops'][OP_WRITE], 4)
+
+    def create_request(self, channel, op):
+        req = wiscsim.controller.FlashRequest()
+        req.addr = wiscsim.controller.FlashAddress()
+        req.addr.channel = channel
+        req.operation = op
+        return req
+
+    def test_mixed_ops_one_batch_per_channel(self):
+        env, controller = self.create_controller()
+        rec = controller.recorder
+        rt = controller.channels[0].read_time
+        wt = controller.channels[0].program_time
+        et = controller.channels[0].erase_time
+
+        requests = [self.create_request(0, OP_READ),
+                    self.create_request(0, OP_WRITE),
+                    self.create_request(1, OP_ERASE),
+                    self.create_request(0, OP_READ)]
+        self.assertEqual(controller._channel_batches(
+            [(req.addr.channel, req.operation) for req in requests]),
+            [(0, [(OP_READ, 2), (OP_WRITE, 1)]), (1, [(OP_ERASE, 1)])])
+
+        env.process(controller.execute_request_list(requests, tag = 'mytag'))
+        # issued at the same time, waits for all ops of the first list
+        # on channel 0
+        env.process(controller.execute_request_list(
+            [self.create_request(0, OP_WRITE)], tag = 'other'))
+        env.run()
+
+        self.assertEqual(env.now, max(rt * 2 + wt + wt, et))
+        busy = rec.general_accumulator['channel_busy_time']
+        self.assertEqual(busy['channel_0-read-mytag'], rt * 2)
+        self.assertEqual(busy['channel_0-write-mytag'], wt)
+        self.assertEqual(busy['channel_1-erase-mytag'], et)
+        self.assertEqual(busy['channel_0-write-other'], wt)
+        flash_ops = rec.general_accumulator['flash_ops']
+        self.assertEqual(flash_ops[OP_READ], 2)
+        self.assertEqual(flash_ops[OP_WRITE], 2)
+        self.assertEqual(flash_ops[OP_ERASE], 1)
+
+
+class TestControllerAnalyticalSameTiming(unittest.TestCase):
+    """
+    Overlapping requests from many processes end at the same times and
+    add up the same channel_busy_time with both controllers
+    """
+    def setup_config(self):
+        self.conf = config.ConfigNewFlash()
+        self.conf['flash_config']['n_pages_per_block'] = 4
+        self.conf['flash_config']['n_blocks_per_plane'] = 4
+        self.conf['flash_config']['n_planes_per_chip'] = 1
+        self.conf['flash_config']['n_chips_per_package'] = 1
+        self.conf['flash_config']['n_packages_per_channel'] = 1
+        self.conf['flash_config']['n_channels_per_dev'] = 4
+        set_exp_metadata(self.conf, save_data = False,
+                expname = 'default',
+                subexpname = 'default-sub')
+        runtime_update(self.conf)
+
+    def requester(self, env, controller, i, ends):
+        rand = random.Random(i)
+        n_pages = controller.n_pages_per_dev
+        n_blocks = n_pages / controller.n_pages_per_block
+        for j in range(20):
+            # distinct issue times, so both controllers see the same order
+            yield env.timeout(rand.randint(1, 50000) + i * 0.001)
+            kind = rand.choice(['read', 'write', 'extent', 'erase'])
+            if kind == 'erase':
+                yield env.process(controller.erase_pbn_extent(
+                    rand.randrange(n_blocks), 1, tag = 'erase'))
+            elif kind == 'extent':
+                yield env.process(controller.rw_ppn_extent(
+                    rand.randrange(n_pages - 4), 4, 'write', tag = 'ext'))
+            else:
+                ppns = rand.sample(range(n_pages), rand.randint(1, 8))
+                yield env.process(controller.rw_ppns(ppns, kind, tag = kind))
+            ends.append((i, j, env.now))
+
+    def simulate(self, controller_class):
+        env = simpy.Environment()
+        rec = wiscsim.recorder.Recorder(output_target = self.conf['output_target'],
+            output_directory = self.conf['result_dir'],
+            verbose_level = self.conf['verbose_level'],
+            print_when_finished = False
+            )
+        rec.enable()
+        self.conf['flash_controller_class'] = controller_class
+        controller = wiscsim.controller.create_controller(env, self.conf, rec)
+
+        ends = []
+        for i in range(8):
+            env.process(self.requester(env, controller, i, ends))
+        env.run()
+        return sorted(ends), dict(rec.general_accumulator['channel_busy_time']), \
+                dict(rec.general_accumulator['flash_ops'])
+
+    def test_main(self):
+        self.setup_config()
+        ends, busy, ops = self.simulate('Controller3')
+        ends2, busy2, ops2 = self.simulate('ControllerAnalytical')
+
+        self.assertEqual(ends, ends2)
+        self.assertEqual(busy, busy2)
+        self.assertEqual(ops, ops2)
+
+
 
 def main():
     unittest.main()
@@ -1,3 +1,4 @@
+import pickle
 import unittest
 
 import wiscsim
@@ -27,6 +28,18 @@ class Test_lrucache(unittest.TestCase):
         del lrucache[1]
         self.assertEqual(lrucache.has_key(1), False)
 
+class Test_lrucache_pickle(unittest.TestCase):
+    def test_order(self):
+        lrucache = LruCache()
+        for i in range(5000):
+            lrucache[i] = str(i)
+        lrucache[10]
+
+        restored = pickle.loads(pickle.dumps(lrucache, 2))
+        self.assertEqual(list(restored.least_to_most_items()),
+                list(lrucache.least_to_most_items()))
+        self.assertEqual(restored.most_recently_used_key(), 10)
+
 class Test_LruCache(unittest.TestCase):
     def get_lrucache(self):
         d = LruCache()
@@ -118,6 +131,20 @@ class Test_LruCache(unittest.TestCase):
         self.assertEqual(d.victim_key(), 10)
         self.assertEqual(d.most_recently_used_key(), 9)
 
+    def test_add_to_least_used_when_empty(self):
+        d = LruCache()
+        d.add_as_least_used(1, 10)
+        d.add_as_least_used(2, 20)
+        self.assertEqual(d.most_recently_used_key(), 1)
+        self.assertEqual(list(d), [1, 2])
+
+        d[2]
+        self.assertEqual(d.most_recently_used_key(), 2)
+        self.assertEqual([key for key, _ in d.least_to_most_items()], [1, 2])
+        d[3] = 30
+        self.assertEqual([key for key, _ in d.least_to_most_items()],
+                [1, 2, 3])
+
     def _test_performance(self):
         d = LruDict()
         for i in range(2048):
@@ -1,5 +1,6 @@
 import unittest
 import wiscsim
+from commons import *
 from wiscsim.ftlsim_commons import *
 
 
@@ -44,6 +45,63 @@ class TestNCQSingleQueueWithWaitTime(unittest.TestCase):
         ncq.slots.release(req)
 
 
+class Item(object):
+    def __init__(self, operation, duration):
+        self.operation = operation
+        self.duration = duration
+
+
+class TestNCQBarrier(unittest.TestCase):
+    def test_barrier(self):
+        env = simpy.Environment()
+        ncq = NCQSingleQueue(4, env)
+        finished = []
+
+        def user():
+            while True:
+                item = yield ncq.queue.get()
+                if item.operation == OP_BARRIER:
+                    yield env.process(ncq.barrier())
+                    finished.append(('barrier', env.now))
+                elif item.operation == 'stop':
+                    ncq.done()
+                    break
+                else:
+                    yield env.timeout(item.duration)
+                    finished.append((item.operation, env.now))
+                ncq.done()
+
+        items = [Item('a', 5), Item('b', 3), Item(OP_BARRIER, 0),
+                Item('c', 1), Item(OP_BARRIER, 0), Item(OP_BARRIER, 0),
+                Item('d', 1)] + [Item('stop', 0)] * 4
+        for item in items:
+            ncq.queue.put(item)
+        for i in range(4):
+            env.process(user())
+        env.run()
+
+        self.assertEqual(finished, [('b', 3), ('a', 5), ('barrier', 5),
+            ('c', 6), ('barrier', 6), ('barrier', 6), ('d', 7)])
+        self.assertEqual(ncq.n_in_flight(), 0)
+
+    def test_without_barrier(self):
+        env = simpy.Environment()
+        ncq = NCQSingleQueue(2, env)
+        got = []
+
+        def user():
+            for i in range(2):
+                item = yield ncq.queue.get()
+                got.append((item.operation, env.now))
+
+        env.process(user())
+        env.process(user())
+        for operation in 'abcd':
+            ncq.queue.put(Item(operation, 0))
+        env.run()
+        self.assertEqual(got, [('a', 0), ('b', 0), ('c', 0), ('d', 0)])
+
+
 def main():
     unittest.main()
 
@@ -0,0 +1,58 @@
+import random
+import unittest
+
+from wiscsim import addrtrans
+
+
+# 2 channels, 2 packages, 2 chips, 2 planes, 4 blocks of 8 pages
+HIERARCHY = [8 * 4 * 2 * 2 * 2, 8 * 4 * 2 * 2, 8 * 4 * 2, 8 * 4, 8]
+
+
+def loop_location(page_no):
+    location = []
+    for count in HIERARCHY:
+        location.append(page_no / count)
+        page_no = page_no % count
+    location.append(page_no)
+    return location
+
+
+class TestAddressTranslator(unittest.TestCase):
+    def setUp(self):
+        n_pages = HIERARCHY[0] * 2
+        rand = random.Random(1)
+        self.ppns = [rand.randrange(n_pages) for _ in range(500)]
+        self.translators = [
+                addrtrans.AddressTranslator(HIERARCHY, use_numpy=False),
+                addrtrans.AddressTranslator(HIERARCHY)]
+
+    def test_locations(self):
+        expected = [loop_location(ppn) for ppn in self.ppns]
+        for translator in self.translators:
+            self.assertEqual(translator.locations(self.ppns), expected)
+            self.assertEqual(translator.locations(self.ppns[:3]),
+                    expected[:3])
+            self.assertEqual(translator.location(self.ppns[0]), expected[0])
+
+    def test_translate(self):
+        for translator in self.translators:
+            columns = translator.translate(self.ppns)
+            for i, level in enumerate(addrtrans.LEVELS):
+                self.assertEqual(list(columns[level]),
+                        [loop_location(ppn)[i] for ppn in self.ppns])
+
+    def test_channels(self):
+        channels = [loop_location(ppn)[0] for ppn in self.ppns]
+        expected = sorted((channel, channels.count(channel))
+                for channel in set(channels))
+        for translator in self.translators:
+            self.assertEqual(translator.channels_of_ppns(self.ppns), channels)
+            self.assertEqual(translator.channel_counts(self.ppns), expected)
+            self.assertEqual(translator.channel_counts([1, 2, 300]),
+                    [(0, 2), (1, 1)])
+            self.assertEqual(translator.channel_of_pbn(4 * 2 * 2 * 2),
+                    1)
+
+
+if __name__ == '__main__':
+    unittest.main()
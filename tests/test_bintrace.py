@@ -0,0 +1,90 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import config
+from wiscsim import bintrace, hostevent
+from commons import *
+
+
+SQLITE_EVENTS = "tests/testdata/sqlitewal-update/subexp-7928737328932659543-ext4-10-07-23-50-10--2726320246496492803/blkparse-events-for-ftlsim.txt"
+
+
+def text_events(conf, path):
+    return hostevent.EventIterator(conf, hostevent.FileLineIterator(path))
+
+
+class TestBinaryTrace(unittest.TestCase):
+    def setUp(self):
+        self.conf = config.ConfigNCQFTL()
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def assert_same_events(self, events_a, events_b):
+        n = 0
+        for a, b in zip(events_a, events_b):
+            self.assertEqual(a.pid, b.pid)
+            self.assertEqual(a.action, b.action)
+            self.assertEqual(a.operation, b.operation)
+            self.assertEqual(a.offset, b.offset)
+            self.assertEqual(a.size, b.size)
+            self.assertEqual(float(a.timestamp), float(b.timestamp))
+            self.assertEqual(a.pre_wait_time, b.pre_wait_time)
+            self.assertEqual(str(a.sync), str(b.sync))
+            n += 1
+        return n
+
+    def test_convert_and_read(self):
+        binpath = os.path.join(self.tmpdir, 'events.bin')
+        n = bintrace.convert_text_to_binary(SQLITE_EVENTS, binpath,
+                self.conf['event_file_column_names'], block_events=333)
+        self.assertEqual(n, 10000)
+        self.assertTrue(bintrace.is_binary_trace(binpath))
+        self.assertFalse(bintrace.is_binary_trace(SQLITE_EVENTS))
+
+        reader = bintrace.BinaryTraceReader(binpath)
+        self.assertEqual(len(reader), 10000)
+        self.assertEqual(reader.n_blocks, 31)
+        reader.close()
+
+        n = self.assert_same_events(
+                text_events(self.conf, SQLITE_EVENTS),
+                bintrace.BinaryEventIterator(self.conf, binpath))
+        self.assertEqual(n, 10000)
+
+    def test_na_and_empty(self):
+        binpath = os.path.join(self.tmpdir, 'empty.bin')
+        with bintrace.BinaryTraceWriter(binpath) as writer:
+            pass
+        self.assertEqual(list(bintrace.BinaryEventIterator(self.conf, binpath)),
+                [])
+
+        with bintrace.BinaryTraceWriter(binpath) as writer:
+            writer.append(pid=3, action='D', operation='discard', offset=512,
+                    size=4096, timestamp=0.5, pre_wait_time='NA', sync='True')
+        events = list(bintrace.BinaryEventIterator(self.conf, binpath))
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0].operation, OP_DISCARD)
+        self.assertEqual(events[0].pre_wait_time, 'NA')
+        self.assertEqual(events[0].sync, True)
+        self.assertEqual(events[0].sector, 1)
+
+    def test_event_iterator_uses_sidecar(self):
+        textpath = os.path.join(self.tmpdir, 'events.txt')
+        shutil.copy(SQLITE_EVENTS, textpath)
+
+        event_iter = bintrace.event_iterator(self.conf, textpath)
+        self.assertIsInstance(event_iter, hostevent.EventIterator)
+
+        bintrace.convert_text_to_binary(textpath,
+                bintrace.binary_path_of(textpath),
+                self.conf['event_file_column_names'])
+        event_iter = bintrace.event_iterator(self.conf, textpath)
+        self.assertIsInstance(event_iter, bintrace.BinaryEventIterator)
+
+
+if __name__ == '__main__':
+    unittest.main()
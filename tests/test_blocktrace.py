@@ -0,0 +1,231 @@
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+import config
+from pyreuse.sysutils import blocktrace, blktracebin
+from commons import *
+
+
+BLKPARSE_OUTPUT = "tests/testdata/blkparse-output.txt"
+
+
+def read_file(path):
+    with open(path, 'r') as f:
+        return f.read()
+
+
+class BlktraceTestBase(unittest.TestCase):
+    def setUp(self):
+        self.conf = config.ConfigNCQFTL()
+        self.tmpdir = tempfile.mkdtemp()
+
+        # shuffle data lines so sorting is not trivial
+        with open(BLKPARSE_OUTPUT, 'r') as f:
+            lines = f.readlines()
+        random.Random(7).shuffle(lines)
+        self.raw_path = os.path.join(self.tmpdir, 'blkparse-output.txt')
+        with open(self.raw_path, 'w') as f:
+            f.writelines(lines)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def in_mem_event_file(self, padding_bytes=0):
+        path = os.path.join(self.tmpdir, 'inmem-events.txt')
+        parser = blocktrace.BlktraceResultInMem(self.conf['sector_size'],
+                self.conf['event_file_column_names'],
+                self.raw_path, path, padding_bytes=padding_bytes)
+        parser.create_event_file()
+        return path, parser
+
+
+class TestBlktraceResultExtSort(BlktraceTestBase):
+    def ext_sort_event_file(self, mem_budget_bytes, max_merge_fanin=64):
+        path = os.path.join(self.tmpdir, 'extsort-events.txt')
+        parser = blocktrace.BlktraceResultExtSort(self.conf['sector_size'],
+                self.conf['event_file_column_names'],
+                self.raw_path, path, padding_bytes=8*MB,
+                mem_budget_bytes=mem_budget_bytes,
+                max_merge_fanin=max_merge_fanin)
+        parser.create_event_file()
+        return path, parser
+
+    def test_in_memory(self):
+        inmem_path, inmem = self.in_mem_event_file(padding_bytes=8*MB)
+        path, parser = self.ext_sort_event_file(mem_budget_bytes=GB)
+
+        self.assertEqual(parser.n_runs, 0)
+        self.assertEqual(read_file(path), read_file(inmem_path))
+
+    def test_spilled_runs(self):
+        inmem_path, inmem = self.in_mem_event_file(padding_bytes=8*MB)
+        path, parser = self.ext_sort_event_file(mem_budget_bytes=16*KB,
+                max_merge_fanin=3)
+
+        self.assertTrue(parser.n_runs > 3)
+        self.assertEqual(read_file(path), read_file(inmem_path))
+        self.assertEqual(parser.count_sectors('write'),
+                inmem.count_sectors('write'))
+        self.assertEqual(parser.count_sectors('read'),
+                inmem.count_sectors('read'))
+        self.assertAlmostEqual(parser.get_duration(), inmem.get_duration())
+
+        # no temporary files left
+        self.assertListEqual(sorted(os.listdir(self.tmpdir)),
+            ['blkparse-output.txt', 'extsort-events.txt',
+             'extsort-events.txt.stats.json', 'inmem-events.txt',
+             'inmem-events.txt.stats.json'])
+
+
+class TestBlktraceResultParallel(BlktraceTestBase):
+    def parallel_event_file(self, do_sort=True, **kwargs):
+        path = os.path.join(self.tmpdir, 'parallel-events.txt')
+        parser = blocktrace.BlktraceResultParallel(self.conf['sector_size'],
+                self.conf['event_file_column_names'],
+                self.raw_path, path, padding_bytes=8*MB, do_sort=do_sort,
+                **kwargs)
+        parser.create_event_file()
+        return path, parser
+
+    def test_split_ranges(self):
+        parser = blocktrace.BlktraceResultParallel(self.conf['sector_size'],
+                self.conf['event_file_column_names'],
+                self.raw_path, None, n_workers=7)
+        ranges = parser.split_ranges()
+        self.assertTrue(len(ranges) >= 7)
+        self.assertEqual(ranges[0][0], 0)
+        self.assertEqual(ranges[-1][1], os.path.getsize(self.raw_path))
+
+        data = read_file(self.raw_path)
+        for (start, end), (next_start, _) in zip(ranges, ranges[1:]):
+            self.assertEqual(end, next_start)
+            self.assertEqual(data[end - 1], '\n')
+
+    def test_sorted(self):
+        inmem_path, inmem = self.in_mem_event_file(padding_bytes=8*MB)
+        path, parser = self.parallel_event_file(n_workers=4,
+                chunk_bytes=8*KB, max_merge_fanin=3)
+
+        self.assertTrue(parser.n_runs > 4)
+        self.assertEqual(read_file(path), read_file(inmem_path))
+        self.assertEqual(parser.count_sectors('write'),
+                inmem.count_sectors('write'))
+        self.assertAlmostEqual(parser.get_duration(), inmem.get_duration())
+
+    def test_unsorted(self):
+        expected_path = os.path.join(self.tmpdir, 'events.txt')
+        blocktrace.BlktraceResult(self.conf['sector_size'],
+                self.conf['event_file_column_names'],
+                self.raw_path, expected_path, padding_bytes=8*MB,
+                do_sort=False).create_event_file()
+
+        path, parser = self.parallel_event_file(do_sort=False, n_workers=3)
+        self.assertEqual(read_file(path), read_file(expected_path))
+
+
+def act(action_type, *categories):
+    action = action_type
+    for category in categories:
+        action |= blktracebin.tc_act(category)
+    return action
+
+
+class TestBlktraceResultBinary(unittest.TestCase):
+    def setUp(self):
+        self.conf = config.ConfigNCQFTL()
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write_fixtures(self):
+        """
+        Two per-CPU files, the second one in big endian, plus the blkparse
+        output they should be equivalent to.
+        """
+        bt = blktracebin
+        dev = (8 << blktracebin.MINORBITS) | 16
+        issue_w = act(bt.BLK_TA_ISSUE, bt.BLK_TC_ISSUE, bt.BLK_TC_WRITE,
+                bt.BLK_TC_SYNC)
+        issue_r = act(bt.BLK_TA_ISSUE, bt.BLK_TC_ISSUE, bt.BLK_TC_READ)
+        issue_d = act(bt.BLK_TA_ISSUE, bt.BLK_TC_ISSUE, bt.BLK_TC_DISCARD)
+        complete_r = act(bt.BLK_TA_COMPLETE, bt.BLK_TC_COMPLETE,
+                bt.BLK_TC_READ)
+        flush = act(bt.BLK_TA_ISSUE, bt.BLK_TC_ISSUE, bt.BLK_TC_FLUSH)
+        notify = act(0, bt.BLK_TC_NOTIFY)
+        pc = act(bt.BLK_TA_ISSUE, bt.BLK_TC_ISSUE, bt.BLK_TC_PC)
+
+        cpu0 = [
+            bt.pack_trace(1, 1000, 2048, 4096, issue_w, 440, dev, 0),
+            bt.pack_trace(2, 1500, 0, 0, flush, 440, dev, 0),
+            bt.pack_trace(3, 3000, 4096, 8192, issue_d, 440, dev, 0),
+            bt.pack_trace(4, 2 * 10**9 + 7, 8, 512, issue_w, 12, dev, 0),
+            ]
+        cpu1 = [
+            bt.pack_trace(1, 500, 0, 0, notify, 441, dev, 1,
+                pdu='kworker\0', order='>'),
+            bt.pack_trace(2, 1200, 16, 4096, issue_r, 441, dev, 1, order='>'),
+            bt.pack_trace(3, 1300, 0, 24, pc, 441, dev, 1, pdu='\x12' * 24,
+                order='>'),
+            bt.pack_trace(4, 2500, 16, 4096, complete_r, 0, dev, 1,
+                order='>'),
+            ]
+        for cpu, traces in enumerate([cpu0, cpu1]):
+            path = os.path.join(self.tmpdir, 'trace.blktrace.{}'.format(cpu))
+            with open(path, 'wb') as f:
+                f.write(''.join(traces))
+
+        blkparse_lines = [
+            "  8,16   0        1     0.000000500   440  D  WS 2048 + 8 [kworker]",
+            "  8,16   1        2     0.000000700   441  D   R 16 + 8 [a]",
+            "  8,16   0        2     0.000001000   440  D   F [kworker]",
+            "  8,16   1        4     0.000002000     0  C   R 16 + 8 [0]",
+            "  8,16   0        3     0.000002500   440  D   D 4096 + 16 [a]",
+            "  8,16   0        4     1.999999507    12  D  WS 8 + 1 [a]",
+            ]
+        raw_path = os.path.join(self.tmpdir, 'blkparse-output.txt')
+        with open(raw_path, 'w') as f:
+            f.write('\n'.join(blkparse_lines) + '\n')
+        return raw_path
+
+    def test_same_as_blkparse(self):
+        raw_path = self.write_fixtures()
+        inmem_path = os.path.join(self.tmpdir, 'inmem-events.txt')
+        inmem = blocktrace.BlktraceResultInMem(self.conf['sector_size'],
+                self.conf['event_file_column_names'],
+                raw_path, inmem_path, padding_bytes=512)
+        inmem.create_event_file()
+
+        path = os.path.join(self.tmpdir, 'binary-events.txt')
+        parser = blocktrace.BlktraceResultBinary(self.conf['sector_size'],
+                self.conf['event_file_column_names'],
+                self.tmpdir, 'trace', path, padding_bytes=512)
+        parser.create_event_file()
+
+        self.assertEqual(read_file(path), read_file(inmem_path))
+        self.assertEqual(parser.n_events, 5)
+        self.assertEqual(parser.count_sectors('write'), 9)
+        self.assertEqual(parser.count_sectors('discard'), 16)
+        self.assertAlmostEqual(parser.get_duration(), inmem.get_duration())
+
+    def test_rwbs(self):
+        bt = blktracebin
+        self.assertEqual(bt.fill_rwbs(act(bt.BLK_TA_ISSUE, bt.BLK_TC_FLUSH,
+            bt.BLK_TC_WRITE, bt.BLK_TC_FUA, bt.BLK_TC_SYNC), 4096), 'FWFS')
+        self.assertEqual(bt.fill_rwbs(act(bt.BLK_TA_ISSUE, bt.BLK_TC_READ,
+            bt.BLK_TC_AHEAD, bt.BLK_TC_META), 4096), 'RAM')
+        self.assertEqual(bt.fill_rwbs(act(bt.BLK_TA_ISSUE), 0), 'N')
+
+    def test_bad_magic(self):
+        path = os.path.join(self.tmpdir, 'trace.blktrace.0')
+        with open(path, 'wb') as f:
+            f.write('\0' * blktracebin.TRACE_SIZE)
+        with self.assertRaises(RuntimeError):
+            list(blktracebin.iter_cpu_file(path))
+
+
+if __name__ == '__main__':
+    unittest.main()
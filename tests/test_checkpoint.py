@@ -0,0 +1,97 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from commons import *
+from wiscsim import checkpoint, hostevent, simulator
+from tests import test_nkftl, test_ssdframework
+from tests.test_ssdframework import create_ssd, run_events
+
+
+def write_events(conf, start, count):
+    return [hostevent.Event(512, 1, OP_WRITE, i * conf.page_size,
+                conf.page_size) for i in range(start, start + count)]
+
+
+class CheckpointTestMixin(object):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'checkpoint.gz')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_restore(self):
+        conf = self.create_config()
+        # overwrite the first events, so the mappings matter
+        warmup = write_events(conf, 0, 200)
+        workload = write_events(conf, 100, 200) + \
+                [hostevent.Event(512, 1, OP_READ, 0, 200 * conf.page_size)]
+
+        ssd = create_ssd(conf)
+        ssd.recorder.enable()
+        run_events(ssd, warmup + [
+            hostevent.ControlEvent(OP_BARRIER),
+            hostevent.ControlEvent(OP_CHECKPOINT, arg1=self.path)] +
+            workload)
+        expected = ssd.recorder.get_result_summary()
+
+        saved = checkpoint.load(self.path)
+        restored = create_ssd(self.create_config(), now=saved['now'])
+        restored.recorder.enable()
+        checkpoint.restore(restored, saved)
+        run_events(restored, workload)
+
+        self.assertEqual(restored.env.now, ssd.env.now)
+        self.assertEqual(restored.recorder.get_result_summary(), expected)
+
+    def test_different_device(self):
+        ssd = create_ssd(self.create_config())
+        run_events(ssd, [hostevent.ControlEvent(OP_CHECKPOINT,
+            arg1=self.path)])
+
+        conf = self.create_config()
+        conf['flash_config']['n_channels_per_dev'] = 2
+        with self.assertRaises(RuntimeError):
+            checkpoint.restore(create_ssd(conf),
+                    checkpoint.load(self.path))
+
+
+class TestCheckpointDftldes(CheckpointTestMixin, unittest.TestCase):
+    def create_config(self):
+        return test_ssdframework.create_config()
+
+
+class TestCheckpointNkftl(CheckpointTestMixin, unittest.TestCase):
+    def create_config(self):
+        conf = test_nkftl.create_config()
+        conf['ftl_type'] = 'nkftl2'
+        return conf
+
+
+class TestCheckpointOptions(unittest.TestCase):
+    def test_save_events(self):
+        conf = test_ssdframework.create_config()
+        self.assertEqual(list(checkpoint.save_events(conf)), [])
+
+        conf['checkpoint_save_path'] = 'checkpoint.gz'
+        events = list(checkpoint.save_events(conf))
+        self.assertEqual([event.operation for event in events],
+                [OP_BARRIER, OP_CHECKPOINT])
+        self.assertEqual(events[-1].arg1, 'checkpoint.gz')
+
+    def test_not_supported(self):
+        # they would run the workload on an unformatted device
+        for key in ['checkpoint_save_path', 'checkpoint_restore_path']:
+            for simulator_class in ['SimulatorNonDESSpeed',
+                    'SimulatorNonDESe2e', 'SimulatorDESSync']:
+                conf = test_nkftl.create_config()
+                conf[key] = 'checkpoint.gz'
+                with self.assertRaisesRegexp(RuntimeError,
+                        'does not support checkpoints'):
+                    simulator.create_simulator(simulator_class, conf, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
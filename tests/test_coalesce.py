@@ -0,0 +1,97 @@
+import unittest
+
+import config
+from wiscsim import coalesce, hostevent
+from commons import *
+
+
+def data_event(operation, offset, size, timestamp, pid=1, action='D'):
+    return hostevent.Event(sector_size=512, pid=pid, operation=operation,
+            offset=offset, size=size, timestamp=timestamp, action=action)
+
+
+class TestRequestCoalescer(unittest.TestCase):
+    def coalesce(self, events, max_bytes=128*KB, window_sec=0.001):
+        coalescer = coalesce.RequestCoalescer(events, 512,
+                max_bytes=max_bytes, window_sec=window_sec)
+        return list(coalescer), coalescer
+
+    def test_sequential_writes(self):
+        events = [data_event(OP_WRITE, i * 4*KB, 4*KB, str(i * 0.0001))
+                for i in range(8)]
+        out, coalescer = self.coalesce(events)
+        self.assertEqual(len(out), 1)
+        self.assertEqual(out[0].offset, 0)
+        self.assertEqual(out[0].size, 32*KB)
+        self.assertEqual(out[0].sector_count, 32*KB / 512)
+        self.assertEqual(coalescer.n_input_events, 8)
+        self.assertEqual(coalescer.n_merged_events, 7)
+        # the events read are not changed
+        self.assertEqual([(e.offset, e.size, e.sector_count) for e in events],
+                [(i * 4*KB, 4*KB, 4*KB / 512) for i in range(8)])
+
+    def test_not_merged(self):
+        events = [
+            data_event(OP_WRITE, 0, 4*KB, '0.0'),
+            # different operation
+            data_event(OP_READ, 4*KB, 4*KB, '0.0001'),
+            # not contiguous
+            data_event(OP_READ, 12*KB, 4*KB, '0.0002'),
+            # too late
+            data_event(OP_READ, 16*KB, 4*KB, '0.1'),
+            # different pid
+            data_event(OP_READ, 20*KB, 4*KB, '0.1', pid=2),
+            ]
+        out, coalescer = self.coalesce(events)
+        self.assertEqual([e.offset for e in out],
+                [0, 4*KB, 12*KB, 16*KB, 20*KB])
+        self.assertEqual(coalescer.n_merged_events, 0)
+
+    def test_max_bytes(self):
+        events = [data_event(OP_WRITE, i * 4*KB, 4*KB, '0.0')
+                for i in range(8)]
+        out, _ = self.coalesce(events, max_bytes=8*KB)
+        self.assertEqual([e.size for e in out], [8*KB] * 4)
+
+    def test_control_event_ends_run(self):
+        events = [
+            data_event(OP_WRITE, 0, 4*KB, '0.0'),
+            hostevent.ControlEvent(operation=OP_BARRIER),
+            data_event(OP_WRITE, 4*KB, 4*KB, '0.0'),
+            ]
+        out, _ = self.coalesce(events)
+        self.assertEqual([e.operation for e in out],
+                [OP_WRITE, OP_BARRIER, OP_WRITE])
+
+    def test_other_data_events_end_run(self):
+        events = [
+            data_event(OP_WRITE, 0, 4*KB, '0.0'),
+            data_event(OP_WRITE, 4*KB, 4*KB, '0.0'),
+            data_event(OP_WRITE, 0, 4*KB, '0.0', action='C'),
+            data_event(OP_WRITE, 8*KB, 4*KB, '0.0'),
+            ]
+        out, coalescer = self.coalesce(events)
+        # in trace order
+        self.assertEqual([(e.action, e.offset, e.size) for e in out],
+                [('D', 0, 8*KB), ('C', 0, 4*KB), ('D', 8*KB, 4*KB)])
+        self.assertEqual(coalescer.n_input_events, 4)
+        self.assertEqual(coalescer.n_merged_events, 1)
+
+    def test_no_window(self):
+        events = [data_event(OP_WRITE, i * 4*KB, 4*KB, None)
+                for i in range(4)]
+        out, _ = self.coalesce(events, window_sec=None)
+        self.assertEqual(len(out), 1)
+
+    def test_disabled_by_default(self):
+        conf = config.ConfigNCQFTL()
+        events = []
+        self.assertTrue(coalesce.coalesced(conf, events) is events)
+
+        conf['coalesce_requests'] = True
+        self.assertTrue(isinstance(coalesce.coalesced(conf, events),
+            coalesce.RequestCoalescer))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import config
+from pyreuse.general import compressedfile
+from pyreuse.sysutils import blocktrace
+from wiscsim import hostevent
+from commons import *
+
+
+BLKPARSE_OUTPUT = "tests/testdata/blkparse-output.txt"
+
+
+def read_file(path):
+    with compressedfile.open_file(path, 'r') as f:
+        return f.read()
+
+
+class TestCompressedFile(unittest.TestCase):
+    def setUp(self):
+        self.conf = config.ConfigNCQFTL()
+        self.tmpdir = tempfile.mkdtemp()
+        self.data = read_file(BLKPARSE_OUTPUT)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def compressed_copy(self, ext):
+        path = os.path.join(self.tmpdir, 'blkparse-output.txt' + ext)
+        f = compressedfile.open_file(path, 'w')
+        f.write(self.data)
+        compressedfile.close_file(f)
+        return path
+
+    def test_round_trip(self):
+        for ext in ('.gz', '.bz2', '.xz'):
+            path = self.compressed_copy(ext)
+            self.assertTrue(compressedfile.is_compressed(path))
+            self.assertNotEqual(open(path, 'rb').read(), self.data)
+            self.assertEqual(read_file(path), self.data)
+
+            lines = list(hostevent.FileLineIterator(path))
+            self.assertEqual(lines,
+                    list(hostevent.FileLineIterator(BLKPARSE_OUTPUT)))
+
+    def test_append(self):
+        path = self.compressed_copy('.gz')
+        with compressedfile.open_file(path, 'a') as f:
+            f.write('more\n')
+        self.assertEqual(read_file(path), self.data + 'more\n')
+
+    def test_python_modules(self):
+        for ext in ('.gz', '.bz2'):
+            path = self.compressed_copy(ext)
+            f = compressedfile._open_with_module(path, 'r',
+                    compressedfile.COMPRESSIONS[ext][1])
+            self.assertEqual(f.read(), self.data)
+            f.close()
+
+    def test_stop_reading_early(self):
+        path = self.compressed_copy('.gz')
+        for line in hostevent.FileLineIterator(path):
+            break
+
+    def test_blktrace_results(self):
+        columns = self.conf['event_file_column_names']
+        expected = os.path.join(self.tmpdir, 'events.txt')
+        blocktrace.BlktraceResultInMem(512, columns, BLKPARSE_OUTPUT,
+                expected).create_event_file()
+
+        raw_path = self.compressed_copy('.bz2')
+        for i, cls in enumerate([blocktrace.BlktraceResultInMem,
+                blocktrace.BlktraceResultExtSort]):
+            path = os.path.join(self.tmpdir, 'events-{}.txt.gz'.format(i))
+            cls(512, columns, raw_path, path).create_event_file()
+            self.assertEqual(read_file(path), read_file(expected))
+
+        path = os.path.join(self.tmpdir, 'events-par.txt.xz')
+        blocktrace.BlktraceResultParallel(512, columns, raw_path, path,
+                n_workers=2, chunk_bytes=4*KB).create_event_file()
+        self.assertEqual(read_file(path), read_file(expected))
+
+        expected = os.path.join(self.tmpdir, 'events-unsorted.txt')
+        blocktrace.BlktraceResult(512, columns, BLKPARSE_OUTPUT,
+                expected).create_event_file()
+        path = os.path.join(self.tmpdir, 'events-unsorted.txt.gz')
+        blocktrace.BlktraceResult(512, columns, raw_path,
+                path).create_event_file()
+        self.assertEqual(read_file(path), read_file(expected))
+
+    def test_config_paths(self):
+        self.conf['result_dir'] = '/tmp/x'
+        self.assertEqual(self.conf.get_blkparse_result_path(),
+                '/tmp/x/blkparse-output.txt')
+        self.conf['compress_blkparse_output'] = 'xz'
+        self.assertEqual(self.conf.get_blkparse_result_path_mkfs(),
+                '/tmp/x/blkparse-output-mkfs.txt.xz')
+
+
+if __name__ == '__main__':
+    unittest.main()
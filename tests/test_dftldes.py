@@ -6,9 +6,11 @@ from wiscsim import ftlsim_commons
 
 from utilities import utils
 import wiscsim
+from wiscsim import hostevent
+from tests import test_ssdframework
 from wiscsim.ftlsim_commons import Extent
 from wiscsim.dftldes import LpnTable, LpnTableMvpn, UNINITIATED, \
-        split_ext_by_segment
+        split_ext_by_segment, CompactLpnTable, CompactLpnTableMvpn
 from config import WLRUNNER, LBAGENERATOR, LBAMULTIPROC
 from commons import *
 from utilities.utils import get_expname
@@ -1018,8 +1020,10 @@ class TestDiscard(unittest.TestCase):
 
 
 class TestLpnTable(unittest.TestCase):
+    table_class = LpnTable
+
     def test_init(self):
-        table = LpnTable(8)
+        table = self.table_class(8)
         self.assertEqual(table.n_free_rows(), 8)
         self.assertEqual(table.n_locked_free_rows(), 0)
         self.assertEqual(table.n_used_rows(), 0)
@@ -1028,7 +1032,7 @@ class TestLpnTable(unittest.TestCase):
         """
         lock before adding, also you need to tell it which row you add to
         """
-        table = LpnTable(8)
+        table = self.table_class(8)
 
         rowid = table.lock_free_row()
         self.assertEqual(table.n_free_rows(), 7)
@@ -1062,7 +1066,7 @@ class TestLpnTable(unittest.TestCase):
         self.assertEqual(table.n_used_rows(), 0)
 
     def test_boundaries(self):
-        table = LpnTable(8)
+        table = self.table_class(8)
 
         for i in range(8):
             table.lock_free_row()
@@ -1070,7 +1074,7 @@ class TestLpnTable(unittest.TestCase):
         self.assertEqual(table.lock_free_row(), None)
 
     def test_multiple_adds(self):
-        table = LpnTable(8)
+        table = self.table_class(8)
 
         locked_rows = table.lock_free_rows(3)
         self.assertEqual(len(locked_rows), 3)
@@ -1086,7 +1090,7 @@ class TestLpnTable(unittest.TestCase):
         self.assertEqual(table.lpn_to_ppn(3), 33)
 
     def test_locking_lpn(self):
-        table = LpnTable(8)
+        table = self.table_class(8)
 
         locked_rows = table.lock_free_rows(3)
         self.assertEqual(len(locked_rows), 3)
@@ -1100,6 +1104,134 @@ class TestLpnTable(unittest.TestCase):
         self.assertEqual(table.n_used_rows(), 2)
         self.assertEqual(table.n_locked_used_rows(), 1)
 
+    def test_counts_follow_rows(self):
+        """
+        MappingCache also changes the states of rows directly
+        """
+        table = self.table_class(8)
+        def assert_counts():
+            states = collections.Counter(row.state for row in table.rows())
+            self.assertEqual(table.stats(), states)
+            self.assertEqual(table.n_free_rows(),
+                    states[wiscsim.dftldes.FREE])
+
+        locked_rows = table.lock_free_rows(8)
+        table.add_lpns(locked_rows, dict((i, i * 10) for i in range(8)),
+                False)
+        self.assertEqual(table.lock_free_row(), None)
+
+        # as MappingCache.drop() and __evict_entry_for_load() do
+        row = table.rows()[locked_rows[5]]
+        row.state = wiscsim.dftldes.USED_AND_HOLD
+        assert_counts()
+        row.state = wiscsim.dftldes.USED
+        table.delete_lpn_and_lock(5)
+        row.state = wiscsim.dftldes.FREE
+        assert_counts()
+
+        self.assertEqual(table.lock_free_row(), row.rowid)
+        self.assertEqual(table.lock_free_row(), None)
+        assert_counts()
+
+    def test_free_row_reused(self):
+        table = self.table_class(4)
+        rowid = table.lock_free_row()
+        table.unlock_free_row(rowid)
+        # locked, freed and locked again without the free row ids
+        row = table.rows()[rowid]
+        row.state = wiscsim.dftldes.FREE_AND_LOCKED
+        row.state = wiscsim.dftldes.FREE
+
+        self.assertEqual(sorted(table.lock_free_rows(8)), range(4))
+        self.assertEqual(table.n_locked_free_rows(), 4)
+
+
+class TestCompactLpnTable(TestLpnTable):
+    table_class = CompactLpnTable
+
+    def test_lru_order(self):
+        table = self.table_class(8)
+        table.add_lpns(table.lock_free_rows(3), {1:11, 2:22, 3:33}, False)
+        table.add_lpn(table.lock_free_row(), 4, UNINITIATED, False,
+                as_least_recent = True)
+
+        def lpns():
+            return [lpn for lpn, row in table.least_to_most_lpn_items()]
+
+        first, second, third = lpns()[1:]
+        self.assertEqual(lpns()[0], 4)
+        table.lpn_to_ppn(first)
+        self.assertEqual(lpns(), [4, second, third, first])
+        table.overwrite_lpn(second, 20, True)
+        self.assertEqual(lpns(), [4, third, first, second])
+        # no change of order
+        self.assertEqual(table.peek(third).ppn, third * 11)
+        self.assertEqual(table.is_dirty(second), True)
+        self.assertEqual(lpns(), [4, third, first, second])
+
+        self.assertEqual(table.lpn_to_ppn(4), UNINITIATED)
+        self.assertEqual(table.lpn_to_ppn(5), wiscsim.dftldes.MISS)
+
+    def test_delete_while_iterating(self):
+        """
+        As MappingCache.drop() does
+        """
+        table = self.table_class(8)
+        table.add_lpns(table.lock_free_rows(8),
+                dict((i, i * 10) for i in range(8)), True)
+        for lpn, row in table.least_to_most_lpn_items():
+            table.delete_lpn_and_lock(lpn)
+            row.state = wiscsim.dftldes.FREE
+        self.assertEqual(table.n_free_rows(), 8)
+        self.assertEqual(list(table.least_to_most_lpn_items()), [])
+
+        table.add_lpn(table.lock_free_row(), 3, 30, False)
+        self.assertEqual([(lpn, row.ppn) for lpn, row in
+            table.least_to_most_lpn_items()], [(3, 30)])
+
+
+class TestCompactLpnTableInSsd(unittest.TestCase):
+    """
+    The mapping cache evicts the same entries with either table, so the
+    simulation is the same
+    """
+    def run_ssd(self, lpn_table_class):
+        conf = test_ssdframework.create_config()
+        # small translation pages, so loads evict few entries
+        conf['translation_page_entry_bytes'] = 64
+        conf.n_cache_entries = conf.n_mapping_entries_per_page * 4
+        conf['lpn_table_class'] = lpn_table_class
+        # the FTL picks channels with the global random
+        random.seed(1)
+        ssd = test_ssdframework.create_ssd(conf)
+        ssd.recorder.enable()
+
+        rand = random.Random(1)
+        page_size = conf.page_size
+        # 4 times the data mapped by the cache
+        n_pages = conf.n_cache_entries * 4
+        events = []
+        for i in range(100):
+            operation = rand.choice([OP_READ, OP_WRITE, OP_WRITE, OP_DISCARD])
+            events.append(hostevent.Event(512, 1, operation,
+                rand.randrange(n_pages) * page_size,
+                rand.randint(1, 4) * page_size))
+        test_ssdframework.run_events(ssd, events)
+        return ssd
+
+    def test_same_simulation(self):
+        ssd = self.run_ssd('LpnTableMvpn')
+        compact = self.run_ssd('CompactLpnTableMvpn')
+        self.assertIsInstance(compact.ftl._mappings._lpn_table,
+                CompactLpnTableMvpn)
+
+        self.assertEqual(compact.env.now, ssd.env.now)
+        self.assertEqual(
+                compact.recorder.get_result_summary()['general_accumulator'],
+                ssd.recorder.get_result_summary()['general_accumulator'])
+        self.assertTrue(ssd.recorder.get_count_me('translation',
+            'delete-lpn-in-table-for-load') > 0)
+
 
 class TestLockPool(unittest.TestCase):
     def access_vpn(self, env, respool, vpn):
@@ -0,0 +1,175 @@
+import unittest
+
+import simpy
+
+from commons import *
+from wiscsim import functional, hostevent
+from tests import test_checkpoint, test_nkftl, test_ssdframework
+from tests.test_ssdframework import create_ssd, run_events
+
+
+class FakeController(object):
+    pass
+
+
+class TestFunctionalMode(unittest.TestCase):
+    def setUp(self):
+        self.env = simpy.Environment()
+        self.mode = functional.FunctionalMode(self.env, FakeController())
+
+    def test_process(self):
+        env = self.env
+
+        def child(i):
+            yield env.timeout(10)
+            env.exit(i * 2)
+
+        def parent():
+            values = []
+            for i in range(3):
+                value = yield env.process(child(i))
+                values.append(value)
+            yield simpy.AllOf(env, [env.process(child(i)) for i in range(3)])
+            env.exit(values)
+
+        event = self.mode.process(parent())
+        self.assertTrue(event.processed)
+        self.assertEqual(event.value, [0, 2, 4])
+        self.assertEqual(env.now, 0)
+        # env is restored
+        self.assertIsInstance(env.timeout(1), simpy.events.Timeout)
+
+    def test_blocked(self):
+        env = self.env
+        resource = simpy.Resource(env, capacity=1)
+        held = resource.request()
+
+        def proc():
+            req = resource.request()
+            yield req
+            yield env.timeout(10)
+            resource.release(req)
+            env.exit('done')
+
+        def release():
+            yield env.timeout(5)
+            resource.release(held)
+
+        event = self.mode.process(proc())
+        self.assertFalse(event.triggered)
+        env.process(release())
+        env.run()
+        # the rest of proc was left to simpy
+        self.assertEqual(event.value, 'done')
+        self.assertEqual(env.now, 15)
+
+    def test_failed_event(self):
+        env = self.env
+
+        def child():
+            yield env.timeout(10)
+            raise ValueError('child')
+
+        def parent():
+            try:
+                yield env.process(child())
+            except ValueError as e:
+                env.exit(str(e))
+
+        event = self.mode.process(parent())
+        self.assertEqual(event.value, 'child')
+
+    def test_other_processes(self):
+        env = self.env
+        timeouts = []
+
+        def other():
+            yield env.timeout(1)
+            timeouts.append(env.timeout(1))
+
+        def proc():
+            yield env.timeout(10)
+
+        env.process(other())
+        self.mode.process(proc())
+        env.run()
+        # the environment is only changed while proc runs
+        self.assertIsInstance(timeouts[0], simpy.events.Timeout)
+        self.assertEqual(env.now, 2)
+
+
+class FunctionalTestMixin(object):
+    def create_ssd(self, functional_warmup):
+        conf = self.create_config()
+        conf['SSDFramework']['ncq_depth'] = 1
+        conf['functional_warmup'] = functional_warmup
+        ssd = create_ssd(conf)
+        ssd.recorder.disable()
+        return ssd
+
+    def run_ssd(self, functional_warmup):
+        ssd = self.create_ssd(functional_warmup)
+        conf = ssd.conf
+        # overwrites in the warm-up, so blocks are cleaned
+        warmup = test_checkpoint.write_events(conf, 0, 300) + \
+                test_checkpoint.write_events(conf, 0, 300) + \
+                [hostevent.ControlEvent(OP_CLEAN)]
+        workload = [
+            hostevent.ControlEvent(OP_ENABLE_RECORDER),
+            hostevent.ControlEvent(OP_REC_TIMESTAMP, arg1='workload_start'),
+            ] + test_checkpoint.write_events(conf, 100, 100) + \
+                [hostevent.Event(512, 1, OP_READ, 0, 300 * conf.page_size)]
+        run_events(ssd, warmup + workload)
+        return ssd
+
+    def test_warmup(self):
+        detailed = self.run_ssd(False)
+        fast = self.run_ssd(True)
+
+        self.assertEqual(fast.recorder.get_result_by_one_key(
+            'workload_start'), 0)
+        self.assertTrue(detailed.recorder.get_result_by_one_key(
+            'workload_start') > 0)
+        self.assertIsNone(fast.functional)
+
+        # same data after the warm-up, so same flash operations after it.
+        # Pages may be in other blocks, as the processes of a request ran
+        # one after another instead of side by side.
+        self.assertEqual(self.valid_lpns(fast.ftl),
+                self.valid_lpns(detailed.ftl))
+        for counter in ['flash_ops', 'traffic']:
+            self.assertEqual(
+                fast.recorder.get_result_summary()['general_accumulator'][
+                    counter],
+                detailed.recorder.get_result_summary()['general_accumulator'][
+                    counter])
+        self.assertTrue(fast.recorder.get_general_accumulater_cnt(
+            'flash_ops', OP_READ) > 0)
+
+    def valid_lpns(self, ftl):
+        oob = ftl.oob
+        mappings = self.oob_mappings(ftl)
+        return sorted(lpn for ppn, lpn in mappings.items()
+                if oob.states.is_page_valid(ppn))
+
+
+class TestFunctionalDftldes(FunctionalTestMixin, unittest.TestCase):
+    def create_config(self):
+        return test_ssdframework.create_config()
+
+    def oob_mappings(self, ftl):
+        return ftl.oob.ppn_to_lpn_mvpn
+
+
+class TestFunctionalNkftl(FunctionalTestMixin, unittest.TestCase):
+    def create_config(self):
+        conf = test_nkftl.create_config()
+        conf['ftl_type'] = 'nkftl2'
+        return conf
+
+    def oob_mappings(self, ftl):
+        return ftl.oob.ppn_to_lpn
+
+
+if __name__ == '__main__':
+    unittest.main()
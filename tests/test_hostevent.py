@@ -0,0 +1,70 @@
+import unittest
+
+import config
+from wiscsim import hostevent
+from commons import *
+
+
+SQLITE_EVENTS = "tests/testdata/sqlitewal-update/subexp-7928737328932659543-ext4-10-07-23-50-10--2726320246496492803/blkparse-events-for-ftlsim.txt"
+
+ATTRS = ['pid', 'operation', 'offset', 'size', 'sync', 'timestamp',
+        'pre_wait_time', 'action', 'sector', 'sector_count']
+
+
+class TestLineDecoder(unittest.TestCase):
+    def setUp(self):
+        self.conf = config.ConfigNCQFTL()
+
+    def assert_same_event(self, a, b):
+        for name in ATTRS:
+            self.assertEqual(getattr(a, name), getattr(b, name))
+
+    def test_same_as_slow_path(self):
+        lines = list(hostevent.FileLineIterator(SQLITE_EVENTS))
+        event_iter = hostevent.EventIterator(self.conf, lines)
+
+        n = 0
+        for line, event in zip(lines, event_iter):
+            self.assert_same_event(event, event_iter.str_to_event_slow(line))
+            n += 1
+        self.assertEqual(n, 10000)
+
+    def test_column_order(self):
+        decode = hostevent.make_line_decoder(512,
+                ['size', 'offset', 'operation', 'pre_wait_time', 'pid'])
+        event = decode('4096 8192 discard NA 7')
+        self.assertEqual(event.size, 4096)
+        self.assertEqual(event.offset, 8192)
+        self.assertEqual(event.sector, 16)
+        self.assertEqual(event.sector_count, 8)
+        self.assertEqual(event.operation, OP_DISCARD)
+        self.assertEqual(event.pre_wait_time, 'NA')
+        self.assertEqual(event.pid, 7)
+        # defaults of Event.__init__
+        self.assertEqual(event.timestamp, None)
+        self.assertEqual(event.sync, True)
+        self.assertEqual(event.action, 'D')
+
+    def test_errors(self):
+        decode = hostevent.make_line_decoder(512,
+                self.conf['event_file_column_names'])
+        with self.assertRaises(RuntimeError):
+            decode('1 D write 100 4096 0.1 0 False')
+        with self.assertRaises(RuntimeError):
+            decode('1 D write 0 4096 0.1 0')
+        with self.assertRaises(RuntimeError):
+            decode('1 X write 0 4096 0.1 0 False')
+        with self.assertRaises(RuntimeError):
+            hostevent.make_line_decoder(512, ['pid', 'offset', 'size'])
+
+    def test_slots(self):
+        event = hostevent.Event(512, 1, OP_WRITE, 0, 4096)
+        self.assertFalse(hasattr(event, '__dict__'))
+        # set by the simulator
+        event.token = 'token'
+        with self.assertRaises(AttributeError):
+            event.foo = 1
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import unittest
+
+import config
+from pyreuse.sysutils import blocktrace
+from wiscsim import hostevent
+from workrunner import onlinesim
+from commons import *
+
+
+BLKPARSE_OUTPUT = "tests/testdata/blkparse-output.txt"
+
+
+def event_tuple(event):
+    return (event.pid, event.operation, event.offset, event.size,
+            event.timestamp, event.sync, event.action)
+
+
+def put_batches(queue, batches):
+    for batch in batches:
+        queue.put(batch)
+    queue.put(None)
+
+
+class TestOnlineSimulation(unittest.TestCase):
+    def setUp(self):
+        self.conf = config.ConfigNCQFTL()
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_same_events_as_event_file(self):
+        event_path = os.path.join(self.tmpdir, 'events.txt')
+        parser = blocktrace.BlktraceResultInMem(self.conf['sector_size'],
+                self.conf['event_file_column_names'],
+                BLKPARSE_OUTPUT, event_path, padding_bytes=0)
+        parser.create_event_file()
+        expected = list(hostevent.EventIterator(
+            self.conf, hostevent.FileLineIterator(event_path)))
+
+        with open(BLKPARSE_OUTPUT, 'r') as f:
+            events = list(onlinesim.blkparse_events(f,
+                self.conf['sector_size'], reorder_events=len(expected)))
+
+        self.assertTrue([event_tuple(e) for e in events] ==
+                [event_tuple(e) for e in expected])
+        for event, expected_event in zip(events, expected):
+            self.assertAlmostEqual(event.pre_wait_time,
+                    expected_event.pre_wait_time)
+
+    def test_reorder_window(self):
+        lines = [
+            '8,0 0 1 0.000002 1 D W 8 + 8 [a]',
+            '8,0 1 1 0.000001 1 D W 16 + 8 [a]',
+            '8,0 0 2 0.000003 1 D R 24 + 8 [a]',
+            ]
+        events = list(onlinesim.blkparse_events(lines, 512,
+            reorder_events=1))
+        self.assertEqual([e.offset for e in events], [16*512, 8*512, 24*512])
+
+        events = list(onlinesim.blkparse_events(lines, 512,
+            reorder_events=0))
+        self.assertEqual([e.offset for e in events], [8*512, 16*512, 24*512])
+
+    def test_queue(self):
+        events = [hostevent.ControlEvent(operation=OP_ENABLE_RECORDER)] + \
+            [hostevent.Event(512, 1, OP_WRITE, i * 4096, 4096, '0.1')
+                for i in range(5)]
+        queue = multiprocessing.Queue(maxsize=1)
+        proc = multiprocessing.Process(target=put_batches,
+                args=(queue, [events[:3], events[3:]]))
+        proc.start()
+        received = list(onlinesim.queue_events(queue))
+        proc.join()
+
+        self.assertEqual(received[0].operation, OP_ENABLE_RECORDER)
+        self.assertEqual([event_tuple(e) for e in received[1:]],
+                [event_tuple(e) for e in events[1:]])
+
+    def test_is_enabled(self):
+        self.conf['enable_blktrace'] = True
+        self.conf['enable_simulation'] = True
+        self.assertFalse(onlinesim.is_enabled(self.conf))
+        self.conf['online_simulation'] = True
+        self.assertTrue(onlinesim.is_enabled(self.conf))
+
+
+if __name__ == '__main__':
+    unittest.main()
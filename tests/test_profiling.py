@@ -0,0 +1,66 @@
+import inspect
+import os
+import pstats
+import shutil
+import tempfile
+import unittest
+
+import simpy
+
+from commons import *
+from wiscsim import controller, dftldes, hostevent, profiling
+from tests import test_ssdframework
+
+
+def location(func):
+    return inspect.getsourcefile(func), inspect.getsourcelines(func)[1]
+
+
+class TestSubsystemMap(unittest.TestCase):
+    def test_subsystem_of(self):
+        subsystem_map = profiling.SubsystemMap()
+        cases = [
+            (dftldes.MappingCache.lpn_to_ppn, 'mapping cache'),
+            (dftldes.CompactLpnTable.lpn_to_ppn, 'mapping cache'),
+            (dftldes.CompactRow.__init__, 'mapping cache'),
+            (dftldes.Cleaner.clean, 'gc'),
+            (dftldes.Ftl.write_ext, 'other'),
+            (controller.Controller3.rw_ppn_extent, 'controller/channels'),
+            (hostevent.EventIterator.__iter__, 'trace ingest'),
+            (simpy.Environment.step, 'simpy'),
+            ]
+        for func, subsystem in cases:
+            self.assertEqual(subsystem_map.subsystem_of(*location(func)),
+                    subsystem)
+
+
+class TestProfile(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.ssd = test_ssdframework.create_ssd(
+                test_ssdframework.create_config())
+        self.ssd.recorder.enable()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_profile(self):
+        page_size = self.ssd.conf.page_size
+        events = [hostevent.Event(512, 1, OP_WRITE, i * page_size, page_size)
+                for i in range(200)]
+        profiling.profile(
+                lambda: test_ssdframework.run_events(self.ssd, events),
+                self.tmpdir)
+
+        stats = pstats.Stats(os.path.join(self.tmpdir, 'simulation.prof'))
+        times = profiling.subsystem_times(stats)
+        for subsystem in ['mapping cache', 'controller/channels', 'simpy']:
+            self.assertTrue(times[subsystem] > 0)
+
+        with open(os.path.join(self.tmpdir, 'profile-subsystems.txt')) as f:
+            lines = f.readlines()
+        self.assertEqual(len(lines), len(profiling.SUBSYSTEMS) + 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
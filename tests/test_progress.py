@@ -0,0 +1,153 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import simpy
+
+import config
+from commons import *
+from wiscsim import bintrace, hostevent, progress, recorder, tracecache
+from wiscsim.ftlsim_commons import NCQSingleQueue
+from tests.test_bintrace import SQLITE_EVENTS
+
+
+class TestProgress(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.conf = config.ConfigNCQFTL()
+        self.conf['result_dir'] = self.tmpdir
+        self.readings = progress.TraceReadings()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_text_trace(self):
+        run_progress = progress.Progress(self.conf,
+                trace_readings=self.readings)
+        lines = hostevent.FileLineIterator(SQLITE_EVENTS,
+                trace_readings=self.readings)
+        for i, _ in enumerate(lines):
+            run_progress.event_done()
+            if i == 100:
+                half = run_progress.figures()
+                self.assertTrue(half['trace_bytes_read'] > 0)
+                self.assertNotEqual(half['eta_sec'], 'NA')
+
+        figures = run_progress.figures()
+        self.assertEqual(figures['trace_bytes_read'],
+                os.path.getsize(SQLITE_EVENTS))
+        self.assertEqual(figures['eta_sec'], 0)
+
+    def test_binary_trace(self):
+        binpath = os.path.join(self.tmpdir, 'events.bin')
+        bintrace.convert_text_to_binary(SQLITE_EVENTS, binpath,
+                self.conf['event_file_column_names'], block_events=333)
+
+        run_progress = progress.Progress(self.conf,
+                trace_readings=self.readings)
+        events = list(bintrace.BinaryEventIterator(self.conf, binpath,
+            start_event=1000, trace_readings=self.readings))
+        run_progress.event_done()
+        figures = run_progress.figures()
+        self.assertEqual(figures['trace_bytes_read'],
+                len(events) * bintrace.ROW_BYTES)
+        self.assertEqual(figures['eta_sec'], 0)
+
+    def test_eta_with_queued_events(self):
+        env = simpy.Environment()
+        ncq = NCQSingleQueue(2, env)
+        run_progress = progress.Progress(self.conf, env, ncq, self.readings)
+
+        # the whole trace is read and queued, but only 10 events are done
+        for line in hostevent.FileLineIterator(SQLITE_EVENTS,
+                trace_readings=self.readings):
+            ncq.queue.items.append(line)
+        del ncq.queue.items[:10]
+        for i in range(10):
+            run_progress.event_done()
+
+        figures = run_progress.figures()
+        self.assertAlmostEqual(figures['eta_sec'] / figures['wall_time_sec'],
+                (10000 - 10) / 10.0)
+
+    def test_trace_cache_miss(self):
+        """
+        The conversion of the text trace on a cache miss is not counted
+        """
+        self.conf['trace_cache_dir'] = os.path.join(self.tmpdir, 'cache')
+        run_progress = progress.Progress(self.conf,
+                trace_readings=self.readings)
+
+        def workload():
+            # as BlktraceEvents, the cache is looked up while simulating
+            for event in tracecache.event_iterator(self.conf, SQLITE_EVENTS,
+                    trace_readings=self.readings):
+                yield event
+
+        n_events = 0
+        for event in workload():
+            n_events += 1
+            run_progress.event_done()
+            if n_events == 10:
+                figures = run_progress.figures()
+                self.assertEqual(figures['trace_bytes_read'],
+                        10 * bintrace.ROW_BYTES)
+                self.assertAlmostEqual(
+                        figures['eta_sec'] / figures['wall_time_sec'],
+                        (10000 - 10) / 10.0)
+
+        self.assertEqual(n_events, 10000)
+        self.assertEqual([bintrace.is_binary_trace(r.path)
+            for r in self.readings.readings], [True])
+        figures = run_progress.figures()
+        self.assertEqual(figures['trace_bytes_read'],
+                n_events * bintrace.ROW_BYTES)
+        self.assertEqual(figures['eta_sec'], 0)
+
+    def test_not_counted(self):
+        lines = list(hostevent.FileLineIterator(SQLITE_EVENTS))
+        run_progress = progress.Progress(self.conf)
+        run_progress.event_done()
+        figures = run_progress.figures()
+        self.assertEqual(figures['trace_bytes_read'], 0)
+        self.assertEqual(figures['eta_sec'], 'NA')
+
+    def test_log_and_recorder(self):
+        self.conf['progress_interval_sec'] = 0
+        env = simpy.Environment()
+        run_progress = progress.Progress(self.conf, env)
+
+        def proc():
+            for i in range(3 * progress.CHECK_EVERY):
+                yield env.timeout(10)
+                run_progress.event_done()
+        env.process(proc())
+        env.run()
+
+        rec = recorder.Recorder(output_target=recorder.FILE_TARGET,
+                output_directory=self.tmpdir, verbose_level=-1)
+        run_progress.finish(rec)
+
+        with open(os.path.join(self.tmpdir, 'progress.log')) as f:
+            lines = f.readlines()
+        self.assertEqual(len(lines), 4)
+        self.assertTrue(lines[-1].startswith('FINAL'))
+
+        figures = rec.get_result_by_one_key('simulation_throughput')
+        self.assertEqual(figures['events'], 3 * progress.CHECK_EVERY)
+        self.assertEqual(figures['sim_duration_ns'],
+                30 * progress.CHECK_EVERY)
+        self.assertEqual(figures['eta_sec'], 'NA')
+
+    def test_no_result_dir(self):
+        self.conf['result_dir'] = None
+        run_progress = progress.Progress(self.conf)
+        for i in range(progress.CHECK_EVERY):
+            run_progress.event_done()
+        self.assertEqual(run_progress.figures()['events'],
+                progress.CHECK_EVERY)
+
+
+if __name__ == '__main__':
+    unittest.main()
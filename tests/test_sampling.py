@@ -0,0 +1,136 @@
+import unittest
+
+from commons import *
+from wiscsim import hostevent, sampling
+from tests import test_checkpoint, test_ssdframework
+from tests.test_ssdframework import create_ssd, run_events
+
+
+def create_config(period, window, warmup):
+    conf = test_ssdframework.create_config()
+    conf['sampling_period'] = period
+    conf['sampling_window'] = window
+    conf['sampling_warmup'] = warmup
+    return conf
+
+
+class TestSampledEvents(unittest.TestCase):
+    def phases(self, conf, n_before, n_after):
+        events = test_checkpoint.write_events(conf, 0, n_before) + \
+                [hostevent.ControlEvent(OP_ENABLE_RECORDER)] + \
+                test_checkpoint.write_events(conf, 0, n_after)
+
+        phases = []
+        n_data = 0
+        for event in sampling.sampled_events(conf, events):
+            if event.operation == OP_SAMPLING:
+                phases.append((n_data, event.arg1))
+            elif event.operation == OP_WRITE:
+                n_data += 1
+        return phases
+
+    def test_phases(self):
+        conf = create_config(10, 4, 2)
+        self.assertEqual(self.phases(conf, 5, 25), [
+            (5, 'warmup'), (7, 'measure'), (11, 'functional'),
+            (15, 'warmup'), (17, 'measure'), (21, 'functional'),
+            (25, 'warmup'), (27, 'measure')])
+
+    def test_no_warmup(self):
+        conf = create_config(4, 4, 0)
+        self.assertEqual(self.phases(conf, 0, 8),
+                [(0, 'measure'), (4, 'measure'), (8, 'measure')])
+
+    def test_bad_config(self):
+        with self.assertRaises(RuntimeError):
+            sampling.check_config(create_config(10, 8, 4))
+
+
+class TestEstimate(unittest.TestCase):
+    def test_estimate(self):
+        result = sampling.estimate([1, 2, 3, 4, 'NA'], 0.95)
+        self.assertEqual(result['n'], 4)
+        self.assertEqual(result['mean'], 2.5)
+        half = 1.96 * result['stdev'] / 2
+        self.assertAlmostEqual(result['ci_low'], 2.5 - half)
+        self.assertAlmostEqual(result['ci_high'], 2.5 + half)
+
+    def test_one_value(self):
+        result = sampling.estimate([3], 0.95)
+        self.assertEqual(result['mean'], 3)
+        self.assertEqual(result['ci_low'], 'NA')
+
+
+class TestSampler(unittest.TestCase):
+    def run_ssd(self, conf, events, sampled):
+        ssd = create_ssd(conf)
+        ssd.recorder.disable()
+        if sampled is True:
+            sampler = sampling.Sampler(conf, ssd)
+            events = sampling.sampled_events(conf, events)
+        else:
+            # latency of each data request, in the order they start
+            ssd.latencies = []
+            for operation in (OP_READ, OP_WRITE):
+                ssd._data_handlers[operation] = self.timed(ssd,
+                        ssd._data_handlers[operation])
+
+        run_events(ssd, events)
+
+        if sampled is True:
+            sampler.finish()
+        return ssd
+
+    def timed(self, ssd, handler):
+        def timed_handler(extent):
+            start = ssd.env.now
+            latencies = ssd.latencies
+            i = len(latencies)
+            latencies.append(None)
+            yield ssd.env.process(handler(extent))
+            latencies[i] = ssd.env.now - start
+        return timed_handler
+
+    def test_sampler(self):
+        conf = create_config(100, 20, 10)
+        page_size = conf.page_size
+        events = [hostevent.ControlEvent(OP_ENABLE_RECORDER)]
+        for i in range(450):
+            events.append(hostevent.Event(512, 1, OP_WRITE,
+                (i * 7 % 300) * page_size, page_size))
+            events.append(hostevent.Event(512, 1, OP_READ,
+                (i * 3 % 300) * page_size, page_size))
+
+        detailed = self.run_ssd(conf, events, False)
+        sampled = self.run_ssd(conf, events, True)
+
+        result = sampled.recorder.get_result_by_one_key('sampling')
+        self.assertEqual(result['n_windows'], 9)
+        for window in result['windows']:
+            self.assertTrue(window['read_latency_ns'] > 0)
+            self.assertTrue(window['write_latency_ns'] > 0)
+            self.assertTrue(window['write_amplification'] >= 1)
+
+        estimates = result['estimates']
+        self.assertEqual(estimates['latency_ns']['n'], 9)
+        for metric in sampling.METRICS:
+            self.assertTrue(estimates[metric]['ci_low'] <=
+                    estimates[metric]['mean'] <= estimates[metric]['ci_high'])
+
+        # only the windows are recorded, and the rest takes no time
+        self.assertEqual(sampled.recorder.get_general_accumulater_cnt(
+            'traffic', 'write'), 9 * 10 * page_size)
+        self.assertTrue(sampled.env.now < detailed.env.now)
+
+        # the estimate covers the detailed run's mean latency of the
+        # requests in the windows: data events 10 to 29 of each period
+        in_windows = [latency for i, latency in
+                enumerate(detailed.latencies[:900]) if 10 <= i % 100 < 30]
+        self.assertEqual(len(in_windows), 9 * 20)
+        detailed_mean = sum(in_windows) / float(len(in_windows))
+        self.assertTrue(estimates['latency_ns']['ci_low'] <= detailed_mean
+                <= estimates['latency_ns']['ci_high'])
+
+
+if __name__ == '__main__':
+    unittest.main()
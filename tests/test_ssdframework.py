@@ -0,0 +1,135 @@
+import unittest
+
+import simpy
+
+from commons import *
+from utilities import utils
+from wiscsim import dftldes, hostevent, recorder, ssdframework
+from wiscsim.ftlsim_commons import NCQSingleQueue
+
+
+def create_config():
+    conf = dftldes.Config()
+    conf['ftl_type'] = 'dftldes'
+    conf['SSDFramework']['ncq_depth'] = 2
+    conf['flash_config']['n_channels_per_dev'] = 4
+    utils.set_exp_metadata(conf, save_data=False,
+            expname='test_expname', subexpname='test_subexpname')
+    conf.n_cache_entries = conf.n_mapping_entries_per_page
+    conf.set_flash_num_blocks_by_bytes(64*MB)
+    utils.runtime_update(conf)
+    return conf
+
+
+def create_ssd(conf, now=0):
+    """
+    An Ssd with its own simpy environment (starting at now), NCQ and
+    recorder
+    """
+    env = simpy.Environment(initial_time=now)
+    ncq = NCQSingleQueue(conf['SSDFramework']['ncq_depth'], env)
+    rec = recorder.Recorder(
+        output_target = conf['output_target'],
+        output_directory = conf['result_dir'],
+        verbose_level = conf['verbose_level'],
+        print_when_finished = conf['print_when_finished']
+        )
+    return ssdframework.Ssd(conf, env, ncq, rec)
+
+
+def run_events(ssd, events):
+    """
+    Put events to the NCQ of ssd, as the host does, and run until the SSD
+    processes end
+    """
+    def feed():
+        for event in events:
+            yield ssd.ncq.queue.put(event)
+        for i in range(ssd.ncq.ncq_depth):
+            yield ssd.ncq.queue.put(hostevent.ControlEvent(OP_END_SSD_PROCESS))
+
+    ssd.env.process(feed())
+    for i in range(ssd.ncq.ncq_depth):
+        ssd.env.process(ssd._process(i))
+    ssd.env.run()
+
+
+class TestSsdDispatch(unittest.TestCase):
+    def setUp(self):
+        self.conf = create_config()
+        self.ssd = create_ssd(self.conf)
+        self.env = self.ssd.env
+        self.ncq = self.ssd.ncq
+        self.rec = self.ssd.recorder
+
+    def test_lpn_extent(self):
+        page_size = self.conf.page_size
+        for offset, size in [(0, page_size), (page_size, 512),
+                (page_size + 512, 3 * page_size)]:
+            event = hostevent.Event(512, 1, OP_WRITE, offset, size)
+            expected = event.get_lpn_extent(self.conf)
+            extent = self.ssd.lpn_extent(event)
+            self.assertEqual((extent.lpn_start, extent.lpn_count),
+                    (expected.lpn_start, expected.lpn_count))
+
+    def test_registered_handler(self):
+        handled = []
+        def handler(host_event):
+            handled.append((host_event.arg1, self.env.now))
+            yield self.env.timeout(10)
+            handled.append((host_event.arg1, self.env.now))
+
+        self.ssd.register_handler('my_op', handler)
+        run_events(self.ssd, [hostevent.ControlEvent('my_op', arg1='a')])
+        self.assertEqual(handled, [('a', 0), ('a', 10)])
+
+    def test_ftl_handlers(self):
+        handlers = self.ssd._control_handlers
+        # registered by dftldes
+        self.assertNotEqual(handlers[OP_PURGE_TRANS_CACHE], self.ssd._ignore)
+        # nkftl2 only
+        self.assertEqual(handlers[OP_NON_MERGE_CLEAN], self.ssd._ignore)
+
+        self.rec.enable()
+        run_events(self.ssd, [
+            hostevent.Event(512, 1, OP_WRITE, 0, 2 * self.conf.page_size),
+            hostevent.ControlEvent(OP_NON_MERGE_CLEAN),
+            hostevent.ControlEvent(OP_PURGE_TRANS_CACHE),
+            hostevent.Event(512, 1, OP_READ, 0, self.conf.page_size),
+            ])
+        self.assertEqual(
+            self.rec.get_general_accumulater_cnt('traffic', 'write'),
+            2 * self.conf.page_size)
+
+    def test_barrier(self):
+        self.rec.enable()
+        write = hostevent.Event(512, 1, OP_WRITE, 0, 4 * self.conf.page_size)
+        run_events(self.ssd, [write,
+            hostevent.ControlEvent(OP_REC_TIMESTAMP, arg1='no_barrier'),
+            hostevent.ControlEvent(OP_BARRIER),
+            hostevent.ControlEvent(OP_REC_TIMESTAMP, arg1='barrier'),
+            ])
+        self.assertEqual(self.rec.get_result_by_one_key('no_barrier'), 0)
+        self.assertTrue(self.rec.get_result_by_one_key('barrier') > 0)
+        self.assertEqual(self.ncq.n_in_flight(), 0)
+
+    def test_stopped_snapshots_do_not_wait(self):
+        # e.g. restored from a checkpoint, off the snapshot period
+        ssd = create_ssd(self.conf, now=1)
+        ssd._snapshot_valid_ratios = False
+        ssd._snapshot_erasure_count_dist = False
+        ssd._snapshot_user_traffic = False
+        for process in [ssd._valid_ratio_snapshot_process,
+                ssd._erasure_count_dist_snapshot_process,
+                ssd._user_traffic_size_snapshot_process]:
+            ssd.env.process(process())
+        ssd.env.run()
+        self.assertEqual(ssd.env.now, 1)
+
+    def test_unsupported(self):
+        with self.assertRaises(NotImplementedError):
+            run_events(self.ssd, [hostevent.ControlEvent('no_such_op')])
+
+
+if __name__ == '__main__':
+    unittest.main()
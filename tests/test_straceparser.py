@@ -0,0 +1,86 @@
+import os
+import shutil
+import tempfile
+import types
+import unittest
+
+from pyreuse.sysutils import straceParser
+
+
+COMBINED_TRACE = """\
+100 1.000001 open(/tmp/a, O_RDWR) = 3
+100 1.000002 write(3, abcd, 4) = 4
+101 1.000003 read(3,  <unfinished ...>
+100 1.000004 lseek(3, 0, SEEK_SET) = 0
+101 1.000005 <... read resumed> abcd, 4) = 4
++++ exited with 0 +++
+100 1.000006 close(3) = 0
+"""
+
+# per-pid files of strace -ff, threads sharing the file descriptors
+PARENT_TRACE = """\
+2.000001 open(/tmp/b, O_RDWR) = 3
+2.000003 write(3, abcd, 4) = 4
+2.000006 close(3) = 0
+"""
+
+CHILD_TRACE = """\
+2.000002 write(3, ab, 2) = 2
+2.000004 fsync(3 <unfinished ...>
+2.000005 <... fsync resumed> ) = 0
+"""
+
+
+class TestStraceParser(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write_file(self, name, content):
+        path = os.path.join(self.tmpdir, name)
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+    def test_streaming(self):
+        entries = straceParser.iter_entries(COMBINED_TRACE.splitlines())
+        self.assertTrue(isinstance(entries, types.GeneratorType))
+
+        table = list(entries)
+        self.assertEqual([row['callname'] for row in table],
+                ['open', 'write', 'lseek', 'read', 'close'])
+        self.assertEqual(table, straceParser.parse_lines(
+            COMBINED_TRACE.splitlines()))
+
+        read = table[3]
+        self.assertEqual(read['pid'], '101')
+        self.assertEqual(read['filepath'], '/tmp/a')
+        self.assertEqual(read['offset'], 0)
+        self.assertEqual(read['length'], 4)
+
+    def check_merged(self, n_workers):
+        parent = self.write_file('trace.200', PARENT_TRACE)
+        child = self.write_file('trace.201', CHILD_TRACE)
+
+        table = list(straceParser.iter_traces([parent, child],
+            n_workers=n_workers))
+        self.assertEqual([row['time'] for row in table],
+            ['2.000001', '2.000002', '2.000003', '2.000004', '2.000006'])
+        self.assertEqual([row['pid'] for row in table],
+                [200, 201, 200, 201, 200])
+
+        # fds opened by the parent are known to the child
+        self.assertEqual([row['filepath'] for row in table], ['/tmp/b'] * 5)
+        self.assertEqual([row['offset'] for row in table[:3]], ['NA', 0, 2])
+
+    def test_merged(self):
+        self.check_merged(n_workers=1)
+
+    def test_merged_with_pool(self):
+        self.check_merged(n_workers=2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from commons import *
+from utilities import utils
+from config_helper import sweep
+
+
+def fake_simulation(para):
+    """
+    Write results as a simulation would, or fail as para['mode'] says
+    """
+    result_dir = para['result_dir']
+    mode = para['mode']
+    if mode == 'raise':
+        raise RuntimeError('bad point')
+    elif mode == 'crash':
+        os._exit(3)
+    elif mode == 'flaky' and not result_dir.endswith('-try2'):
+        raise RuntimeError('first attempt fails')
+
+    utils.dump_json({'flash_config': {'page_size': 2048}},
+            os.path.join(result_dir, 'config.json'))
+    utils.dump_json({
+        'general_accumulator': {
+            'flash_ops': {OP_WRITE: 30, OP_ERASE: 2},
+            'traffic': {'write': 10 * 2048},
+            'gc': {'user.page.moves': 15, 'trans.page.moves': 5},
+            'Mapping_Cache': {'hit': 3, 'miss': 1},
+            },
+        'simulation_duration': 100,
+        'workload_duration_sec': 0.5,
+        'simulation_throughput': {'events_per_sec': 1000.0},
+        }, os.path.join(result_dir, 'recorder.json'))
+
+
+class TestSweep(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def run_sweep(self, modes, **kwargs):
+        executor = sweep.SweepExecutor(self.tmpdir, run_func=fake_simulation,
+                poll_interval=0.01, **kwargs)
+        return executor.run([{'mode': mode, 'ftl': 'dftldes'}
+            for mode in modes])
+
+    def test_summarize(self):
+        para = {'mode': 'ok', 'result_dir': self.tmpdir}
+        fake_simulation(para)
+        summary = sweep.summarize(self.tmpdir)
+        self.assertEqual(summary['write_amplification'], 3.0)
+        self.assertEqual(summary['n_erases'], 2)
+        self.assertEqual(summary['gc_page_moves'], 20)
+        self.assertEqual(summary['gc_merges'], 0)
+        self.assertEqual(summary['mapping_cache_hit_ratio'], 0.75)
+        self.assertEqual(summary['simulation_duration'], 100)
+        self.assertEqual(summary['events_per_sec'], 1000.0)
+
+    def test_sweep(self):
+        rows = self.run_sweep(['ok', 'raise', 'crash', 'flaky', 'ok'],
+                n_workers=2, max_attempts=2)
+
+        self.assertEqual([row['point'] for row in rows], range(5))
+        self.assertEqual([row['status'] for row in rows],
+                ['ok', 'failed', 'failed', 'ok', 'ok'])
+        self.assertEqual([row['attempts'] for row in rows], [1, 2, 2, 2, 1])
+        self.assertIn('bad point', rows[1]['error'])
+        self.assertEqual(rows[2]['error'], 'exit code 3')
+        self.assertEqual(rows[1]['write_amplification'], 'NA')
+        self.assertEqual(rows[3]['write_amplification'], 3.0)
+        # only the varying parameter is a column
+        self.assertEqual(rows[0].keys()[:4],
+                ['point', 'status', 'attempts', 'mode'])
+        self.assertNotIn('ftl', rows[0])
+
+        # each point has its own result dir
+        self.assertEqual(len(set(row['result_dir'] for row in rows)), 5)
+        self.assertTrue(os.path.exists(
+            os.path.join(self.tmpdir, 'summary.txt')))
+
+    def test_mem_limit(self):
+        rows = self.run_sweep(['ok'], n_workers=1, mem_limit_mb=1024)
+        self.assertEqual(rows[0]['status'], 'ok')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import config
+from wiscsim import bintrace, hostevent, tracecache
+from commons import *
+
+
+SQLITE_EVENTS = "tests/testdata/sqlitewal-update/subexp-7928737328932659543-ext4-10-07-23-50-10--2726320246496492803/blkparse-events-for-ftlsim.txt"
+MKFS_EVENTS = "tests/testdata/sqlitewal-update/subexp-7928737328932659543-ext4-10-07-23-50-10--2726320246496492803/blkparse-events-for-ftlsim-mkfs.txt"
+
+
+class TestTraceCache(unittest.TestCase):
+    def setUp(self):
+        self.conf = config.ConfigNCQFTL()
+        self.tmpdir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.tmpdir, 'cache')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_hit_and_miss(self):
+        cache = tracecache.TraceCache(self.cache_dir)
+        path1 = cache.get_path(self.conf, SQLITE_EVENTS)
+        path2 = cache.get_path(self.conf, SQLITE_EVENTS)
+        self.assertEqual(path1, path2)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        self.assertTrue(bintrace.is_binary_trace(path1))
+
+        events = list(cache.event_iterator(self.conf, SQLITE_EVENTS))
+        self.assertEqual(len(events), 10000)
+        text_events = hostevent.EventIterator(self.conf,
+                hostevent.FileLineIterator(SQLITE_EVENTS))
+        for a, b in zip(events, text_events):
+            self.assertEqual((a.operation, a.offset, a.size),
+                    (b.operation, b.offset, b.size))
+
+        # the same content under another name is a hit
+        copy_path = os.path.join(self.tmpdir, 'copy.txt')
+        shutil.copy(SQLITE_EVENTS, copy_path)
+        self.assertEqual(cache.get_path(self.conf, copy_path), path1)
+
+    def test_key(self):
+        cache = tracecache.TraceCache(self.cache_dir)
+        key = cache.key(self.conf, SQLITE_EVENTS)
+
+        padding = self.conf['dev_padding']
+        self.conf['dev_padding'] = padding + 4*KB
+        self.assertNotEqual(cache.key(self.conf, SQLITE_EVENTS), key)
+        self.conf['dev_padding'] = padding
+        self.conf['sector_size'] = 4096
+        self.assertNotEqual(cache.key(self.conf, SQLITE_EVENTS), key)
+        self.conf['sector_size'] = 512
+        self.assertNotEqual(cache.key(self.conf, MKFS_EVENTS), key)
+
+    def test_lru_eviction(self):
+        cache = tracecache.TraceCache(self.cache_dir)
+        mkfs_path = cache.get_path(self.conf, MKFS_EVENTS)
+        size = os.path.getsize(mkfs_path)
+
+        # room for the sqlite trace only
+        cache.max_bytes = size + 1
+        os.utime(mkfs_path, (time.time() - 100, time.time() - 100))
+        sqlite_path = cache.get_path(self.conf, SQLITE_EVENTS)
+
+        self.assertFalse(os.path.exists(mkfs_path))
+        self.assertTrue(os.path.exists(sqlite_path))
+        self.assertEqual([path for _, _, path in cache.entries()],
+                [sqlite_path])
+
+    def test_event_iterator(self):
+        event_iter = tracecache.event_iterator(self.conf, SQLITE_EVENTS)
+        self.assertIsInstance(event_iter, hostevent.EventIterator)
+
+        self.conf['trace_cache_dir'] = self.cache_dir
+        event_iter = tracecache.event_iterator(self.conf, SQLITE_EVENTS)
+        self.assertIsInstance(event_iter, bintrace.BinaryEventIterator)
+        self.assertEqual(len(list(event_iter)), 10000)
+
+
+if __name__ == '__main__':
+    unittest.main()
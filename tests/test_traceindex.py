@@ -0,0 +1,150 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import config
+from wiscsim import bintrace, hostevent, traceindex
+from commons import *
+
+
+SQLITE_EVENTS = "tests/testdata/sqlitewal-update/subexp-7928737328932659543-ext4-10-07-23-50-10--2726320246496492803/blkparse-events-for-ftlsim.txt"
+
+
+def window(events, start_at_bytes=None, start_at_time=None,
+        end_at_time=None):
+    """
+    Reference: filter all the events
+    """
+    rw_bytes = 0
+    started = False
+    for event in events:
+        before = rw_bytes
+        if event.action == 'D' and event.operation in (OP_READ, OP_WRITE):
+            rw_bytes += event.size
+        if not started:
+            if start_at_bytes is not None and before < start_at_bytes:
+                continue
+            if start_at_time is not None and \
+                    float(event.timestamp) < start_at_time:
+                continue
+            started = True
+        if end_at_time is not None and float(event.timestamp) >= end_at_time:
+            break
+        yield event
+
+
+def keys(events):
+    return [(e.offset, e.size, e.operation, float(e.timestamp))
+            for e in events]
+
+
+class TestTraceIndex(unittest.TestCase):
+    def setUp(self):
+        self.conf = config.ConfigNCQFTL()
+        self.conf['trace_index_interval'] = 777
+        self.tmpdir = tempfile.mkdtemp()
+        self.text_path = os.path.join(self.tmpdir, 'events.txt')
+        shutil.copy(SQLITE_EVENTS, self.text_path)
+        self.all_events = list(hostevent.EventIterator(self.conf,
+            hostevent.FileLineIterator(self.text_path)))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def check_windows(self, path):
+        duration = float(self.all_events[-1].timestamp)
+        total = sum(e.size for e in self.all_events
+                if e.operation in (OP_READ, OP_WRITE))
+        windows = [
+            {},
+            {'start_at_bytes': total / 3},
+            {'start_at_bytes': total + 1},
+            {'start_at_time': duration / 2},
+            {'start_at_time': duration / 4, 'end_at_time': duration / 2},
+            {'start_at_bytes': total / 2, 'start_at_time': duration / 5},
+            {'end_at_time': duration / 10},
+            ]
+        for kwargs in windows:
+            got = keys(traceindex.WindowedEventIterator(self.conf, path,
+                **kwargs))
+            expected = keys(window(self.all_events, **kwargs))
+            self.assertEqual(got, expected, kwargs)
+
+    def test_text(self):
+        index = traceindex.get_index(self.conf, self.text_path)
+        self.assertEqual(index.n_events, 10000)
+        self.assertEqual(len(index.entries), 13)
+        self.assertFalse(index.binary)
+        self.assertTrue(os.path.exists(
+            traceindex.index_path_of(self.text_path)))
+
+        # positions are line offsets
+        with open(self.text_path, 'r') as f:
+            lines = f.readlines()
+        entry = index.entries[3]
+        self.assertEqual(entry[traceindex.POSITION],
+                sum(len(line) for line in lines[:777 * 3]))
+
+        self.check_windows(self.text_path)
+
+    def test_binary(self):
+        bin_path = os.path.join(self.tmpdir, 'events.bin')
+        bintrace.convert_text_to_binary(self.text_path, bin_path,
+                self.conf['event_file_column_names'], block_events=100)
+        index = traceindex.get_index(self.conf, bin_path)
+        self.assertTrue(index.binary)
+        self.assertEqual(index.entries[2][traceindex.POSITION], 777 * 2)
+        # the same as the text index, except positions
+        text_index = traceindex.get_index(self.conf, self.text_path)
+        for entry, text_entry in zip(index.entries, text_index.entries):
+            self.assertEqual(entry[traceindex.TIMESTAMP:],
+                    text_entry[traceindex.TIMESTAMP:])
+
+        self.check_windows(bin_path)
+
+    def test_stale_index(self):
+        traceindex.get_index(self.conf, self.text_path)
+        self.assertNotEqual(traceindex.TraceIndex.load(self.text_path), None)
+
+        with open(self.text_path, 'a') as f:
+            f.write('1 D write 0 4096 100.0 0 False\n')
+        self.assertEqual(traceindex.TraceIndex.load(self.text_path), None)
+        self.assertEqual(
+            traceindex.get_index(self.conf, self.text_path).n_events, 10001)
+
+    def test_rewritten_middle(self):
+        traceindex.get_index(self.conf, self.text_path)
+        with open(self.text_path, 'r') as f:
+            lines = f.readlines()
+        # same size, head and tail, but the lines in the middle move
+        middle = len(lines) / 2
+        lines[middle], lines[middle + 1] = lines[middle + 1], lines[middle]
+        self.assertNotEqual(lines[middle], lines[middle + 1])
+        with open(self.text_path, 'w') as f:
+            f.writelines(lines)
+        st = os.stat(self.text_path)
+        os.utime(self.text_path, (st.st_atime, st.st_mtime + 1))
+        self.assertEqual(traceindex.TraceIndex.load(self.text_path), None)
+
+    def test_cache_entry_touched(self):
+        # the trace cache bumps the mtime of an entry on every hit
+        cache_dir = os.path.join(self.tmpdir, 'cache')
+        os.mkdir(cache_dir)
+        self.conf['trace_cache_dir'] = cache_dir
+        entry_path = os.path.join(cache_dir, 'entry.bin')
+        bintrace.convert_text_to_binary(self.text_path, entry_path,
+                self.conf['event_file_column_names'])
+        self.assertTrue(traceindex.in_trace_cache(self.conf, entry_path))
+        self.assertFalse(traceindex.in_trace_cache(self.conf, self.text_path))
+
+        traceindex.get_index(self.conf, entry_path)
+        st = os.stat(entry_path)
+        os.utime(entry_path, (st.st_atime, st.st_mtime + 1))
+        self.assertNotEqual(
+            traceindex.TraceIndex.load(entry_path, content_addressed=True),
+            None)
+
+
+if __name__ == '__main__':
+    unittest.main()
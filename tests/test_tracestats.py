@@ -0,0 +1,92 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import config
+from pyreuse.sysutils import blocktrace, tracestats
+
+
+BLKPARSE_OUTPUT = "tests/testdata/blkparse-output.txt"
+
+
+class TestTraceStats(unittest.TestCase):
+    def setUp(self):
+        self.conf = config.ConfigNCQFTL()
+        self.tmpdir = tempfile.mkdtemp()
+        self.event_path = os.path.join(self.tmpdir, 'events.txt')
+        parser = blocktrace.BlktraceResultInMem(self.conf['sector_size'],
+                self.conf['event_file_column_names'],
+                BLKPARSE_OUTPUT, self.event_path, padding_bytes=0)
+        parser.create_event_file()
+
+        names = self.conf['event_file_column_names']
+        self.rows = []
+        with open(self.event_path, 'r') as f:
+            for line in f:
+                self.rows.append(dict(zip(names, line.split())))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_counts(self):
+        summary = tracestats.load_stats(self.event_path)
+        self.assertEqual(summary['n_events'], len(self.rows))
+
+        for op in tracestats.OPERATIONS:
+            rows = [row for row in self.rows if row['operation'] == op]
+            self.assertEqual(summary['ops'][op]['count'], len(rows))
+            self.assertEqual(summary['ops'][op]['bytes'],
+                    sum(int(row['size']) for row in rows))
+            self.assertEqual(sum(summary['size_histogram'][op].values()),
+                    len(rows))
+
+        self.assertEqual(
+                sum(summary['inter_arrival_histogram_usec'].values()),
+                len(self.rows) - 1)
+
+    def test_footprint(self):
+        summary = tracestats.load_stats(self.event_path)
+
+        touched = set()
+        for row in self.rows:
+            offset = int(row['offset'])
+            touched.update(range(offset, offset + int(row['size']), 512))
+        self.assertEqual(summary['footprint_bytes']['all'],
+                len(touched) * 512)
+
+    def test_sequential_ratio(self):
+        summary = tracestats.load_stats(self.event_path)
+
+        for op in tracestats.OPERATIONS:
+            rows = [row for row in self.rows if row['operation'] == op]
+            n_seq = 0
+            for prev, cur in zip(rows, rows[1:]):
+                if int(prev['offset']) + int(prev['size']) == \
+                        int(cur['offset']):
+                    n_seq += 1
+            if len(rows) > 0:
+                self.assertAlmostEqual(summary['sequential_ratio'][op],
+                        n_seq / float(len(rows)))
+
+    def test_stale(self):
+        stats_path = tracestats.stats_path_of(self.event_path)
+        past = time.time() - 100
+        os.utime(stats_path, (past, past))
+        self.assertEqual(tracestats.load_stats(self.event_path), None)
+
+    def test_missing(self):
+        os.remove(tracestats.stats_path_of(self.event_path))
+        self.assertEqual(tracestats.load_stats(self.event_path), None)
+
+    def test_extent_set(self):
+        extents = tracestats.ExtentSet(max_pending=2)
+        for start, end in [(0, 10), (20, 30), (5, 25), (40, 50), (50, 60)]:
+            extents.add(start, end)
+        self.assertEqual(extents.total_bytes(), 30 + 20)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+"""
+Translate physical page numbers (ppn) to machine addresses
+(channel, package, chip, plane, block, page) for many pages at once.
+
+NumPy is used for large ppn lists if it is installed. Small lists, which
+are most of the calls (a few pages of one request), are faster in plain
+Python than converting them to arrays, so they never go through NumPy.
+"""
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+LEVELS = ('channel', 'package', 'chip', 'plane', 'block', 'page')
+
+# lists shorter than this are translated in plain Python
+NUMPY_MIN_PAGES = 64
+
+
+class AddressTranslator(object):
+    """
+    page_hierarchy is [n_pages_per_channel, n_pages_per_package,
+    n_pages_per_chip, n_pages_per_plane, n_pages_per_block], as in
+    controller.Controller.
+    """
+    def __init__(self, page_hierarchy, use_numpy=True):
+        self.page_hierarchy = list(page_hierarchy)
+        self.n_pages_per_channel = self.page_hierarchy[0]
+        self.n_pages_per_block = self.page_hierarchy[-1]
+        self.use_numpy = use_numpy is True and numpy is not None
+
+    def location(self, ppn):
+        """
+        [channel, package, chip, plane, block, page] of one ppn, same as
+        FlashAddress.location
+        """
+        location = []
+        for count in self.page_hierarchy:
+            location.append(ppn / count)
+            ppn = ppn % count
+        location.append(ppn)
+        return location
+
+    def locations(self, ppns):
+        """
+        List of locations of ppns
+        """
+        if self.use_numpy and len(ppns) >= NUMPY_MIN_PAGES:
+            columns = self.translate(ppns)
+            return numpy.column_stack(
+                    [columns[level] for level in LEVELS]).tolist()
+        return [self.location(ppn) for ppn in ppns]
+
+    def translate(self, ppns):
+        """
+        Return {level: values of ppns}, e.g. {'channel': [...], ...}. The
+        values are NumPy arrays if NumPy is used, otherwise lists.
+        """
+        if self.use_numpy:
+            rest = numpy.asarray(ppns, dtype=numpy.int64)
+            columns = {}
+            for level, count in zip(LEVELS, self.page_hierarchy):
+                columns[level], rest = numpy.divmod(rest, count)
+            columns['page'] = rest
+            return columns
+
+        locations = [self.location(ppn) for ppn in ppns]
+        return dict((level, [loc[i] for loc in locations])
+                for i, level in enumerate(LEVELS))
+
+    def channel_of_ppn(self, ppn):
+        return ppn / self.n_pages_per_channel
+
+    def channel_of_pbn(self, pbn):
+        return pbn * self.n_pages_per_block / self.n_pages_per_channel
+
+    def channels_of_ppns(self, ppns):
+        n = self.n_pages_per_channel
+        return [ppn / n for ppn in ppns]
+
+    def channel_counts(self, ppns):
+        """
+        Return [(channel, number of ppns on it), ...] for channels with at
+        least one of ppns, in channel order
+        """
+        if self.use_numpy and len(ppns) >= NUMPY_MIN_PAGES:
+            channels = numpy.asarray(ppns, dtype=numpy.int64) \
+                    // self.n_pages_per_channel
+            counts = numpy.bincount(channels)
+            return [(int(channel), int(counts[channel]))
+                    for channel in numpy.flatnonzero(counts)]
+
+        counts = {}
+        n = self.n_pages_per_channel
+        for ppn in ppns:
+            channel = ppn / n
+            counts[channel] = counts.get(channel, 0) + 1
+        return sorted(counts.items())
@@ -0,0 +1,302 @@
+import itertools
+import mmap
+import os
+import struct
+
+from commons import *
+from utilities import utils
+import hostevent
+
+
+MAGIC = 'WSCBTRC1'
+VERSION = 1
+
+# magic, version, events per block, number of events
+HEADER_FORMAT = '<8sIIq'
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+
+DEFAULT_BLOCK_EVENTS = 4096
+
+# Events are stored in blocks of block_events rows. Inside a block, each
+# column is stored contiguously (columnar), widest column first. Since every
+# full block has the same size, block i starts at
+#     HEADER_SIZE + i * block_bytes
+# and can be located without scanning the file.
+COLUMNS = [
+    # name             struct code
+    ('offset',         'q'),
+    ('size',           'q'),
+    ('timestamp',      'd'),
+    ('pre_wait_time',  'd'),
+    ('pid',            'i'),
+    ('operation',      'B'),
+    ('action',         'B'),
+    ('sync',           'B'),
+    ]
+COLUMN_NAMES = [name for name, _ in COLUMNS]
+ROW_BYTES = sum(struct.calcsize('<' + code) for _, code in COLUMNS)
+
+OPERATIONS = (OP_READ, OP_WRITE, OP_DISCARD)
+OPERATION_CODES = {'read': 0, 'write': 1, 'discard': 2,
+        OP_READ: 0, OP_WRITE: 1, OP_DISCARD: 2}
+
+NA = float('nan')
+
+
+def is_binary_trace(path):
+    if not os.path.isfile(path):
+        return False
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def _to_float(value):
+    if value is None or value == 'NA':
+        return NA
+    return float(value)
+
+
+def _to_flag(value):
+    return 1 if str(value) == 'True' else 0
+
+
+class BinaryTraceWriter(object):
+    """
+    Write events to the binary columnar trace format.
+
+    Usage:
+        writer = BinaryTraceWriter(path)
+        writer.append(pid, 'D', 'write', offset, size, timestamp,
+            pre_wait_time, sync)
+        writer.close()
+    """
+    def __init__(self, path, block_events=DEFAULT_BLOCK_EVENTS):
+        self.path = path
+        self.block_events = block_events
+        self.n_events = 0
+
+        utils.prepare_dir_for_path(path)
+        self._file = open(path, 'wb')
+        self._write_header()
+
+        self._columns = [[] for _ in COLUMNS]
+        self._block_structs = [struct.Struct('<{}{}'.format(block_events, code))
+                for _, code in COLUMNS]
+
+    def _write_header(self):
+        self._file.seek(0)
+        self._file.write(struct.pack(HEADER_FORMAT, MAGIC, VERSION,
+            self.block_events, self.n_events))
+
+    def append(self, pid, action, operation, offset, size,
+            timestamp=None, pre_wait_time=None, sync=False):
+        row = (int(offset), int(size), _to_float(timestamp),
+               _to_float(pre_wait_time), int(pid),
+               OPERATION_CODES[operation], ord(action), _to_flag(sync))
+        for column, value in zip(self._columns, row):
+            column.append(value)
+        self.n_events += 1
+
+        if len(self._columns[0]) == self.block_events:
+            self._flush_block()
+
+    def _flush_block(self):
+        n = len(self._columns[0])
+        if n == 0:
+            return
+
+        for (_, code), block_struct, column in zip(COLUMNS,
+                self._block_structs, self._columns):
+            if n == self.block_events:
+                self._file.write(block_struct.pack(*column))
+            else:
+                self._file.write(struct.pack('<{}{}'.format(n, code), *column))
+
+        self._columns = [[] for _ in COLUMNS]
+
+    def close(self):
+        self._flush_block()
+        self._write_header()
+        self._file.flush()
+        os.fsync(self._file)
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, etype, value, traceback):
+        self.close()
+
+
+class BinaryTraceReader(object):
+    """
+    Memory-mapped reader of the binary columnar trace format. Rows are
+    decoded one block at a time, column by column.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, self.block_events, self.n_events = \
+                struct.unpack_from(HEADER_FORMAT, self._mm, 0)
+        if magic != MAGIC:
+            raise RuntimeError("{} is not a binary trace file".format(path))
+        if version != VERSION:
+            raise RuntimeError("Binary trace version {} is not supported"\
+                    .format(version))
+
+        self.block_bytes = self.block_events * ROW_BYTES
+        self.n_blocks = (self.n_events + self.block_events - 1) \
+                / self.block_events
+        self._block_structs = [struct.Struct('<{}{}'.format(
+            self.block_events, code)) for _, code in COLUMNS]
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+    def block_offset(self, block_index):
+        return HEADER_SIZE + block_index * self.block_bytes
+
+    def block_size(self, block_index):
+        """number of events in block block_index"""
+        return min(self.block_events,
+                self.n_events - block_index * self.block_events)
+
+    def read_block(self, block_index):
+        """
+        Return a list of columns (tuples), in the order of COLUMN_NAMES
+        """
+        n = self.block_size(block_index)
+        pos = self.block_offset(block_index)
+        columns = []
+        for (_, code), block_struct in zip(COLUMNS, self._block_structs):
+            if n == self.block_events:
+                column = block_struct.unpack_from(self._mm, pos)
+            else:
+                column = struct.unpack_from('<{}{}'.format(n, code),
+                        self._mm, pos)
+            columns.append(column)
+            pos += struct.calcsize('<' + code) * n
+        return columns
+
+    def iter_blocks(self, start_block=0):
+        for block_index in xrange(start_block, self.n_blocks):
+            yield self.read_block(block_index)
+
+    def iter_rows(self, start_block=0):
+        """
+        Each row is a tuple in the order of COLUMN_NAMES
+        """
+        for columns in self.iter_blocks(start_block):
+            for row in itertools.izip(*columns):
+                yield row
+
+    def __iter__(self):
+        return self.iter_rows()
+
+    def __len__(self):
+        return self.n_events
+
+
+class BinaryEventIterator(object):
+    """
+    It has the same role as EventIterator, but reads a binary trace
+    file instead of text lines. The bytes read are counted in
+    trace_readings (progress.TraceReadings) if it is given.
+    """
+    def __init__(self, conf, path, start_event=0, trace_readings=None):
+        self.conf = conf
+        self.sector_size = self.conf['sector_size']
+        self.path = path
+        # index of the first event to return
+        self.start_event = start_event
+        self.trace_readings = trace_readings
+
+    def row_to_event(self, row):
+        offset, size, timestamp, pre_wait_time, pid, op_code, action, sync \
+                = row
+        if pre_wait_time != pre_wait_time:
+            # NaN
+            pre_wait_time = 'NA'
+        return hostevent.new_event(self.sector_size, pid,
+                OPERATIONS[op_code], offset, size, timestamp,
+                pre_wait_time, bool(sync), chr(action))
+
+    def __iter__(self):
+        reader = BinaryTraceReader(self.path)
+        try:
+            start_block, skip = divmod(self.start_event, reader.block_events)
+            rows = itertools.islice(reader.iter_rows(start_block), skip,
+                    None)
+            if self.trace_readings is None:
+                for row in rows:
+                    yield self.row_to_event(row)
+                return
+
+            reading = self.trace_readings.open(self.path,
+                    HEADER_SIZE + self.start_event * ROW_BYTES)
+            for row in rows:
+                reading.read_bytes += ROW_BYTES
+                yield self.row_to_event(row)
+        finally:
+            reader.close()
+
+
+def convert_text_to_binary(text_path, binary_path, event_file_column_names,
+        block_events=DEFAULT_BLOCK_EVENTS):
+    """
+    Convert an event file created by blocktrace.BlktraceResult to the binary
+    format. Returns the number of events converted.
+    """
+    n_columns = len(event_file_column_names)
+    with BinaryTraceWriter(binary_path, block_events) as writer:
+        for line in hostevent.FileLineIterator(text_path):
+            items = line.split()
+            if len(items) == 0:
+                continue
+            if len(items) != n_columns:
+                raise RuntimeError("Lengths not equal: {} {}".format(
+                    event_file_column_names, items))
+            dic = dict(zip(event_file_column_names, items))
+            writer.append(pid=dic['pid'], action=dic.get('action', 'D'),
+                    operation=dic['operation'], offset=dic['offset'],
+                    size=dic['size'], timestamp=dic.get('timestamp', 'NA'),
+                    pre_wait_time=dic.get('pre_wait_time', 'NA'),
+                    sync=dic.get('sync', 'False'))
+
+        return writer.n_events
+
+
+def binary_path_of(text_path):
+    return text_path + '.bin'
+
+
+def resolve_event_file(path):
+    """
+    Return the file to read events of path from. If path is a text file and
+    an up-to-date converted binary trace sits next to it (see
+    binary_path_of()), it is the binary trace.
+    """
+    bin_path = binary_path_of(path)
+    if is_binary_trace(path):
+        return path
+    elif is_binary_trace(bin_path) and (not os.path.exists(path) or
+            os.path.getmtime(bin_path) >= os.path.getmtime(path)):
+        return bin_path
+    else:
+        return path
+
+
+def event_iterator(conf, path, trace_readings=None):
+    """
+    Return an event iterator for path, which can be a text event file or a
+    binary trace. Its reads are counted in trace_readings if it is given.
+    """
+    path = resolve_event_file(path)
+    if is_binary_trace(path):
+        return BinaryEventIterator(conf, path, trace_readings=trace_readings)
+    else:
+        return hostevent.EventIterator(conf, hostevent.FileLineIterator(path,
+            trace_readings=trace_readings))
@@ -0,0 +1,189 @@
+"""
+Save the state of a simulated SSD to a file and start other simulations
+from it, so that a device warmed up by mkfs and aging is simulated once and
+reused by many runs.
+
+A checkpoint holds the FTL with everything it refers to (mapping cache,
+mapping on flash, translation directory, OOB, block pools and erase
+counts), the recorder counters, the simulation clock and the random state.
+The config, simpy environment, recorder and flash controller of the run
+that restores it are plugged into the FTL in place of the saved ones, and
+simpy resources and lock pools are recreated empty. So the checkpoint must
+be taken when the SSD is idle, i.e. right after an OP_BARRIER.
+
+OP_CHECKPOINT with arg1 = path writes a checkpoint. conf
+'checkpoint_restore_path' starts a simulation from one. Only SimulatorDESNew
+and its subclasses do either.
+"""
+import cPickle
+import cStringIO
+import gzip
+import os
+import random
+
+import simpy
+
+from commons import *
+from ftlsim_commons import LockPool
+import hostevent
+
+
+VERSION = 2
+
+
+def device_signature(conf):
+    """
+    Parts of conf the saved FTL was built for. A checkpoint can only be
+    restored with the same ones.
+    """
+    signature = {
+        'ftl_type': conf['ftl_type'],
+        'flash_config': dict(conf['flash_config']),
+        }
+    if conf['ftl_type'] == 'dftldes':
+        signature['n_cache_entries'] = conf.n_cache_entries
+    return signature
+
+
+def check_not_used(conf, simulator_name):
+    """
+    For the simulators that cannot save or restore checkpoints
+    """
+    for key in ('checkpoint_save_path', 'checkpoint_restore_path'):
+        if conf.get(key, None) is not None:
+            raise RuntimeError("{} is set, but {} does not support "
+                "checkpoints".format(key, simulator_name))
+
+
+def save_events(conf):
+    """
+    Events that save a checkpoint to conf['checkpoint_save_path'], if it is
+    set
+    """
+    path = conf.get('checkpoint_save_path', None)
+    if path is not None:
+        # the SSD has to be idle
+        yield hostevent.ControlEvent(operation=OP_BARRIER)
+        yield hostevent.ControlEvent(operation=OP_CHECKPOINT, arg1=path)
+
+
+def _run_objects(ssd):
+    return {
+        'conf': ssd.conf,
+        'env': ssd.env,
+        'recorder': ssd.recorder,
+        'flash_controller': ssd.flash_controller,
+        }
+
+
+def _dumps_ftl(ssd):
+    names = dict((id(obj), name) for name, obj in _run_objects(ssd).items())
+
+    def persistent_id(obj):
+        name = names.get(id(obj))
+        if name is not None:
+            return name
+
+        if isinstance(obj, LockPool):
+            if len(obj.locked_addrs) > 0:
+                raise RuntimeError("Checkpoint when addresses are locked. "
+                    "Add OP_BARRIER before OP_CHECKPOINT.")
+            return ('lockpool', id(obj))
+        elif isinstance(obj, simpy.Container):
+            return ('container', id(obj), obj.capacity, obj.level)
+        elif isinstance(obj, simpy.Resource):
+            if len(obj.users) > 0 or len(obj.queue) > 0:
+                raise RuntimeError("Checkpoint when a resource is in use. "
+                    "Add OP_BARRIER before OP_CHECKPOINT.")
+            return ('resource', id(obj), obj.capacity)
+        return None
+
+    f = cStringIO.StringIO()
+    pickler = cPickle.Pickler(f, cPickle.HIGHEST_PROTOCOL)
+    pickler.persistent_id = persistent_id
+    pickler.dump(ssd.ftl)
+    return f.getvalue()
+
+
+def _loads_ftl(data, ssd):
+    objects = _run_objects(ssd)
+    env = ssd.env
+    created = {}
+
+    def persistent_load(pid):
+        if not isinstance(pid, tuple):
+            return objects[pid]
+
+        # objects shared in the saved ftl are shared in the restored one
+        key = pid[:2]
+        if key not in created:
+            kind = pid[0]
+            if kind == 'lockpool':
+                created[key] = LockPool(env)
+            elif kind == 'container':
+                created[key] = simpy.Container(env, capacity=pid[2],
+                        init=pid[3])
+            elif kind == 'resource':
+                created[key] = simpy.Resource(env, capacity=pid[2])
+            else:
+                raise RuntimeError("Unknown object {} in checkpoint".format(
+                    kind))
+        return created[key]
+
+    unpickler = cPickle.Unpickler(cStringIO.StringIO(data))
+    unpickler.persistent_load = persistent_load
+    return unpickler.load()
+
+
+def save(path, ssd):
+    state = {
+        'version': VERSION,
+        'device': device_signature(ssd.conf),
+        'now': ssd.env.now,
+        'random_state': random.getstate(),
+        'recorder': ssd.recorder.get_state(),
+        'gc_sleep_timer': ssd.gc_sleep_timer,
+        'ftl': _dumps_ftl(ssd),
+        }
+
+    # write to a temp file first, other runs may be reading the old one
+    tmp_path = path + '.tmp'
+    f = gzip.open(tmp_path, 'wb', compresslevel=1)
+    try:
+        cPickle.dump(state, f, cPickle.HIGHEST_PROTOCOL)
+    finally:
+        f.close()
+    os.rename(tmp_path, path)
+    print 'checkpoint saved to', path, 'at', ssd.env.now
+
+
+def load(path):
+    f = gzip.open(path, 'rb')
+    try:
+        state = cPickle.load(f)
+    finally:
+        f.close()
+
+    if state.get('version') != VERSION:
+        raise RuntimeError("Checkpoint {} has version {}, expecting {}"
+                .format(path, state.get('version'), VERSION))
+    return state
+
+
+def restore(ssd, state):
+    """
+    Put the state of checkpoint into ssd, whose env must start at
+    state['now'].
+    """
+    signature = device_signature(ssd.conf)
+    if signature != state['device']:
+        raise RuntimeError("Checkpoint was taken with {}, but the device "
+            "is {}".format(state['device'], signature))
+    if ssd.env.now != state['now']:
+        raise RuntimeError("Simulation starts at {}, but the checkpoint "
+            "was taken at {}".format(ssd.env.now, state['now']))
+
+    random.setstate(state['random_state'])
+    ssd.recorder.set_state(state['recorder'])
+    ssd.gc_sleep_timer = state['gc_sleep_timer']
+    ssd.set_ftl(_loads_ftl(state['ftl'], ssd))
@@ -0,0 +1,120 @@
+"""
+Merge runs of small back-to-back requests before they are simulated, like
+the block layer merges bios of a plugged queue: an event is merged into the
+previous one if they have the same operation, pid and sync flag, it starts
+where the previous one ends, it arrives within `window_sec` and the merged
+request is not larger than `max_bytes`.
+
+Only data events issued to the device (action 'D') are merged. Any other
+event ends the current run, so the events keep their order. A merged request
+is a new event; the events read are not changed.
+"""
+from commons import *
+import hostevent
+
+
+MERGEABLE_OPS = (OP_READ, OP_WRITE, OP_DISCARD)
+
+
+def _to_float(timestamp):
+    if timestamp is None or timestamp == 'NA':
+        return None
+    timestamp = float(timestamp)
+    if timestamp != timestamp:
+        # NaN in binary traces
+        return None
+    return timestamp
+
+
+class RequestCoalescer(object):
+    def __init__(self, event_iter, sector_size, max_bytes, window_sec=None):
+        self.event_iter = event_iter
+        self.sector_size = sector_size
+        self.max_bytes = max_bytes
+        self.window_sec = window_sec
+
+        # events read from event_iter, and events merged into others
+        self.n_input_events = 0
+        self.n_merged_events = 0
+
+    def _can_merge(self, pending, pending_size, pending_time, event):
+        if event.operation != pending.operation or \
+                event.pid != pending.pid or \
+                event.sync != pending.sync:
+            return False
+        if event.offset != pending.offset + pending_size:
+            return False
+        if pending_size + event.size > self.max_bytes:
+            return False
+        if self.window_sec is not None:
+            event_time = _to_float(event.timestamp)
+            if pending_time is None or event_time is None or \
+                    event_time - pending_time > self.window_sec:
+                return False
+        return True
+
+    def _merged(self, first, size):
+        """
+        first with its size extended to size
+        """
+        if size == first.size:
+            return first
+        return hostevent.new_event(self.sector_size, first.pid,
+                first.operation, first.offset, size, first.timestamp,
+                first.pre_wait_time, first.sync, first.action)
+
+    def __iter__(self):
+        # first event of the run, and size of the run
+        pending = None
+        pending_size = None
+        # time of the last event merged into pending
+        pending_time = None
+
+        for event in self.event_iter:
+            if isinstance(event, hostevent.Event):
+                self.n_input_events += 1
+                mergeable = event.action == 'D' and \
+                        event.operation in MERGEABLE_OPS and event.offset >= 0
+            else:
+                mergeable = False
+
+            if not mergeable:
+                if pending is not None:
+                    yield self._merged(pending, pending_size)
+                    pending = None
+                yield event
+                continue
+
+            if pending is not None and self._can_merge(pending, pending_size,
+                    pending_time, event):
+                pending_size += event.size
+                pending_time = _to_float(event.timestamp)
+                self.n_merged_events += 1
+                continue
+
+            if pending is not None:
+                yield self._merged(pending, pending_size)
+            pending = event
+            pending_size = event.size
+            pending_time = _to_float(event.timestamp)
+
+        if pending is not None:
+            yield self._merged(pending, pending_size)
+
+    def record_stats(self, recorder):
+        recorder.set_result_by_one_key('coalesce_input_events',
+                self.n_input_events)
+        recorder.set_result_by_one_key('coalesce_merged_events',
+                self.n_merged_events)
+
+
+def coalesced(conf, event_iter):
+    """
+    Wrap event_iter with a RequestCoalescer if conf['coalesce_requests'] is
+    True, otherwise return event_iter as is.
+    """
+    if event_iter is None or conf.get('coalesce_requests', False) is not True:
+        return event_iter
+    return RequestCoalescer(event_iter, conf['sector_size'],
+            max_bytes=conf['coalesce_max_bytes'],
+            window_sec=conf['coalesce_window_sec'])
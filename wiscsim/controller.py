@@ -2,6 +2,7 @@ import simpy
 import wiscsim
 from collections import Counter
 from commons import *
+import addrtrans
 
 class FlashAddress(object):
     def __init__(self):
@@ -123,6 +124,8 @@ class Controller(object):
                                 self.n_pages_per_plane,
                                 self.n_pages_per_block]
 
+        self.translator = addrtrans.AddressTranslator(self.page_hierarchy)
+
         self.channels = [Channel(self.env, conf, i)
                 for i in range( self.n_channels_per_dev)]
 
@@ -156,8 +159,11 @@ class Controller(object):
         op can be 'read', 'write', and 'erase'
         """
         ret_requests = []
-        for page in range(page_start, page_start + page_count):
-            machine_page_addr = self.physical_to_machine_page(page)
+        locations = self.translator.locations(
+                range(page_start, page_start + page_count))
+        for location in locations:
+            machine_page_addr = FlashAddress()
+            machine_page_addr.location = location
             flash_req = create_flashrequest(machine_page_addr, op = op)
             ret_requests.append(flash_req)
 
@@ -168,10 +174,7 @@ class Controller(object):
 
         # page_hierarchy has [channel, package, ..., block]
         # location has       [channel, package, ..., block, page]
-        for i, count in enumerate(self.page_hierarchy):
-            addr.location[i] = page_no / count
-            page_no = page_no % count
-        addr.location[-1] = page_no
+        addr.location = self.translator.location(page_no)
 
         return addr
 
@@ -310,6 +313,201 @@ class Controller3(Controller):
                 flash_request.operation))
 
 
+class ControllerAnalytical(Controller3):
+    """
+    Same timing as Controller3, computed instead of simulated.
+
+    Each channel serves its operations one by one in arrival order, so the
+    time an operation ends can be computed when it is issued:
+
+        start = max(now, time the channel becomes free)
+        end = start + operation time
+
+    A call then waits for its last operation with a single timeout, instead
+    of running one SimPy process per page and channel resource requests.
+    flash_ops is counted when operations are issued, as in Controller3.
+    channel_busy_time and channel_timeline.txt are recorded when the call
+    ends rather than when each operation ends.
+    """
+    def __init__(self, simpy_env, conf, recorderobj):
+        super(ControllerAnalytical, self).__init__(simpy_env, conf,
+                recorderobj)
+
+        self.channel_free_time = [0] * self.n_channels_per_dev
+
+        channel = self.channels[0]
+        self._op_time = {OP_READ: channel.read_time,
+                         OP_WRITE: channel.program_time,
+                         OP_ERASE: channel.erase_time}
+        # names used by FTLs and in channel_busy_time counters
+        self._op_of_name = {'read': OP_READ, 'write': OP_WRITE,
+                            'erase': OP_ERASE}
+        self._name_of_op = {OP_READ: 'read', OP_WRITE: 'write',
+                            OP_ERASE: 'erase'}
+
+    def _book(self, channel_ops, tag, count=True):
+        """
+        Book [(channel id, op), ...] on the channels. Return a process
+        (generator) that ends when all of them end.
+        """
+        now = self.env.now
+        free_time = self.channel_free_time
+        op_time = self._op_time
+
+        booked = []
+        end_time = now
+        for channel_id, op in channel_ops:
+            if count is True:
+                self.recorder.count_me('flash_ops', op)
+            s = max(now, free_time[channel_id])
+            e = s + op_time[op]
+            free_time[channel_id] = e
+            booked.append((channel_id, op, s, e))
+            if e > end_time:
+                end_time = e
+
+        return self._complete(booked, end_time, tag)
+
+    def _complete(self, booked, end_time, tag):
+        yield self.env.timeout(end_time - self.env.now)
+
+        tag_group = self.recorder.tag_group(tag)
+        for channel_id, op, s, e in booked:
+            channel = self.channels[channel_id]
+            self.recorder.add_to_timer(
+                channel.counter_set_name(),
+                "channel_{id}-{op}-{tag}".format(id = channel_id,
+                    op = self._name_of_op[op], tag = tag_group),
+                e - s)
+            channel._write_channel_timeline(channel_id=channel_id,
+                    start_time=s, end_time=e, tag=tag)
+
+    def rw_ppns(self, ppns, op, tag):
+        """
+        op is 'read' or 'write'
+        """
+        if op not in ('read', 'write'):
+            raise RuntimeError("operation {} is not supported".format(op))
+        op = self._op_of_name[op]
+        return self._book([(channel, op) for channel
+            in self.translator.channels_of_ppns(ppns)], tag)
+
+    def rw_ppn_extent(self, ppn_start, ppn_count, op, tag):
+        return self.rw_ppns(range(ppn_start, ppn_start + ppn_count), op, tag)
+
+    def erase_pbn_extent(self, pbn_start, pbn_count, tag):
+        channel_of_pbn = self.translator.channel_of_pbn
+        return self._book([(channel_of_pbn(pbn), OP_ERASE)
+            for pbn in range(pbn_start, pbn_start + pbn_count)], tag)
+
+    def execute_request_list(self, flash_request_list, tag):
+        for request in flash_request_list:
+            if request.operation not in self._op_time:
+                raise RuntimeError("operation {} is not supported".format(
+                    request.operation))
+        return self._book([(request.addr.channel, request.operation)
+            for request in flash_request_list], tag)
+
+    def execute_request(self, flash_request, tag):
+        return self.execute_request_list([flash_request], tag)
+
+    def write_page(self, addr, tag, data = None):
+        return self._book([(addr.channel, OP_WRITE)], tag, count=False)
+
+    def read_page(self, addr, tag):
+        return self._book([(addr.channel, OP_READ)], tag, count=False)
+
+    def erase_block(self, addr, tag):
+        return self._book([(addr.channel, OP_ERASE)], tag, count=False)
+
+
+class ControllerBatched(Controller3):
+    """
+    Controller3 that groups the operations of a call by channel. Each
+    channel is taken once for all of its operations in the call (see
+    Channel3.execute_batch()), so a call costs one process and one timeout
+    per channel instead of several processes per page.
+
+    Operations of concurrent calls no longer interleave on a channel: a
+    batch holds the channel until it is done.
+    """
+    def _channel_batches(self, channel_ops):
+        """
+        Group [(channel id, op), ...] into
+        [(channel id, [(op, count), ...]), ...]. Channels and the ops of a
+        channel are in the order they first appear.
+        """
+        op_counts = {}
+        order = []
+        for channel_id, op in channel_ops:
+            counts = op_counts.get(channel_id)
+            if counts is None:
+                counts = op_counts[channel_id] = []
+                order.append(channel_id)
+            for i, (counted_op, count) in enumerate(counts):
+                if counted_op == op:
+                    counts[i] = (op, count + 1)
+                    break
+            else:
+                counts.append((op, 1))
+        return [(channel_id, op_counts[channel_id]) for channel_id in order]
+
+    def _execute_batches(self, batches, tag):
+        """
+        batches is [(channel id, [(op, count), ...]), ...]
+        """
+        procs = []
+        for channel_id, op_counts in batches:
+            for op, count in op_counts:
+                self.recorder.add_to_general_accumulater('flash_ops', op,
+                        count)
+            procs.append(self.env.process(
+                self.channels[channel_id].execute_batch(tag, op_counts)))
+        yield simpy.events.AllOf(self.env, procs)
+
+    def rw_ppns(self, ppns, op, tag):
+        """
+        op is 'read' or 'write'
+        """
+        if op == 'read':
+            op = OP_READ
+        elif op == 'write':
+            op = OP_WRITE
+        else:
+            raise RuntimeError("operation {} is not supported".format(op))
+
+        return self._execute_batches(
+                [(channel_id, [(op, count)]) for channel_id, count
+                    in self.translator.channel_counts(ppns)], tag)
+
+    def rw_ppn_extent(self, ppn_start, ppn_count, op, tag):
+        return self.rw_ppns(range(ppn_start, ppn_start + ppn_count), op, tag)
+
+    def erase_pbn_extent(self, pbn_start, pbn_count, tag):
+        channel_of_pbn = self.translator.channel_of_pbn
+        return self._execute_batches(self._channel_batches(
+                [(channel_of_pbn(pbn), OP_ERASE)
+                    for pbn in range(pbn_start, pbn_start + pbn_count)]), tag)
+
+    def execute_request_list(self, flash_request_list, tag):
+        for request in flash_request_list:
+            if request.operation not in (OP_READ, OP_WRITE, OP_ERASE):
+                raise RuntimeError("operation {} is not supported".format(
+                    request.operation))
+        return self._execute_batches(self._channel_batches(
+                [(request.addr.channel, request.operation)
+                    for request in flash_request_list]), tag)
+
+
+def create_controller(simpy_env, conf, recorderobj):
+    """
+    conf['flash_controller_class'] is Controller3, ControllerBatched or
+    ControllerAnalytical
+    """
+    cls = eval(conf.get('flash_controller_class', 'Controller3'))
+    return cls(simpy_env, conf, recorderobj)
+
+
 class Channel(object):
     """
     This is a channel with only single package, chip, and plane. This is how a
@@ -480,3 +678,32 @@ class Channel3(Channel2):
             self._write_channel_timeline(channel_id=self.channel_id,
                     start_time=s, end_time=e, tag=tag)
 
+    def execute_batch(self, tag, op_counts):
+        """
+        op_counts is [(op, count), ...]. The operations run back to back,
+        count of each op in turn: the channel is taken once and held for
+        all of them. Accounted as separate operations.
+        """
+        with self.resource.request() as request:
+            yield request
+            for op, n_ops in op_counts:
+                op_name, op_time = self._batch_ops[op]
+                s = self.env.now
+                yield self.env.timeout( op_time * n_ops )
+                e = self.env.now
+                self.recorder.add_to_timer(
+                    self.counter_set_name(),
+                    "channel_{id}-{op}-{tag}".format(id = self.channel_id,
+                        op = op_name, tag = self.recorder.tag_group(tag)),
+                    e - s)
+                for i in range(n_ops):
+                    self._write_channel_timeline(channel_id=self.channel_id,
+                            start_time=s + i * op_time,
+                            end_time=s + (i + 1) * op_time, tag=tag)
+
+    @property
+    def _batch_ops(self):
+        return {OP_READ: ('read', self.read_time),
+                OP_WRITE: ('write', self.program_time),
+                OP_ERASE: ('erase', self.erase_time)}
+
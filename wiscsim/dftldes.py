@@ -1,3 +1,4 @@
+import array
 import bitarray
 from collections import deque, Counter
 import csv
@@ -124,10 +125,6 @@ class Ftl(object):
         self.written_bytes = 0
         self.discarded_bytes = 0
         self.read_bytes = 0
-        self.pre_written_bytes = 0
-        self.pre_discarded_bytes = 0
-        self.pre_read_bytes = 0
-        self.display_interval = 4 * MB
 
     def _check_segment_config(self):
         if self.conf['segment_bytes'] % (self.conf.n_pages_per_block \
@@ -151,6 +148,14 @@ class Ftl(object):
             mapping.update( dict(zip(seg_ext.lpn_iter(), ppns)) )
         return mapping
 
+    def register_ssd_handlers(self, ssd):
+        ssd.register_handler(OP_FLUSH_TRANS_CACHE,
+                lambda event: self.flush_trans_cache())
+        ssd.register_handler(OP_PURGE_TRANS_CACHE,
+                lambda event: self.purge_trans_cache())
+        ssd.register_handler(OP_DROP_TRANS_CACHE,
+                lambda event: self.drop_trans_cache())
+
     def flush_trans_cache(self):
         yield self.env.process(self._mappings.flush())
 
@@ -165,10 +170,6 @@ class Ftl(object):
         req_size = extent.lpn_count * self.conf.page_size
         self.recorder.add_to_general_accumulater('traffic', 'write', req_size)
         self.written_bytes += req_size
-        if self.written_bytes > self.pre_written_bytes + self.display_interval:
-            print 'Written (MB)', self.pre_written_bytes / MB, 'writing', round(float(req_size) / MB, 2)
-            sys.stdout.flush()
-            self.pre_written_bytes = self.written_bytes
 
         op_id = self.recorder.get_unique_num()
         start_time = self.env.now # <----- start
@@ -275,10 +276,6 @@ class Ftl(object):
         req_size = extent.lpn_count * self.conf.page_size
         self.recorder.add_to_general_accumulater('traffic', 'read', req_size)
         self.read_bytes += req_size
-        if self.read_bytes > self.pre_read_bytes + self.display_interval:
-            print 'Read (MB)', self.pre_read_bytes / MB, 'reading', round(float(req_size) / MB, 2)
-            sys.stdout.flush()
-            self.pre_read_bytes = self.read_bytes
 
         ext_list = split_ext_to_mvpngroups(self.conf, extent)
         # print [str(x) for x in ext_list]
@@ -323,10 +320,6 @@ class Ftl(object):
         req_size = extent.lpn_count * self.conf.page_size
         self.recorder.add_to_general_accumulater('traffic', 'discard', req_size)
         self.discarded_bytes += req_size
-        if self.discarded_bytes > self.pre_discarded_bytes + self.display_interval:
-            print 'Discarded (MB)', self.pre_discarded_bytes / MB, 'discarding', round(float(req_size) / MB, 2)
-            sys.stdout.flush()
-            self.pre_discarded_bytes = self.discarded_bytes
 
         ext_list = split_ext_to_mvpngroups(self.conf, extent)
 
@@ -715,7 +708,8 @@ class MappingCache(FlashTransmitMixin, InsertMixin, LoadMixin, FlushMixin):
         self.directory = directory
         self.mapping_on_flash = mapping_on_flash
 
-        self._lpn_table = LpnTableMvpn(confobj)
+        self._lpn_table = eval(confobj.get('lpn_table_class',
+            'LpnTableMvpn'))(confobj)
 
         self._trans_page_locks = trans_page_locks
 
@@ -815,6 +809,12 @@ class LpnTable(object):
     def __init__(self, n_rows):
         self._n_rows = n_rows
 
+        # number of rows in each state and ids of FREE rows, kept by
+        # _row_state_changed() so that they are not counted or searched
+        self._state_counts = Counter({FREE: n_rows})
+        # the lowest row id is taken first
+        self._free_row_ids = range(n_rows - 1, -1, -1)
+
         self._rows = self._fresh_rows()
 
         # lpns to Row instances, it is a dict
@@ -825,36 +825,45 @@ class LpnTable(object):
 
     def _fresh_rows(self):
          return [
-            Row(lpn = None, ppn = None, dirty = False, state = FREE, rowid = i)
+            Row(lpn = None, ppn = None, dirty = False, state = FREE, rowid = i,
+                table = self)
             for i in range(self._n_rows) ]
 
     def rows(self):
         return self._rows
 
-    def _count_states(self):
+    def _row_state_changed(self, row, old_state, new_state):
         """
-        slower but reduces duplication
+        Called by Row when its state changes
         """
-        counter = Counter()
-        for row in self._rows:
-            counter[row.state] += 1
-        return counter
+        counts = self._state_counts
+        counts[old_state] -= 1
+        counts[new_state] += 1
+        if new_state == FREE:
+            self._free_row_ids.append(row.rowid)
+
+    def _count_states(self):
+        return Counter(dict((state, n)
+            for state, n in self._state_counts.items() if n > 0))
 
     def n_free_rows(self):
-        return self._count_states()[FREE]
+        return self._state_counts[FREE]
 
     def n_locked_free_rows(self):
-        return self._count_states()[FREE_AND_LOCKED]
+        return self._state_counts[FREE_AND_LOCKED]
 
     def n_used_rows(self):
-        return self._count_states()[USED]
+        return self._state_counts[USED]
 
     def n_locked_used_rows(self):
-        return self._count_states()[USED_AND_LOCKED]
+        return self._state_counts[USED_AND_LOCKED]
 
     def lock_free_row(self):
         """FREE TO FREE_AND_LOCKED"""
-        for row in self._rows:
+        free_row_ids = self._free_row_ids
+        while len(free_row_ids) > 0:
+            row = self._rows[free_row_ids.pop()]
+            # a row locked not by this method leaves its id behind
             if row.state == FREE:
                 row.state = FREE_AND_LOCKED
                 return row.rowid
@@ -878,15 +887,11 @@ class LpnTable(object):
 
     def lock_free_rows(self, n):
         row_ids = []
-        got = 0
-        for row in self._rows:
-            if row.state == FREE:
-                row.state = FREE_AND_LOCKED
-                row_ids.append(row.rowid)
-                got += 1
-
-                if got == n:
-                    break
+        while len(row_ids) < n:
+            rowid = self.lock_free_row()
+            if rowid is None:
+                break
+            row_ids.append(rowid)
         return row_ids
 
     def unlock_free_row(self, rowid):
@@ -1050,6 +1055,286 @@ class LpnTableMvpn(LpnTable):
         return uncached_lpns
 
 
+# the states a row may come from, see Row.state
+PREVIOUS_STATES = {
+    FREE: (FREE_AND_LOCKED,),
+    FREE_AND_LOCKED: (FREE, USED),
+    USED: (FREE_AND_LOCKED, USED_AND_LOCKED, USED_AND_HOLD),
+    USED_AND_LOCKED: (USED,),
+    USED_AND_HOLD: (USED,),
+    }
+
+# row states as the small ints kept in CompactLpnTable
+ROW_STATES = [FREE, FREE_AND_LOCKED, USED, USED_AND_LOCKED, USED_AND_HOLD]
+ROW_STATE_CODES = dict((state, code) for code, state in enumerate(ROW_STATES))
+
+# lpn/ppn of a row with no data, and ppn UNINITIATED, in the arrays
+NO_NUMBER = -1
+UNINITIATED_PPN = -2
+
+
+class CompactLpnTable(LpnTable):
+    """
+    LpnTable that keeps lpn, ppn, dirty and state of the rows in arrays,
+    and the LRU order of the lpns in arrays of the previous and next row
+    ids, instead of a Row and an lrulist.Node for each row. It takes less
+    than a tenth of the memory of LpnTable. The rows given out (rows(), peek(),
+    least_to_most_lpn_items()) are views of a row id.
+    """
+    def __init__(self, n_rows):
+        self._n_rows = n_rows
+        self._state_counts = Counter({FREE: n_rows})
+        self._free_row_ids = range(n_rows - 1, -1, -1)
+
+        self._lpns = array.array('l', [NO_NUMBER]) * n_rows
+        self._ppns = array.array('l', [NO_NUMBER]) * n_rows
+        self._dirty = array.array('b', [0]) * n_rows
+        self._states = array.array('b', [ROW_STATE_CODES[FREE]]) * n_rows
+
+        # LRU list of the rows with an lpn, head is the most recent
+        self._prev = array.array('l', [NO_NUMBER]) * n_rows
+        self._next = array.array('l', [NO_NUMBER]) * n_rows
+        self._head = NO_NUMBER
+        self._tail = NO_NUMBER
+
+        # {lpn: rowid}
+        self._lpn_to_rowid = {}
+
+    def rows(self):
+        return [CompactRow(self, rowid) for rowid in range(self._n_rows)]
+
+    def peek(self, lpn):
+        """The row of lpn, without changing the LRU order"""
+        return CompactRow(self, self._lpn_to_rowid[lpn])
+
+    def _state(self, rowid):
+        return ROW_STATES[self._states[rowid]]
+
+    def _set_state(self, rowid, state):
+        old_state = ROW_STATES[self._states[rowid]]
+        if state not in PREVIOUS_STATES:
+            raise RuntimeError("{} is not a valid state".format(state))
+        assert old_state in PREVIOUS_STATES[state], \
+                "current state {}".format(old_state)
+
+        self._states[rowid] = ROW_STATE_CODES[state]
+        counts = self._state_counts
+        counts[old_state] -= 1
+        counts[state] += 1
+        if state == FREE:
+            self._free_row_ids.append(rowid)
+
+    def _assert_modification_allowed(self, rowid):
+        assert self._state(rowid) in (FREE_AND_LOCKED, USED, USED_AND_HOLD), \
+                "current state {}".format(self._state(rowid))
+
+    def _set_data(self, rowid, lpn, ppn, dirty):
+        self._assert_modification_allowed(rowid)
+        self._lpns[rowid] = lpn
+        if ppn == UNINITIATED:
+            ppn = UNINITIATED_PPN
+        self._ppns[rowid] = ppn
+        self._dirty[rowid] = dirty
+
+    def _ppn(self, rowid):
+        ppn = self._ppns[rowid]
+        if ppn == UNINITIATED_PPN:
+            return UNINITIATED
+        elif ppn == NO_NUMBER:
+            return None
+        return ppn
+
+    def _unlink(self, rowid):
+        prev = self._prev[rowid]
+        next_ = self._next[rowid]
+        if prev == NO_NUMBER:
+            self._head = next_
+        else:
+            self._next[prev] = next_
+        if next_ == NO_NUMBER:
+            self._tail = prev
+        else:
+            self._prev[next_] = prev
+
+    def _link_to_head(self, rowid):
+        head = self._head
+        self._prev[rowid] = NO_NUMBER
+        self._next[rowid] = head
+        if head == NO_NUMBER:
+            self._tail = rowid
+        else:
+            self._prev[head] = rowid
+        self._head = rowid
+
+    def _link_to_tail(self, rowid):
+        tail = self._tail
+        self._next[rowid] = NO_NUMBER
+        self._prev[rowid] = tail
+        if tail == NO_NUMBER:
+            self._head = rowid
+        else:
+            self._next[tail] = rowid
+        self._tail = rowid
+
+    def _move_to_head(self, rowid):
+        if self._head != rowid:
+            self._unlink(rowid)
+            self._link_to_head(rowid)
+
+    def lock_free_row(self):
+        """FREE TO FREE_AND_LOCKED"""
+        free_code = ROW_STATE_CODES[FREE]
+        free_row_ids = self._free_row_ids
+        while len(free_row_ids) > 0:
+            rowid = free_row_ids.pop()
+            # a row locked not by this method leaves its id behind
+            if self._states[rowid] == free_code:
+                self._set_state(rowid, FREE_AND_LOCKED)
+                return rowid
+        return None
+
+    def lock_used_row(self, row_id):
+        self._set_state(row_id, USED_AND_LOCKED)
+
+    def unlock_used_row(self, row_id):
+        self._set_state(row_id, USED)
+
+    def unlock_free_row(self, rowid):
+        """FREE_AND_LOCKED -> FREE"""
+        self._set_state(rowid, FREE)
+
+    def lock_lpn(self, lpn):
+        self._set_state(self._lpn_to_rowid[lpn], USED_AND_LOCKED)
+
+    def unlock_lpn(self, lpn):
+        rowid = self._lpn_to_rowid[lpn]
+        assert self._state(rowid) == USED_AND_LOCKED
+        self._set_state(rowid, USED)
+
+    def hold_used_row(self, rowid):
+        self._set_state(rowid, USED_AND_HOLD)
+
+    def unhold_used_row(self, rowid):
+        self._set_state(rowid, USED)
+
+    def add_lpn(self, rowid, lpn, ppn, dirty, as_least_recent = False):
+        assert self.has_lpn(lpn) == False, "lpn is {}.".format(lpn)
+
+        self._set_data(rowid, lpn, ppn, dirty)
+        self._set_state(rowid, USED)
+
+        self._lpn_to_rowid[lpn] = rowid
+        if as_least_recent:
+            self._link_to_tail(rowid)
+        else:
+            self._link_to_head(rowid)
+
+    def lpn_to_ppn(self, lpn):
+        try:
+            rowid = self._lpn_to_rowid[lpn]
+        except KeyError:
+            return MISS
+        else:
+            self._move_to_head(rowid)
+            return self._ppn(rowid)
+
+    def mark_clean(self, lpn):
+        rowid = self._lpn_to_rowid[lpn]
+        assert self._state(rowid) in (USED, USED_AND_HOLD)
+        self._dirty[rowid] = False
+
+    def overwrite_lpn(self, lpn, ppn, dirty):
+        rowid = self._lpn_to_rowid[lpn]
+        self._move_to_head(rowid)
+        self._set_data(rowid, lpn, ppn, dirty)
+
+    def is_dirty(self, lpn):
+        return self._dirty[self._lpn_to_rowid[lpn]] == 1
+
+    def row_state(self, rowid):
+        return self._state(rowid)
+
+    def delete_lpn_and_lock(self, lpn):
+        assert self.has_lpn(lpn)
+        rowid = self._lpn_to_rowid.pop(lpn)
+        assert self._state(rowid) == USED
+        self._unlink(rowid)
+        self._lpns[rowid] = NO_NUMBER
+        self._ppns[rowid] = NO_NUMBER
+        self._dirty[rowid] = False
+        self._set_state(rowid, FREE_AND_LOCKED)
+
+        return rowid
+
+    def has_lpn(self, lpn):
+        return lpn in self._lpn_to_rowid
+
+    def least_to_most_lpn_items(self):
+        rowid = self._tail
+        while rowid != NO_NUMBER:
+            # the row may be deleted by the caller before the next one
+            prev = self._prev[rowid]
+            yield self._lpns[rowid], CompactRow(self, rowid)
+            rowid = prev
+
+
+class CompactLpnTableMvpn(CompactLpnTable, LpnTableMvpn):
+    """
+    LpnTableMvpn on CompactLpnTable
+    """
+    def __init__(self, conf):
+        CompactLpnTable.__init__(self, conf.n_cache_entries)
+        self.conf = conf
+
+    def _rows_of_m_vpn(self, m_vpn):
+        lpn_to_rowid = self._lpn_to_rowid
+        return [CompactRow(self, lpn_to_rowid[lpn])
+                for lpn in self.conf.m_vpn_to_lpns(m_vpn)
+                if lpn in lpn_to_rowid]
+
+
+class CompactRow(object):
+    """
+    A row of CompactLpnTable, with the interface of Row
+    """
+    __slots__ = ('_table', '_rowid')
+
+    def __init__(self, table, rowid):
+        self._table = table
+        self._rowid = rowid
+
+    @property
+    def lpn(self):
+        lpn = self._table._lpns[self._rowid]
+        if lpn == NO_NUMBER:
+            return None
+        return lpn
+
+    @property
+    def ppn(self):
+        return self._table._ppn(self._rowid)
+
+    @property
+    def dirty(self):
+        return self._table._dirty[self._rowid] == 1
+
+    @property
+    def state(self):
+        return self._table._state(self._rowid)
+
+    @state.setter
+    def state(self, state_value):
+        self._table._set_state(self._rowid, state_value)
+
+    @property
+    def rowid(self):
+        return self._rowid
+
+    def __repr__(self):
+        return "lpn:{}, ppn:{}, dirty:{}, rowid:{}".format(self.lpn,
+            self.ppn, self.dirty, self._rowid)
+
+
 class _Row(object):
     def __init__(self, lpn, ppn, dirty, state, rowid):
         self.lpn = lpn
@@ -1065,12 +1350,14 @@ class _Row(object):
 
 
 class Row(object):
-    def __init__(self, lpn, ppn, dirty, state, rowid):
+    def __init__(self, lpn, ppn, dirty, state, rowid, table=None):
         self._lpn = lpn
         self._ppn = ppn
         self._dirty = dirty
         self._state = state
         self._rowid = rowid
+        # LpnTable to tell about state changes
+        self._table = table
 
     def _assert_modification_allowed(self):
          assert self._state in (FREE_AND_LOCKED, USED, USED_AND_HOLD), \
@@ -1135,6 +1422,8 @@ class Row(object):
                     "current state {}".format(self._state)
         else:
             raise RuntimeError("{} is not a valid state".format(state_value))
+        if self._table is not None:
+            self._table._row_state_changed(self, self._state, state_value)
         self._state = state_value
 
     @property
@@ -1888,6 +2177,10 @@ class Config(config.ConfigNCQFTL):
             "mapping_cache_bytes": None, # cmt: cached mapping table
             "do_not_check_gc_setting": False,
             "write_gc_log": True,
+            # 'LpnTableMvpn' keeps a Row object per cached mapping.
+            # 'CompactLpnTableMvpn' keeps them in arrays, for caches of
+            # millions of entries.
+            "lpn_table_class": 'LpnTableMvpn',
             }
         self.update(local_itmes)
         self['segment_bytes'] = 1*TB
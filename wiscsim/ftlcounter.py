@@ -18,7 +18,7 @@ from utilities import utils
 from .blkpool import BlockPool
 from .bitmap import FlashBitmap2
 from commons import *
-from wiscsim import hostevent
+from wiscsim import hostevent, bintrace
 
 from pyreuse.sysutils import blocktrace, blockclassifiers, dumpe2fsparser
 from pyreuse.fsutils import ext4dumpextents
@@ -278,8 +278,8 @@ class Ftl(ftlbuilder.FtlBuilder):
         else:
             event_file_path = self.conf.get_ftlsim_events_output_path()
 
-        workload_line_iter = hostevent.FileLineIterator(event_file_path)
-        event_workload_iter = hostevent.EventIterator(self.conf, workload_line_iter)
+        event_workload_iter = bintrace.event_iterator(self.conf,
+                event_file_path)
 
         parser = EventNCQParser(event_workload_iter)
         table = parser.parse()
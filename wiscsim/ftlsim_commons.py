@@ -1,6 +1,8 @@
 import simpy
 import random
 
+from commons import OP_BARRIER
+
 class Extent(object):
     def __init__(self, lpn_start, lpn_count):
         assert lpn_count > 0
@@ -66,18 +68,76 @@ def create_ssd_request(conf, event):
             event.operation)
 
 
+class BarrierStore(simpy.Store):
+    """
+    A Store that hands out nothing after an OP_BARRIER event until it is
+    reopened
+    """
+    def __init__(self, env):
+        super(BarrierStore, self).__init__(env)
+        self.closed = False
+        # number of events taken
+        self.n_taken = 0
+
+    def _do_get(self, event):
+        if self.closed is True or len(self.items) == 0:
+            return False
+
+        item = self.items.pop(0)
+        self.n_taken += 1
+        if item.operation == OP_BARRIER:
+            self.closed = True
+        event.succeed(item)
+        # let the other waiting gets take items too
+        return not self.closed
+
+    def reopen(self):
+        self.closed = False
+        self._trigger_get(None)
+
+
 class NCQSingleQueue(object):
     """
     User of the queue can take up to depth # of request without
     returning
+
+    The user who takes an OP_BARRIER event should run barrier(). Events
+    after the barrier are not handed out until the events before it are
+    done, so no OP_NOOPs are needed around it. Users of the queue call
+    done() when they finish an event.
     """
     def __init__(self, ncq_depth, simpy_env):
         self.ncq_depth = ncq_depth
         self.env = simpy_env
-        self.queue = simpy.Store(self.env)
+        self.queue = BarrierStore(self.env)
         # ssd need to grab a slot before get item from queue
         self.slots = simpy.Resource(self.env, capacity=ncq_depth)
 
+        self.n_done = 0
+        self._drained = None
+
+    def n_in_flight(self):
+        """
+        Number of events taken from the queue and not done
+        """
+        return self.queue.n_taken - self.n_done
+
+    def done(self):
+        self.n_done += 1
+        if self._drained is not None and self.n_in_flight() == 1:
+            self._drained.succeed()
+            self._drained = None
+
+    def barrier(self):
+        """
+        Wait until all events taken before the barrier are done, then let
+        the events after it be taken
+        """
+        if self.n_in_flight() > 1:
+            self._drained = self.env.event()
+            yield self._drained
+        self.queue.reopen()
+
     def hold_all_slots(self):
         held_slot_reqs = []
         for i in range(self.ncq_depth):
@@ -0,0 +1,132 @@
+"""
+Functional mode: the FTL updates its mappings, OOB and block pools as
+usual, but takes no simulated time. It is used to fast-forward the mkfs and
+aging events that run with the recorder disabled, and ends when
+OP_ENABLE_RECORDER arrives (conf['functional_warmup']).
+
+A process of the FTL is run to its end right away, instead of being
+scheduled. The FTLs start processes and timeouts with env.process() and
+env.timeout(), so these are replaced on the environment for as long as the
+process runs (see FunctionalMode._functional_env()): the processes it starts
+run the same way and timeouts end at once. Flash operations of the
+controller do nothing, so no channel is taken. Other simpy events (locks, block pool containers, ...)
+are still used; they are always available when only one process runs at a
+time. If one is not, the rest of the process is left to simpy.
+"""
+import contextlib
+
+import simpy
+
+
+# methods of the flash controllers used by FTLs and Ssd
+CONTROLLER_METHODS = ['rw_ppns', 'rw_ppn_extent', 'erase_pbn_extent',
+        'execute_request_list', 'execute_request']
+
+
+def _no_flash_op(*args, **kwargs):
+    return
+    yield
+
+
+def _resume(generator, event):
+    """
+    The rest of generator, as a simpy process that first waits for event
+    """
+    while True:
+        try:
+            value = yield event
+        except BaseException as e:
+            event = generator.throw(e)
+        else:
+            event = generator.send(value)
+
+
+class _ProcessedEvent(simpy.events.Event):
+    """
+    An event that succeeded with value and is processed, i.e. a process
+    that yields it goes on at once. simpy can only make one by scheduling
+    it, so its state is set here the way simpy.events.Timeout sets it. This
+    is the only place that touches simpy internals.
+    """
+    def __init__(self, env, value):
+        self.env = env
+        self.callbacks = None
+        self._ok = True
+        self._value = value
+
+
+class FunctionalMode(object):
+    def __init__(self, env, flash_controller):
+        self.env = env
+        self.flash_controller = flash_controller
+        self.enabled = True
+        self._depth = 0
+        for name in CONTROLLER_METHODS:
+            setattr(flash_controller, name, _no_flash_op)
+
+    def stop(self):
+        """
+        Back to detailed timing
+        """
+        if self.enabled is True:
+            for name in CONTROLLER_METHODS:
+                delattr(self.flash_controller, name)
+            self.enabled = False
+
+    def process(self, generator):
+        """
+        Same as env.process(generator), but generator is run to its end
+        before returning. Returns a processed event with its return value.
+        """
+        if self._depth > 0:
+            return self._run(generator)
+
+        with self._functional_env():
+            return self._run(generator)
+
+    @contextlib.contextmanager
+    def _functional_env(self):
+        """
+        Replace env.process() and env.timeout() of the environment. Only
+        for the duration of one process() call: simpy switches processes in
+        env.step(), which is not called before process() returns, so no
+        other process sees them.
+        """
+        env = self.env
+        env.process = self._run
+        env.timeout = self._timeout
+        self._depth += 1
+        try:
+            yield
+        finally:
+            self._depth -= 1
+            del env.process
+            del env.timeout
+
+    def _timeout(self, delay, value=None):
+        return _ProcessedEvent(self.env, value)
+
+    def _run(self, generator):
+        value = None
+        exc = None
+        while True:
+            try:
+                if exc is None:
+                    event = generator.send(value)
+                else:
+                    event = generator.throw(exc)
+                    exc = None
+            except StopIteration as e:
+                return _ProcessedEvent(self.env,
+                        e.args[0] if len(e.args) else None)
+
+            if not event.triggered:
+                # e.g. a lock held by a process of the detailed mode
+                return simpy.events.Process(self.env,
+                        _resume(generator, event))
+
+            if event.ok:
+                value = event.value
+            else:
+                event.defused = True
+                exc = event.value
@@ -1,7 +1,12 @@
+import operator
+
 from ftlsim_commons import Extent
+from pyreuse.general import compressedfile
 from commons import *
 
 class HostEventBase(object):
+    __slots__ = ()
+
     def get_operation(self):
         raise NotImplementedError
 
@@ -29,6 +34,12 @@ class ControlEvent(HostEventBase):
 
 
 class Event(HostEventBase):
+    # no __dict__, so a window of events in memory stays small.
+    # token and token_req are set by the simulator's host process.
+    __slots__ = ('pid', 'operation', 'offset', 'size', 'sync', 'timestamp',
+            'pre_wait_time', 'action', 'sector', 'sector_count',
+            'token', 'token_req')
+
     def __init__(self, sector_size, pid, operation, offset, size,
             timestamp = None, pre_wait_time = None, sync = True, action = 'D'):
         self.pid = int(pid)
@@ -74,13 +85,109 @@ class Event(HostEventBase):
                         action = self.action)
 
 
+_new_object = object.__new__
+
+def new_event(sector_size, pid, operation, offset, size, timestamp,
+        pre_wait_time, sync, action):
+    """
+    Same as Event(...), but skips the keyword argument handling of
+    __init__. pid, offset and size must already be ints.
+    """
+    if action != 'D' and action != 'C':
+        raise RuntimeError("action:{}".format(action))
+    sector, rem_offset = divmod(offset, sector_size)
+    sector_count, rem_size = divmod(size, sector_size)
+    if rem_offset != 0 or rem_size != 0:
+        raise RuntimeError("offset {} or size {} is not aligned with sector "
+                "size {}.".format(offset, size, sector_size))
+
+    event = _new_object(Event)
+    event.pid = pid
+    event.operation = operation
+    event.offset = offset
+    event.size = size
+    event.sync = sync
+    event.timestamp = timestamp
+    event.pre_wait_time = pre_wait_time
+    event.action = action
+    event.sector = sector
+    event.sector_count = sector_count
+    return event
+
+
+def make_line_decoder(sector_size, event_file_column_names):
+    """
+    Return a function converting one event file line to an Event. The
+    column positions are looked up once here instead of building a dict
+    for every line.
+    """
+    translation = {'read': OP_READ, 'write': OP_WRITE, 'discard': OP_DISCARD}
+    n_columns = len(event_file_column_names)
+    names = ('pid', 'operation', 'offset', 'size', 'timestamp',
+            'pre_wait_time', 'sync', 'action')
+    defaults = {'timestamp': None, 'sync': True, 'action': 'D'}
+
+    for name in event_file_column_names:
+        if name not in names:
+            raise RuntimeError("Unknown event file column {}".format(name))
+    for name in names:
+        if name not in event_file_column_names and name not in defaults:
+            raise RuntimeError("Event file column {} is missing".format(name))
+
+    # columns that are not in the file are appended to the line's items
+    missing = [name for name in names if name not in event_file_column_names]
+    tail = [defaults[name] for name in missing]
+    positions = [event_file_column_names.index(name)
+            if name in event_file_column_names
+            else n_columns + missing.index(name)
+            for name in names]
+    getter = operator.itemgetter(*positions)
+
+    def decode(line):
+        items = line.split()
+        if len(items) != n_columns:
+            raise RuntimeError("Lengths not equal: {} {}".format(
+                event_file_column_names, items))
+        if tail:
+            items.extend(tail)
+        pid, operation, offset, size, timestamp, pre_wait_time, sync, \
+                action = getter(items)
+        if pre_wait_time != 'NA':
+            pre_wait_time = float(pre_wait_time)
+        return new_event(sector_size, int(pid), translation[operation],
+                int(offset), int(size), timestamp, pre_wait_time, sync,
+                action)
+
+    return decode
+
+
 class FileLineIterator(object):
-    def __init__(self, file_path):
+    """
+    start_offset is a byte offset of the beginning of a line, e.g. from
+    traceindex. Compressed files cannot be seeked. The bytes read are
+    counted in trace_readings (progress.TraceReadings) if it is given.
+    """
+    def __init__(self, file_path, start_offset=0, trace_readings=None):
         self.file_path = file_path
+        self.start_offset = start_offset
+        self.trace_readings = trace_readings
 
     def __iter__(self):
-        with open(self.file_path, 'r') as f:
+        with compressedfile.open_file(self.file_path, 'r') as f:
+            if self.start_offset != 0:
+                if compressedfile.is_compressed(self.file_path):
+                    raise RuntimeError("Cannot seek in compressed file {}"\
+                            .format(self.file_path))
+                f.seek(self.start_offset)
+            if self.trace_readings is None:
+                for line in f:
+                    yield line.strip()
+                return
+
+            reading = self.trace_readings.open(self.file_path,
+                    self.start_offset)
             for line in f:
+                reading.read_bytes += len(line)
                 line = line.strip()
                 yield line
 
@@ -97,11 +204,19 @@ class EventIterator(object):
 
         self._translation = {'read': OP_READ, 'write': OP_WRITE,
                 'discard':OP_DISCARD}
+        self._decode = make_line_decoder(self.sector_size,
+                self.event_file_column_names)
 
     def _convert(self, op_in_file):
         return self._translation[op_in_file]
 
     def str_to_event(self, line):
+        return self._decode(line)
+
+    def str_to_event_slow(self, line):
+        """
+        The original conversion, kept as a reference for the decoder
+        """
         items = line.split()
         if len(self.event_file_column_names) != len(items):
             raise RuntimeError("Lengths not equal: {} {}".format(
@@ -116,7 +231,8 @@ class EventIterator(object):
         return Event(**dic)
 
     def __iter__(self):
+        decode = self._decode
         for line in self.filelineiter:
-            yield self.str_to_event(line)
+            yield decode(line)
 
 
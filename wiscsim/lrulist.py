@@ -87,7 +87,8 @@ class LinkedList(object):
         self.add_before(node, old_head)
 
     def add_to_tail(self, node):
-        self.add_before(node, self._end_guard)
+        # node is the head too if the list is empty
+        self.add_before2(node, self._end_guard)
 
     def move_toward_head_by_one(self, node):
         "Boolean is returned to indicate status"
@@ -259,6 +260,15 @@ class LruCache(collections.MutableMapping):
         for node in reversed(self.linked_list):
             yield node.key, node.value
 
+    def __getstate__(self):
+        # pickle would recurse through the whole linked list
+        return {'items': list(self.least_to_most_items())}
+
+    def __setstate__(self, state):
+        self.__init__()
+        for key, value in state['items']:
+            self[key] = value
+
     def least_recently_used_key(self):
         return self.linked_list.tail().key
 
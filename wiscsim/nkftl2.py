@@ -1774,10 +1774,6 @@ class Ftl(ftlbuilder.FtlBuilder):
         self.written_bytes = 0
         self.discarded_bytes = 0
         self.read_bytes = 0
-        self.pre_written_bytes = 0
-        self.pre_discarded_bytes = 0
-        self.pre_read_bytes = 0
-        self.display_interval = 4 * MB
 
 
     def lpn_to_ppn(self, lpn):
@@ -1797,10 +1793,6 @@ class Ftl(ftlbuilder.FtlBuilder):
         req_size = extent.lpn_count * self.conf.page_size
         self.recorder.add_to_general_accumulater('traffic', 'read', req_size)
         self.read_bytes += req_size
-        if self.read_bytes > self.pre_read_bytes + self.display_interval:
-            print 'Read (MB)', self.pre_read_bytes / MB, 'reading', round(float(req_size) / MB, 2)
-            sys.stdout.flush()
-            self.pre_read_bytes = self.read_bytes
 
         extents = split_ext(self.conf.n_pages_per_block, extent)
         ext_data = []
@@ -1847,10 +1839,6 @@ class Ftl(ftlbuilder.FtlBuilder):
         req_size = extent.lpn_count * self.conf.page_size
         self.recorder.add_to_general_accumulater('traffic', 'write', req_size)
         self.written_bytes += req_size
-        if self.written_bytes > self.pre_written_bytes + self.display_interval:
-            print 'Written (MB)', self.pre_written_bytes / MB, 'writing', round(float(req_size) / MB, 2)
-            sys.stdout.flush()
-            self.pre_written_bytes = self.written_bytes
 
         extents = split_ext(self.conf.n_pages_per_data_group(), extent)
         data_group_procs = []
@@ -2057,10 +2045,6 @@ class Ftl(ftlbuilder.FtlBuilder):
         req_size = extent.lpn_count * self.conf.page_size
         self.recorder.add_to_general_accumulater('traffic', 'discard', req_size)
         self.discarded_bytes += req_size
-        if self.discarded_bytes > self.pre_discarded_bytes + self.display_interval:
-            print 'Discarded (MB)', self.pre_discarded_bytes / MB, 'discarding', round(float(req_size) / MB, 2)
-            sys.stdout.flush()
-            self.pre_discarded_bytes = self.discarded_bytes
 
         self.recorder.add_to_general_accumulater('traffic', 'discard',
                 extent.lpn_count*self.conf.page_size)
@@ -2089,6 +2073,13 @@ class Ftl(ftlbuilder.FtlBuilder):
     def clean(self, forced=False, merge=True):
         yield self.env.process(self.garbage_collector.clean(forced, merge=merge))
 
+    def register_ssd_handlers(self, ssd):
+        ssd.register_handler(OP_NON_MERGE_CLEAN, self._non_merge_clean)
+
+    def _non_merge_clean(self, host_event):
+        print 'start non merge cleaning'
+        return self.clean(forced=True, merge=False)
+
     def is_wear_leveling_needed(self):
         factor, diff = self.block_pool.get_wear_status()
         self.recorder.append_to_value_list('wear_diff', diff)
@@ -0,0 +1,168 @@
+"""
+Profile a simulation with cProfile and attribute the wall time to the
+subsystems of the simulator. Enabled by conf['profile_simulation'].
+
+    result_dir/simulation.prof         cProfile dump, for pstats/snakeviz
+    result_dir/profile-subsystems.txt  wall time of each subsystem
+
+The time of a function is its own time (tottime), so the time of the
+mapping cache spent in a GC is in 'mapping cache', not in 'gc'. The time of
+a built-in function (e.g. list.append) goes to the subsystems of its
+callers. Time in code outside of SUBSYSTEMS is in 'other'.
+"""
+import cProfile
+import collections
+import importlib
+import inspect
+import os
+import pstats
+
+from utilities import utils
+
+
+# subsystem: modules and module.Class it consists of
+SUBSYSTEMS = [
+    ('trace ingest', ['wiscsim.hostevent', 'wiscsim.bintrace',
+        'wiscsim.traceindex', 'wiscsim.tracecache', 'wiscsim.coalesce',
+        'wiscsim.host', 'workrunner.lbaworkloadgenerator',
+        'pyreuse.general.compressedfile']),
+    ('mapping cache', ['wiscsim.lrulist', 'wiscsim.dftldes.MappingCache',
+        'wiscsim.dftldes.FlashTransmitMixin', 'wiscsim.dftldes.InsertMixin',
+        'wiscsim.dftldes.LoadMixin', 'wiscsim.dftldes.FlushMixin',
+        'wiscsim.dftldes.MappingDict', 'wiscsim.dftldes.LpnTable',
+        'wiscsim.dftldes.CompactLpnTable',
+        'wiscsim.dftldes.CompactLpnTableMvpn', 'wiscsim.dftldes.CompactRow',
+        'wiscsim.dftldes.LpnTableMvpn', 'wiscsim.dftldes._Row',
+        'wiscsim.dftldes.Row', 'wiscsim.dftldes.CacheEntryData',
+        'wiscsim.dftldes.MappingOnFlash',
+        'wiscsim.dftldes.GlobalTranslationDirectory',
+        'wiscsim.nkftl2.DataBlockMappingTable',
+        'wiscsim.nkftl2.LogMappingTable', 'wiscsim.nkftl2.Translator',
+        'wiscsim.nkftl2.LogGroup2']),
+    ('gc', ['wiscsim.dftldes.Cleaner', 'wiscsim.dftldes.DataBlockCleaner',
+        'wiscsim.dftldes.TransBlockCleaner', 'wiscsim.dftldes.VictimBlocks',
+        'wiscsim.dftldes.WearLevelingVictimBlocks',
+        'wiscsim.nkftl2.GarbageCollector', 'wiscsim.nkftl2.GcDecider',
+        'wiscsim.nkftl2.VictimBlocksBase', 'wiscsim.nkftl2.VictimDataBlocks',
+        'wiscsim.nkftl2.VictimLogBlocks',
+        'wiscsim.nkftl2.WearLevelingVictimBlocks']),
+    ('block pool', ['wiscsim.blkpool', 'wiscsim.tagblockpool',
+        'wiscsim.devblockpool', 'wiscsim.nkftl2.NKBlockPool']),
+    ('controller/channels', ['wiscsim.controller', 'wiscsim.flash',
+        'wiscsim.addrtrans']),
+    ('recorder', ['wiscsim.recorder']),
+    ('simpy', ['simpy']),
+    ]
+
+
+def _source_path(path):
+    path = os.path.abspath(path)
+    if path.endswith('.pyc'):
+        path = path[:-1]
+    return path
+
+
+def _code_range(name):
+    """
+    (path, first line, last line) of module, package or module.Class name.
+    A package covers all files under its directory.
+    """
+    try:
+        module = importlib.import_module(name)
+    except ImportError:
+        module_name, class_name = name.rsplit('.', 1)
+        cls = getattr(importlib.import_module(module_name), class_name)
+        lines, first = inspect.getsourcelines(cls)
+        return (_source_path(inspect.getsourcefile(cls)), first,
+                first + len(lines) - 1)
+
+    path = _source_path(module.__file__)
+    if os.path.basename(path) == '__init__.py':
+        return (os.path.dirname(path) + os.sep, None, None)
+    return (path, None, None)
+
+
+class SubsystemMap(object):
+    def __init__(self, subsystems=SUBSYSTEMS):
+        self.names = [name for name, _ in subsystems]
+        self._ranges = []
+        for subsystem, parts in subsystems:
+            for part in parts:
+                self._ranges.append((subsystem, _code_range(part)))
+        # classes first, they are inside modules of other subsystems
+        self._ranges.sort(key=lambda item: item[1][1] is None)
+        self._cache = {}
+
+    def subsystem_of(self, path, line):
+        key = (path, line)
+        if key not in self._cache:
+            self._cache[key] = self._find(_source_path(path), line)
+        return self._cache[key]
+
+    def _find(self, path, line):
+        for subsystem, (part_path, first, last) in self._ranges:
+            if first is None:
+                if path == part_path or (part_path.endswith(os.sep) and
+                        path.startswith(part_path)):
+                    return subsystem
+            elif path == part_path and first <= line <= last:
+                return subsystem
+        return 'other'
+
+
+def subsystem_times(stats, subsystem_map=None):
+    """
+    Return {subsystem: seconds} of pstats.Stats stats
+    """
+    if subsystem_map is None:
+        subsystem_map = SubsystemMap()
+
+    def subsystem_of(func):
+        path, line, _ = func
+        if path == '~':
+            return 'other'
+        return subsystem_map.subsystem_of(path, line)
+
+    times = collections.Counter()
+    for func, (_, _, tottime, _, callers) in stats.stats.items():
+        if func[0] != '~':
+            times[subsystem_of(func)] += tottime
+            continue
+
+        # built-in: cProfile keeps the time of each caller
+        for caller, (_, _, caller_tottime, _) in callers.items():
+            times[subsystem_of(caller)] += caller_tottime
+    return times
+
+
+def write_summary(stats, path):
+    subsystem_map = SubsystemMap()
+    times = subsystem_times(stats, subsystem_map)
+    total = sum(times.values())
+
+    table = []
+    for name in subsystem_map.names + ['other']:
+        row = collections.OrderedDict()
+        row['subsystem'] = name
+        row['seconds'] = round(times[name], 3)
+        row['percent'] = round(100.0 * times[name] / total, 1) \
+                if total > 0 else 0
+        table.append(row)
+    utils.table_to_file(table, path, width=0)
+    return times
+
+
+def profile(func, result_dir):
+    """
+    Run func() under cProfile and write the dump and the summary to
+    result_dir
+    """
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(func)
+    finally:
+        utils.prepare_dir(result_dir)
+        profiler.dump_stats(os.path.join(result_dir, 'simulation.prof'))
+        stats = pstats.Stats(profiler)
+        write_summary(stats, os.path.join(result_dir,
+            'profile-subsystems.txt'))
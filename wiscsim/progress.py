@@ -0,0 +1,204 @@
+"""
+Progress of a simulation: events per second, simulated ns per wall-clock
+second, bytes consumed from the trace files and the ETA, written to
+<result_dir>/progress.log every conf['progress_interval_sec'] seconds. The
+figures of the whole run go to recorder.json as 'simulation_throughput'.
+
+The trace readers that feed the simulator (hostevent.FileLineIterator,
+bintrace.BinaryEventIterator) are given the TraceReadings of the workload
+(e.g. BlktraceEvents.trace_readings), which is also given to the simulator
+and its Progress. Other reads of the trace files, such as converting them
+for the trace cache or indexing them, are not counted. The host reads
+events ahead of the SSD (into the NCQ), so the ETA is the time to finish
+the events queued and the events in the unread bytes, at the average
+events/sec so far. It only covers the trace files opened so far, e.g. not
+the workload trace while mkfs events are replayed.
+"""
+import os
+import time
+
+from pyreuse.general import compressedfile
+from commons import *
+
+
+# wall-clock time is looked at every this many events
+CHECK_EVERY = 256
+
+
+class TraceReading(object):
+    """
+    Bytes of a trace file consumed so far. start_bytes were skipped, e.g.
+    to replay a window of the trace.
+    """
+    def __init__(self, path, start_bytes=0):
+        self.path = path
+        self.start_bytes = start_bytes
+        self.read_bytes = 0
+        if compressedfile.is_compressed(path):
+            # the decompressed size is not known
+            self.total_bytes = None
+        else:
+            self.total_bytes = os.path.getsize(path)
+
+    def remaining_bytes(self):
+        if self.total_bytes is None:
+            return None
+        return max(self.total_bytes - self.start_bytes - self.read_bytes, 0)
+
+
+class TraceReadings(object):
+    """
+    The TraceReadings of the trace files read for a simulation
+    """
+    def __init__(self):
+        self.readings = []
+
+    def open(self, path, start_bytes=0):
+        """
+        Called by trace readers when they open path
+        """
+        reading = TraceReading(path, start_bytes)
+        self.readings.append(reading)
+        return reading
+
+    def read_bytes(self):
+        return sum(r.read_bytes for r in self.readings)
+
+    def remaining_bytes(self):
+        """
+        None if it is not known for a file
+        """
+        remaining = [r.remaining_bytes() for r in self.readings]
+        if None in remaining:
+            return None
+        return sum(remaining)
+
+
+class Progress(object):
+    def __init__(self, conf, env=None, ncq=None, trace_readings=None):
+        """
+        env is None for simulators without simulated time. ncq is the
+        queue events wait in before being counted by event_done().
+        trace_readings is the TraceReadings of the simulated events, None:
+        no trace bytes and no ETA.
+        """
+        self.interval = conf.get('progress_interval_sec', None)
+        if conf['result_dir'] is None:
+            # nowhere to write the log
+            self.interval = None
+            self.log_path = None
+        else:
+            self.log_path = os.path.join(conf['result_dir'], 'progress.log')
+        self.env = env
+        self.ncq = ncq
+        if trace_readings is None:
+            trace_readings = TraceReadings()
+        self.trace_readings = trace_readings
+
+        self.n_events = 0
+        self.start_time = time.time()
+        self.start_sim_time = self._sim_time()
+        self._next_check = CHECK_EVERY
+        self._last = (self.start_time, 0, self.start_sim_time)
+        if self.interval is not None:
+            self._next_report = self.start_time + self.interval
+        self._log = None
+
+    def _n_queued(self):
+        if self.ncq is None:
+            return 0
+        return len(self.ncq.queue.items) + self.ncq.n_in_flight()
+
+    def _sim_time(self):
+        if self.env is None:
+            return None
+        return self.env.now
+
+    def event_done(self):
+        self.n_events += 1
+        if self.n_events >= self._next_check:
+            self._next_check += CHECK_EVERY
+            if self.interval is not None and \
+                    time.time() >= self._next_report:
+                self.report()
+
+    def figures(self, now=None):
+        if now is None:
+            now = time.time()
+        elapsed = max(now - self.start_time, 1e-9)
+
+        read_bytes = self.trace_readings.read_bytes()
+        remaining = self.trace_readings.remaining_bytes()
+        if read_bytes == 0 or self.n_events == 0 or remaining is None:
+            eta = 'NA'
+        else:
+            queued = self._n_queued()
+            events_per_byte = float(self.n_events + queued) / read_bytes
+            remaining_events = queued + remaining * events_per_byte
+            eta = remaining_events * elapsed / self.n_events
+
+        sim_time = self._sim_time()
+        if sim_time is None:
+            sim_duration = 'NA'
+            sim_ns_per_sec = 'NA'
+        else:
+            sim_duration = sim_time - self.start_sim_time
+            sim_ns_per_sec = sim_duration / elapsed
+
+        return {
+            'wall_time_sec': elapsed,
+            'events': self.n_events,
+            'events_per_sec': self.n_events / elapsed,
+            'sim_duration_ns': sim_duration,
+            'sim_ns_per_sec': sim_ns_per_sec,
+            'trace_bytes_read': read_bytes,
+            'trace_bytes_per_sec': read_bytes / elapsed,
+            'eta_sec': eta,
+            }
+
+    def report(self, final=False):
+        now = time.time()
+        figures = self.figures(now)
+
+        # rates of the last interval show slowdowns in a long run
+        last_time, last_events, last_sim_time = self._last
+        interval = max(now - last_time, 1e-9)
+        events_per_sec = (self.n_events - last_events) / interval
+        sim_time = self._sim_time()
+        if sim_time is None:
+            sim_rate = 'NA'
+        else:
+            sim_rate = '{:.4g}'.format((sim_time - last_sim_time) / interval)
+        self._last = (now, self.n_events, sim_time)
+
+        if figures['eta_sec'] == 'NA':
+            eta = 'NA'
+        else:
+            eta = '{:.0f}s'.format(figures['eta_sec'])
+
+        line = '{}elapsed {:.1f}s events {} ({:.1f}/s) sim ns/s {} ' \
+                'trace {:.1f}MB ({:.2f}MB/s) eta {}\n'.format(
+                'FINAL ' if final else '', figures['wall_time_sec'],
+                self.n_events, events_per_sec, sim_rate,
+                figures['trace_bytes_read'] / float(MB),
+                figures['trace_bytes_per_sec'] / float(MB), eta)
+
+        if self._log is None:
+            if not os.path.exists(os.path.dirname(self.log_path)):
+                os.makedirs(os.path.dirname(self.log_path))
+            self._log = open(self.log_path, 'w')
+        self._log.write(line)
+        self._log.flush()
+
+        self._next_report = now + self.interval
+
+    def finish(self, recorder):
+        """
+        Put the figures of the whole run in recorder
+        """
+        if self.interval is not None:
+            self.report(final=True)
+            self._log.close()
+            self._log = None
+        recorder.set_result_by_one_key('simulation_throughput',
+                self.figures())
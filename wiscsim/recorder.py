@@ -157,6 +157,20 @@ class Recorder(object):
     def add_to_timer(self, counter_set_name, item_name, addition):
         self.add_to_general_accumulater(counter_set_name, item_name, addition)
 
+    def get_state(self):
+        """
+        Counters and results, to be saved in checkpoints
+        """
+        return {'result_dict': self.result_dict,
+                'enabled': self.enabled,
+                'unique_num': self._unique_num}
+
+    def set_state(self, state):
+        self.result_dict = state['result_dict']
+        self.general_accumulator = self.result_dict['general_accumulator']
+        self.enabled = state['enabled']
+        self._unique_num = state['unique_num']
+
     def get_unique_num(self):
         num = self._unique_num
         self._unique_num += 1
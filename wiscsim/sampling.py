@@ -0,0 +1,244 @@
+"""
+Sampled simulation (SMARTS-style) of long traces. After OP_ENABLE_RECORDER,
+every conf['sampling_period'] data events are simulated as
+
+    sampling_warmup events   detailed, not measured (queues, channels)
+    sampling_window events   detailed and measured
+    the rest                 functional (wiscsim/functional.py)
+
+The FTL state is exact in all of them. Phases are switched by OP_BARRIER +
+OP_SAMPLING events put into the event stream by sampled_events(), so no
+request is in flight when the mode changes. The recorder is enabled only in
+measurement windows, so the counters in recorder.json are the sums of the
+windows.
+
+Each window gives one value of the metrics below; recorder.json 'sampling'
+has the values of each window and, for each metric, the mean of the
+windows and its confidence interval. A window cut by the end of the trace
+is dropped.
+
+    latency_ns, read_latency_ns, write_latency_ns  mean time from the start
+        to the end of a request in the SSD (there is no host queueing
+        time, as the host puts all requests to the NCQ at once)
+    write_amplification  flash page writes (user, translation and GC) per
+        page written by the host
+"""
+import collections
+import math
+
+from commons import *
+import hostevent
+
+
+# z of the normal distribution for a two-sided confidence level
+Z_SCORES = {0.90: 1.645, 0.95: 1.960, 0.99: 2.576}
+
+METRICS = ['latency_ns', 'read_latency_ns', 'write_latency_ns',
+        'write_amplification']
+
+DATA_OPERATIONS = (OP_READ, OP_WRITE, OP_DISCARD)
+
+# arg1 of OP_SAMPLING
+WARMUP, MEASURE, FUNCTIONAL = 'warmup', 'measure', 'functional'
+
+
+def check_config(conf):
+    period = conf['sampling_period']
+    window = conf['sampling_window']
+    warmup = conf['sampling_warmup']
+    if period is None or window <= 0 or warmup < 0 or \
+            period < window + warmup:
+        raise RuntimeError("sampling_period ({}) must be at least "
+            "sampling_window ({}) + sampling_warmup ({})".format(
+                period, window, warmup))
+    if conf['sampling_confidence'] not in Z_SCORES:
+        raise RuntimeError("sampling_confidence must be one of {}".format(
+            sorted(Z_SCORES.keys())))
+
+
+def _is_data_event(event):
+    # the ones Host gives to the SSD
+    return isinstance(event, hostevent.Event) and event.action == 'D' and \
+            event.offset >= 0 and event.operation in DATA_OPERATIONS
+
+
+def sampled_events(conf, event_iter):
+    """
+    event_iter with the phase changes of the sampling. A phase starts right
+    after the last event of the one before it.
+    """
+    period = conf['sampling_period']
+    window = conf['sampling_window']
+    warmup = conf['sampling_warmup']
+    # with no warm-up, a period starts with its window
+    phase_starts = {0: WARMUP, warmup: MEASURE, warmup + window: FUNCTIONAL}
+
+    sampling = False
+    n_events = 0
+    for event in event_iter:
+        yield event
+
+        if event.operation == OP_ENABLE_RECORDER and sampling is False:
+            sampling = True
+        elif sampling is True and _is_data_event(event):
+            n_events += 1
+        else:
+            continue
+
+        phase = phase_starts.get(n_events % period)
+        if phase is not None:
+            yield hostevent.ControlEvent(OP_BARRIER)
+            yield hostevent.ControlEvent(OP_SAMPLING, arg1=phase)
+
+
+def estimate(values, confidence):
+    """
+    Mean of values and its confidence interval. Values of 'NA' are left
+    out.
+    """
+    values = [v for v in values if v != 'NA']
+    n = len(values)
+    if n == 0:
+        return {'n': 0, 'mean': 'NA', 'stdev': 'NA', 'ci_low': 'NA',
+                'ci_high': 'NA'}
+
+    mean = sum(values) / float(n)
+    if n == 1:
+        return {'n': 1, 'mean': mean, 'stdev': 'NA', 'ci_low': 'NA',
+                'ci_high': 'NA'}
+
+    stdev = math.sqrt(sum((v - mean) ** 2 for v in values) / (n - 1))
+    half = Z_SCORES[confidence] * stdev / math.sqrt(n)
+    return {'n': n, 'mean': mean, 'stdev': stdev, 'ci_low': mean - half,
+            'ci_high': mean + half}
+
+
+def _mean(values):
+    if len(values) == 0:
+        return 'NA'
+    return sum(values) / float(len(values))
+
+
+class Sampler(object):
+    """
+    Switches ssd between the phases of the sampling and measures the
+    windows
+    """
+    def __init__(self, conf, ssd):
+        check_config(conf)
+        self.conf = conf
+        self.ssd = ssd
+        self.env = ssd.env
+        self.recorder = ssd.recorder
+
+        self.windows = []
+        self._window = None
+        self._started = False
+        self._data_handlers = dict(ssd._data_handlers)
+        ssd.register_handler(OP_SAMPLING, self._change_phase)
+        ssd.register_handler(OP_ENABLE_RECORDER, self._enable_recorder)
+        ssd.register_handler(OP_DISABLE_RECORDER, self._disable_recorder)
+
+    # the phases enable and disable the recorder once the sampling started
+    def _enable_recorder(self, host_event):
+        if self._started is False:
+            self._started = True
+            self.ssd._enable_recorder(host_event)
+
+    def _disable_recorder(self, host_event):
+        if self._started is False:
+            self.recorder.disable()
+
+    def _change_phase(self, host_event):
+        if self._window is not None:
+            self._end_window()
+
+        phase = host_event.arg1
+        if phase == FUNCTIONAL:
+            self.recorder.disable()
+            self.ssd.start_functional_mode()
+        elif phase == WARMUP:
+            self.recorder.disable()
+            self.ssd.end_functional_mode()
+        elif phase == MEASURE:
+            self.ssd.end_functional_mode()
+            self.recorder.enable()
+            self._start_window()
+        else:
+            raise RuntimeError("Unknown sampling phase {}".format(phase))
+
+    def _start_window(self):
+        self._window = {
+            'start_time': self.env.now,
+            'flash_writes': self.recorder.get_general_accumulater_cnt(
+                'flash_ops', OP_WRITE),
+            'write_bytes': self.recorder.get_general_accumulater_cnt(
+                'traffic', 'write'),
+            'latencies': {OP_READ: [], OP_WRITE: []},
+            }
+        # _process() holds the dict, so replace its items
+        for operation in (OP_READ, OP_WRITE):
+            self.ssd._data_handlers[operation] = self._timed(
+                    self._data_handlers[operation],
+                    self._window['latencies'][operation])
+
+    def _timed(self, handler, latencies):
+        env = self.env
+
+        def timed_handler(extent):
+            start = env.now
+            yield env.process(handler(extent))
+            latencies.append(env.now - start)
+        return timed_handler
+
+    def _end_window(self):
+        window = self._window
+        self._window = None
+        self.ssd._data_handlers.update(self._data_handlers)
+
+        latencies = window['latencies']
+        flash_writes = self.recorder.get_general_accumulater_cnt(
+                'flash_ops', OP_WRITE) - window['flash_writes']
+        write_bytes = self.recorder.get_general_accumulater_cnt(
+                'traffic', 'write') - window['write_bytes']
+        if write_bytes == 0:
+            write_amplification = 'NA'
+        else:
+            write_amplification = flash_writes * self.conf.page_size / \
+                    float(write_bytes)
+
+        values = collections.OrderedDict()
+        values['start_time'] = window['start_time']
+        values['duration_ns'] = self.env.now - window['start_time']
+        values['latency_ns'] = _mean(latencies[OP_READ] +
+                latencies[OP_WRITE])
+        values['read_latency_ns'] = _mean(latencies[OP_READ])
+        values['write_latency_ns'] = _mean(latencies[OP_WRITE])
+        values['write_amplification'] = write_amplification
+        self.windows.append(values)
+
+    def finish(self):
+        """
+        Put the windows and the estimates in the recorder. A window not
+        ended is dropped.
+        """
+        if self._window is not None:
+            self._window = None
+            self.ssd._data_handlers.update(self._data_handlers)
+
+        confidence = self.conf['sampling_confidence']
+        estimates = {}
+        for metric in METRICS:
+            estimates[metric] = estimate(
+                    [window[metric] for window in self.windows], confidence)
+
+        self.recorder.set_result_by_one_key('sampling', {
+            'period': self.conf['sampling_period'],
+            'window': self.conf['sampling_window'],
+            'warmup': self.conf['sampling_warmup'],
+            'confidence': confidence,
+            'n_windows': len(self.windows),
+            'estimates': estimates,
+            'windows': self.windows,
+            })
+        return estimates
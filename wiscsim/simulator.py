@@ -17,6 +17,10 @@ import recorder
 import hostevent
 import dftldes
 import ftlcounter
+import coalesce
+import checkpoint
+import progress
+import sampling
 
 from commons import *
 from ftlsim_commons import *
@@ -38,14 +42,23 @@ class Simulator(object):
     def get_sim_type(self):
         return
 
-    def __init__(self, conf, event_iter):
-        "conf is class Config"
+    # saves and restores checkpoints (wiscsim/checkpoint.py)
+    supports_checkpoints = False
+
+    def __init__(self, conf, event_iter, trace_readings=None):
+        """
+        conf is class Config. trace_readings is the progress.TraceReadings
+        of the trace files event_iter is read from.
+        """
         if not isinstance(conf, config.Config):
             raise TypeError("conf is not config.Config, it is {}".
                 format(type(conf).__name__))
+        if self.supports_checkpoints is False:
+            checkpoint.check_not_used(conf, type(self).__name__)
 
         self.conf = conf
-        self.event_iter = event_iter
+        self.event_iter = coalesce.coalesced(conf, event_iter)
+        self.trace_readings = trace_readings
 
         # initialize recorder
         self.recorder = recorder.Recorder(output_target = self.conf['output_target'],
@@ -59,13 +72,26 @@ class Simulator(object):
 
 
 class SimulatorDESNew(Simulator):
-    def __init__(self, conf, event_iter):
-        super(SimulatorDESNew, self).__init__(conf, event_iter)
+    supports_checkpoints = True
 
-        self.env = simpy.Environment()
-        self.host = Host(self.conf, self.env, event_iter)
+    def __init__(self, conf, event_iter, trace_readings=None):
+        super(SimulatorDESNew, self).__init__(conf, event_iter,
+                trace_readings)
+
+        restore_path = self.conf.get('checkpoint_restore_path', None)
+        if restore_path is None:
+            self.env = simpy.Environment()
+        else:
+            saved = checkpoint.load(restore_path)
+            self.env = simpy.Environment(initial_time=saved['now'])
+
+        self.host = Host(self.conf, self.env, self.event_iter)
         self.ssd = ssdframework.Ssd(self.conf, self.env,
-                self.host.get_ncq(), self.recorder)
+                self.host.get_ncq(), self.recorder,
+                trace_readings=self.trace_readings)
+
+        if restore_path is not None:
+            checkpoint.restore(self.ssd, saved)
 
     def run(self):
         self.env.process(self.host.run())
@@ -81,6 +107,9 @@ class SimulatorDESNew(Simulator):
     def record_post_run_stats(self):
         self.recorder.set_result_by_one_key(
                 'simulation_duration', self.env.now)
+        self.ssd.progress.finish(self.recorder)
+        if isinstance(self.event_iter, coalesce.RequestCoalescer):
+            self.event_iter.record_stats(self.recorder)
         pprint.pprint(self.recorder.get_result_summary())
 
         self.recorder.close()
@@ -95,9 +124,28 @@ class SimulatorDESNew(Simulator):
             gclog.classify_lpn_in_gclog()
 
 
-def create_simulator(simulator_class, conf, event_iter):
+class SimulatorDESSampled(SimulatorDESNew):
+    """
+    SimulatorDESNew that measures the workload in windows and runs the rest
+    in the functional mode (wiscsim/sampling.py)
+    """
+    def __init__(self, conf, event_iter, trace_readings=None):
+        sampling.check_config(conf)
+        super(SimulatorDESSampled, self).__init__(conf,
+                sampling.sampled_events(conf, event_iter), trace_readings)
+        self.sampler = sampling.Sampler(self.conf, self.ssd)
+
+    def get_sim_type(self):
+        return "SimulatorDESSampled"
+
+    def record_post_run_stats(self):
+        self.sampler.finish()
+        super(SimulatorDESSampled, self).record_post_run_stats()
+
+
+def create_simulator(simulator_class, conf, event_iter, trace_readings=None):
     cls = eval(simulator_class)
-    return cls(conf, event_iter)
+    return cls(conf, event_iter, trace_readings=trace_readings)
 
 
 def random_data(addr):
@@ -109,8 +157,9 @@ def random_data(addr):
 class SimulatorNonDES(Simulator):
     __metaclass__ = abc.ABCMeta
 
-    def __init__(self, conf, event_iter):
-        super(SimulatorNonDES, self).__init__(conf, event_iter)
+    def __init__(self, conf, event_iter, trace_readings=None):
+        super(SimulatorNonDES, self).__init__(conf, event_iter,
+                trace_readings)
 
         if self.conf['ftl_type'] == 'dftlext':
             ftl_class = dftlext.Dftl
@@ -129,15 +178,16 @@ class SimulatorNonDES(Simulator):
         """
         You must garantee that each item in event_iter is a class Event
         """
-        cnt = 0
+        run_progress = progress.Progress(self.conf,
+                trace_readings=self.trace_readings)
         for event in self.event_iter:
             self.process_event(event)
-            cnt += 1
-            if cnt % 5000 == 0:
-                print '|',
-                sys.stdout.flush()
+            run_progress.event_done()
 
         self.ftl.post_processing()
+        run_progress.finish(self.recorder)
+        if isinstance(self.event_iter, coalesce.RequestCoalescer):
+            self.event_iter.record_stats(self.recorder)
 
         self.recorder.close()
 
@@ -157,6 +207,9 @@ class SimulatorNonDES(Simulator):
             self.ftl.disable_recording()
         elif event.operation == OP_WORKLOADSTART:
             self.ftl.pre_workload()
+        elif event.operation == OP_CHECKPOINT:
+            raise RuntimeError("{} does not support checkpoints".format(
+                type(self).__name__))
         elif event.operation in ['finish', OP_BARRIER, OP_REC_TIMESTAMP, OP_CLEAN,
                 OP_NOOP]:
             # ignore this
@@ -201,8 +254,9 @@ class SimulatorNonDESe2e(SimulatorNonDES):
     This one does not do e2e test
     It uses extents
     """
-    def __init__(self, conf, event_iter):
-        super(SimulatorNonDESe2e, self).__init__(conf, event_iter)
+    def __init__(self, conf, event_iter, trace_readings=None):
+        super(SimulatorNonDESe2e, self).__init__(conf, event_iter,
+                trace_readings)
 
         self.lsn_to_data = {}
 
@@ -261,11 +315,11 @@ class SimulatorNonDESe2e(SimulatorNonDES):
 
 
 class SimulatorDESSync(Simulator):
-    def __init__(self, conf, event_iters):
+    def __init__(self, conf, event_iters, trace_readings=None):
         """
         event_iters is list of event iterators
         """
-        super(SimulatorDESSync, self).__init__(conf, None)
+        super(SimulatorDESSync, self).__init__(conf, None, trace_readings)
 
         if not isinstance(event_iters, list):
             raise RuntimeError("event_iters must be a list of iterators.")
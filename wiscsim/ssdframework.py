@@ -16,16 +16,20 @@ import config
 from commons import *
 from ftlsim_commons import *
 import flash
+import checkpoint
 import controller
 import ftlbuilder
+import functional
 import hostevent
 import lrulist
+import progress
 import recorder
 from utilities import utils
 import dftldes
 import nkftl2
 
 from pyreuse.sysutils import blocktrace, blockclassifiers, dumpe2fsparser
+from pyreuse.sysutils import tracestats
 
 class SsdBase(object):
     def _process(self, pid):
@@ -36,19 +40,31 @@ class SsdBase(object):
 
 
 class Ssd(SsdBase):
-    def __init__(self, conf, simpy_env, ncq, rec_obj):
+    def __init__(self, conf, simpy_env, ncq, rec_obj, trace_readings=None):
         self.conf = conf
         self.env = simpy_env
         self.recorder = rec_obj
         self.ncq = ncq # should be initialized in Simulator
         self.n_processes = self.ncq.ncq_depth
 
-        self.flash_controller = controller.Controller3(
+        self.flash_controller = controller.create_controller(
                 self.env, self.conf, self.recorder)
 
         print 'initializing ssd...........', self.conf['ftl_type']
 
-        self.ftl = self._create_ftl()
+        self._page_size = self.conf.page_size
+        self.progress = progress.Progress(self.conf, self.env, self.ncq,
+                trace_readings)
+        self._control_handlers = {}
+        self._register_default_handlers()
+        self.set_ftl(self._create_ftl())
+
+        # processes of the ftl are started by self._start(), which runs
+        # them in the functional mode until the recorder is enabled
+        self.functional = None
+        self._start = self.env.process
+        if self.conf['functional_warmup'] is True:
+            self.start_functional_mode()
 
         self._snapshot_valid_ratios = self.conf['snapshot_valid_ratios']
         self._snapshot_erasure_count_dist = self.conf['snapshot_erasure_count_dist']
@@ -61,6 +77,16 @@ class Ssd(SsdBase):
         self.gc_sleep_timer = 0
         self.gc_sleep_duration = 10
 
+    def set_ftl(self, ftl):
+        self.ftl = ftl
+        self._data_handlers = {
+                OP_READ: self.ftl.read_ext,
+                OP_WRITE: self.ftl.write_ext,
+                OP_DISCARD: self.ftl.discard_ext,
+                }
+        if hasattr(self.ftl, 'register_ssd_handlers'):
+            self.ftl.register_ssd_handlers(self)
+
     def _create_ftl(self):
         if self.conf['ftl_type'] == 'dftldes':
             return dftldes.Ftl(self.conf, self.recorder, self.flash_controller,
@@ -71,175 +97,164 @@ class Ssd(SsdBase):
             return nkftl2.Ftl(self.conf, self.recorder, simpleflash, self.env,
                     self.flash_controller)
 
-    def _barrier(self):
+    def register_handler(self, operation, handler):
         """
-        Grab and hold the rest of the ncq slots (already holding one)
+        Handle control events of operation by handler(host_event). handler
+        returns None or a generator, which is run as a process before the
+        next event. FTLs register their own operations in
+        register_ssd_handlers(ssd).
         """
-        reqs = []
-        for i in range(self.ncq.ncq_depth - 1):
-            slot_req = self.ncq.slots.request()
-            reqs.append(slot_req)
-        yield simpy.AllOf(self.env, reqs)
+        self._control_handlers[operation] = handler
+
+    def _register_default_handlers(self):
+        handlers = {
+            OP_ENABLE_RECORDER: self._enable_recorder,
+            OP_DISABLE_RECORDER: lambda event: self.recorder.disable(),
+            OP_WORKLOADSTART: self._ignore,
+            OP_NOOP: self._ignore,
+            OP_FALLOCATE: self._ignore,
+            OP_SHUT_SSD: self._shut_ssd,
+            OP_BARRIER: lambda event: self.ncq.barrier(),
+            OP_CALC_GC_DURATION: self._calc_gc_duration,
+            OP_CALC_NON_MERGE_GC_DURATION: self._calc_non_merge_gc_duration,
+            OP_REC_TIMESTAMP: self._rec_timestamp,
+            OP_REC_FLASH_OP_CNT: self._rec_accumulator_copy('flash_ops'),
+            OP_REC_FOREGROUND_OP_CNT: self._rec_accumulator_copy('traffic'),
+            OP_REC_CACHE_HITMISS: self._rec_accumulator_copy('Mapping_Cache'),
+            OP_CLEAN: self._clean,
+            OP_REC_BW: self._rec_bw,
+            OP_CHECKPOINT: lambda event: checkpoint.save(event.arg1, self),
+            # ftl specific, ignored unless the ftl registers them
+            OP_FLUSH_TRANS_CACHE: self._ignore,
+            OP_PURGE_TRANS_CACHE: self._ignore,
+            OP_DROP_TRANS_CACHE: self._ignore,
+            OP_NON_MERGE_CLEAN: self._ignore,
+            # used by SimulatorDESSampled
+            OP_SAMPLING: self._ignore,
+            }
+        for operation, handler in handlers.items():
+            self.register_handler(operation, handler)
+
+    def _ignore(self, host_event):
+        pass
+
+    def _enable_recorder(self, host_event):
+        self.recorder.enable()
+        self.end_functional_mode()
+
+    def start_functional_mode(self):
+        if self.functional is None:
+            self.functional = functional.FunctionalMode(self.env,
+                    self.flash_controller)
+            self._start = self.functional.process
+
+    def end_functional_mode(self):
+        if self.functional is not None:
+            self.functional.stop()
+            self.functional = None
+            self._start = self.env.process
+
+    def _shut_ssd(self, host_event):
+        print 'got shut_ssd'
+        sys.stdout.flush()
+        return self._end_all_processes()
+
+    def _calc_gc_duration(self, host_event):
+        dur = self.recorder.get_result_by_one_key('gc_end') - \
+                self.recorder.get_result_by_one_key('gc_start')
+        self.recorder.set_result_by_one_key('gc_duration', dur)
+        self.recorder.set_result_by_one_key('gc_duration_sec', dur/SEC)
+
+    def _calc_non_merge_gc_duration(self, host_event):
+        dur = self.recorder.get_result_by_one_key('non_merge_gc_end') - \
+                self.recorder.get_result_by_one_key('non_merge_gc_start')
+        self.recorder.set_result_by_one_key('non_merge_gc_duration', dur)
+        self.recorder.set_result_by_one_key('non_merge_gc_duration_sec', dur/SEC)
+
+    def _rec_timestamp(self, host_event):
+        self.recorder.set_result_by_one_key(host_event.arg1, self.env.now)
+
+    def _rec_accumulator_copy(self, counter_name):
+        def handler(host_event):
+            result_dict = self.recorder.get_result_summary()
+            data = copy.deepcopy(
+                result_dict['general_accumulator'].get(counter_name, {}))
+            self.recorder.set_result_by_one_key(host_event.arg1, data)
+        return handler
+
+    def _clean(self, host_event):
+        print 'start cleaning'
+        return self._cleaner_process(forced=True)
+
+    def _rec_bw(self, host_event):
+        dur = self.recorder.get_result_by_one_key('interest_workload_end') - \
+                self.recorder.get_result_by_one_key('interest_workload_start')
+        self.recorder.set_result_by_one_key('workload_duration_nsec', dur)
+        self.recorder.set_result_by_one_key('workload_duration_sec', float(dur)/SEC)
+
+        write_traffic = self.recorder.get_general_accumulater_cnt(
+                'traffic', 'write') / MB
+
+        self.recorder.set_result_by_one_key('workload_duration_nsec', dur)
+
+        if dur == 0:
+            write_bw = "NA"
+        else:
+            write_bw = float(write_traffic)/(float(dur) / SEC)
+
+        self.recorder.set_result_by_one_key('write_bandwidth', write_bw)
+        print '>>>>>>>>>> Bandwidth (MB/s) <<<<<<<<<<<', write_bw
+        print '>>>>>>>>>> Traffic (MB)     <<<<<<<<<<<', write_traffic
+        print '>>>>>>>>>> Duration (sec)   <<<<<<<<<<<', float(dur) / SEC
 
-        for req in reqs:
-            self.ncq.slots.release(req)
+    def lpn_extent(self, host_event):
+        """
+        Same as host_event.get_lpn_extent(conf), with the page size looked
+        up once instead of for every request
+        """
+        page_size = self._page_size
+        return Extent(host_event.offset / page_size,
+                (host_event.size + page_size - 1) / page_size)
 
     def _process(self, pid):
-        for req_i in itertools.count():
+        data_handlers = self._data_handlers
+        control_handlers = self._control_handlers
+        run_progress = self.progress
+
+        while True:
             host_event = yield self.ncq.queue.get()
 
             slot_req = self.ncq.slots.request()
             yield slot_req
 
-            # handle host_event case by case
-            operation = host_event.get_operation()
-
-            if operation == OP_ENABLE_RECORDER:
-                self.recorder.enable()
-
-            elif operation == OP_DISABLE_RECORDER:
-                self.recorder.disable()
-
-            elif operation == OP_WORKLOADSTART:
-                pass
-
-            elif operation == OP_SHUT_SSD:
-                print 'got shut_ssd'
-                sys.stdout.flush()
-                yield self.env.process(self._end_all_processes())
-
-            elif operation == OP_BARRIER:
-                # The correct way of doing barrier is to use
-                # OP_BARRIER with more than n_ncq_slots OP_NOOP.
-                # the OP_NOOPs are to make sure no other operations
-                # can be scheduled before OP_BARRIER.
-                # for example, EventA, OP_BARRIER, EventB cannot garantee
-                # that B executed before A because all A, Barrier and B can
-                # get the slots at the same time. Schedule is free to run
-                # them in any order. EventA, OP_NOOP x 9999, EventB cannot
-                # garantee either because OP_NOOP takes no time and Event B
-                # can run at the same time as A..
-                # So the correct way is
-                # EventA, OP_NOOPsx9999, OP_BARRIER, OP_NOOPSX9999, EventB
-                # OP_BARRIER will wait util EventA finishes. The first OP_NOOP
-                # x9999 makes sure eventA get a slot before barrier
-
-                yield self.env.process(self._barrier())
-
-            elif operation == OP_NOOP:
-                pass
-
-            elif operation == OP_CALC_GC_DURATION:
-                dur = self.recorder.get_result_by_one_key('gc_end') - \
-                        self.recorder.get_result_by_one_key('gc_start')
-                self.recorder.set_result_by_one_key('gc_duration', dur)
-                self.recorder.set_result_by_one_key('gc_duration_sec', dur/SEC)
-
-            elif operation == OP_CALC_NON_MERGE_GC_DURATION:
-                dur = self.recorder.get_result_by_one_key('non_merge_gc_end') - \
-                        self.recorder.get_result_by_one_key('non_merge_gc_start')
-                self.recorder.set_result_by_one_key('non_merge_gc_duration', dur)
-                self.recorder.set_result_by_one_key('non_merge_gc_duration_sec', dur/SEC)
-
-            elif operation == OP_FLUSH_TRANS_CACHE:
-                if self.conf['ftl_type'] == 'dftldes':
-                    yield self.env.process(self.ftl.flush_trans_cache())
-
-            elif operation == OP_PURGE_TRANS_CACHE:
-                if self.conf['ftl_type'] == 'dftldes':
-                    yield self.env.process(self.ftl.purge_trans_cache())
-
-            elif operation == OP_DROP_TRANS_CACHE:
-                if self.conf['ftl_type'] == 'dftldes':
-                    self.ftl.drop_trans_cache()
-
-            elif operation == OP_REC_TIMESTAMP:
-                self.recorder.set_result_by_one_key(host_event.arg1,
-                        self.env.now)
+            operation = host_event.operation
+            data_handler = data_handlers.get(operation)
 
-            elif operation == OP_REC_FLASH_OP_CNT:
-                result_dict = self.recorder.get_result_summary()
-                flashops = copy.deepcopy(
-                    result_dict['general_accumulator'].get('flash_ops', {}))
-                self.recorder.set_result_by_one_key(host_event.arg1,
-                        flashops)
-
-            elif operation == OP_REC_FOREGROUND_OP_CNT:
-                result_dict = self.recorder.get_result_summary()
-                traffic = copy.deepcopy(
-                    result_dict['general_accumulator'].get('traffic', {}))
-                self.recorder.set_result_by_one_key(host_event.arg1,
-                        traffic)
-
-            elif operation == OP_REC_CACHE_HITMISS:
-                result_dict = self.recorder.get_result_summary()
-                data = copy.deepcopy(
-                    result_dict['general_accumulator'].get('Mapping_Cache', {}))
-                self.recorder.set_result_by_one_key(host_event.arg1,
-                        data)
+            if data_handler is not None:
+                # fast path for reads, writes and discards
+                yield self._start(data_handler(self.lpn_extent(host_event)))
 
             elif operation == OP_END_SSD_PROCESS:
                 self.ncq.slots.release(slot_req)
+                self.ncq.done()
                 break
 
-            elif operation == OP_CLEAN:
-                print 'start cleaning'
-                yield self.env.process(self._cleaner_process(forced=True))
-
-            elif operation == OP_REC_BW:
-                dur = self.recorder.get_result_by_one_key('interest_workload_end') - \
-                        self.recorder.get_result_by_one_key('interest_workload_start')
-                self.recorder.set_result_by_one_key('workload_duration_nsec', dur)
-                self.recorder.set_result_by_one_key('workload_duration_sec', float(dur)/SEC)
-
-                write_traffic = self.recorder.get_general_accumulater_cnt(
-                        'traffic', 'write') / MB
-
-                self.recorder.set_result_by_one_key('workload_duration_nsec', dur)
-
-                if dur == 0:
-                    write_bw = "NA"
-                else:
-                    write_bw = float(write_traffic)/(float(dur) / SEC)
-
-                self.recorder.set_result_by_one_key('write_bandwidth', write_bw)
-                print '>>>>>>>>>> Bandwidth (MB/s) <<<<<<<<<<<', write_bw
-                print '>>>>>>>>>> Traffic (MB)     <<<<<<<<<<<', write_traffic
-                print '>>>>>>>>>> Duration (sec)   <<<<<<<<<<<', float(dur) / SEC
-
-            elif operation == OP_NON_MERGE_CLEAN:
-                print 'start non merge cleaning'
-                if self.conf['ftl_type'] == 'nkftl2':
-                    yield self.env.process(self.ftl.clean(forced=True, merge=False))
-
-            elif operation == OP_READ:
-                yield self.env.process(
-                    self.ftl.read_ext(host_event.get_lpn_extent(self.conf)))
-
-            elif  operation == OP_WRITE:
-                yield self.env.process(
-                    self.ftl.write_ext(host_event.get_lpn_extent(self.conf)))
-
-            elif  operation == OP_DISCARD:
-                yield self.env.process(
-                    self.ftl.discard_ext(host_event.get_lpn_extent(self.conf)))
-
-            elif operation in [OP_FALLOCATE]:
-                pass
-
             else:
-                raise NotImplementedError("Operation {} not supported."\
-                        .format(host_event.operation))
+                handler = control_handlers.get(operation)
+                if handler is None:
+                    raise NotImplementedError("Operation {} not supported."\
+                            .format(operation))
+                proc = handler(host_event)
+                if proc is not None:
+                    yield self._start(proc)
 
-            if req_i % 1000 == 0:
-                print '.',
-                sys.stdout.flush()
+            run_progress.event_done()
 
             if self.gc_sleep_timer > 0:
                 self.gc_sleep_timer -= 1
 
             if self.gc_sleep_timer == 0 and self.ftl.is_cleaning_needed() is True:
-                yield self.env.process(self._cleaner_process())
+                yield self._start(self._cleaner_process())
                 # if we just did gc, we disable the next X gc checks
                 # so don't try gc for every request.
                 # This also gives it time to generate garbage with low
@@ -247,6 +262,7 @@ class Ssd(SsdBase):
                 self.gc_sleep_timer = self.gc_sleep_duration
 
             self.ncq.slots.release(slot_req)
+            self.ncq.done()
 
     def _end_all_processes(self):
         for i in range(self.n_processes):
@@ -262,10 +278,22 @@ class Ssd(SsdBase):
         if forced is True or self.ftl.is_cleaning_needed():
             yield self.env.process(self.ftl.clean(forced))
 
+    def _until_next_period(self, interval):
+        """
+        Time until the next multiple of interval. Periodic processes of a
+        simulation restored from a checkpoint wait for it, so they run at
+        the same times as in the simulation that saved the checkpoint.
+        """
+        return interval - self.env.now % interval
+
     def _wear_leveling_process(self):
         print 'wear leveling process start'
+        if self._do_wear_leveling is True:
+            wait = self._until_next_period(
+                    self._wear_leveling_check_interval)
         while self._do_wear_leveling is True:
-            yield self.env.timeout(self._wear_leveling_check_interval)
+            yield self.env.timeout(wait)
+            wait = self._wear_leveling_check_interval
             if self.ftl.is_wear_leveling_needed() is True:
                 print 'start wear leveling...'
                 yield self.env.process(self.ftl.level_wear())
@@ -275,16 +303,27 @@ class Ssd(SsdBase):
 
 
     def _valid_ratio_snapshot_process(self):
+        if self._snapshot_valid_ratios is True and \
+                self.env.now % self._snapshot_interval != 0:
+            yield self.env.timeout(
+                    self._until_next_period(self._snapshot_interval))
         while self._snapshot_valid_ratios is True:
             self.ftl.snapshot_valid_ratios()
             yield self.env.timeout(self._snapshot_interval)
 
     def _user_traffic_size_snapshot_process(self):
+        if self._snapshot_user_traffic is True and \
+                self.env.now % (0.1*SEC) != 0:
+            yield self.env.timeout(self._until_next_period(0.1*SEC))
         while self._snapshot_user_traffic is True:
             self.ftl.snapshot_user_traffic()
             yield self.env.timeout(0.1*SEC)
 
     def _erasure_count_dist_snapshot_process(self):
+        if self._snapshot_erasure_count_dist is True and \
+                self.env.now % self._snapshot_interval != 0:
+            yield self.env.timeout(
+                    self._until_next_period(self._snapshot_interval))
         while self._snapshot_erasure_count_dist is True:
             self.ftl.snapshot_erasure_count_dist()
             yield self.env.timeout(self._snapshot_interval)
@@ -368,7 +407,7 @@ class SSDFramework(object):
                 ncq_depth = self.conf['SSDFramework']['ncq_depth'],
                 simpy_env = self.env)
 
-        self.flash_controller = controller.Controller3(
+        self.flash_controller = controller.create_controller(
                 self.env, self.conf, self.recorder)
 
         if self.conf['ftl_type'] == 'dftldes':
@@ -398,6 +437,7 @@ class SSDFramework(object):
 
     def release_token(self, event):
         event.token.release(event.token_req)
+        self.ncq.done()
 
     def process(self, pid):
         for req_index in itertools.count():
@@ -412,6 +452,10 @@ class SSDFramework(object):
                 self.recorder.set_result_by_one_key('workload_start_time',
                         self.env.now)
 
+                self.release_token(host_event)
+                continue
+            elif host_event.operation == OP_BARRIER:
+                yield self.env.process(self.ncq.barrier())
                 self.release_token(host_event)
                 continue
             elif not host_event.operation in (OP_READ, OP_WRITE, OP_DISCARD):
@@ -460,25 +504,21 @@ class SSDFramework(object):
         self.print_statistics()
 
     def record_blkparse_bw(self):
-        raw_blkparse_file_path = os.path.join(
-                self.conf['result_dir'], 'blkparse-output.txt')
-
-        if not os.path.exists(raw_blkparse_file_path):
+        # statistics written together with the event file, see tracestats
+        summary = tracestats.load_stats(
+                self.conf.get_ftlsim_events_output_path())
+        if summary is None or summary['duration'] == 0:
             return
 
-        blkresult = blocktrace.BlktraceResult(
-                self.conf['sector_size'],
-                self.conf['event_file_column_names'],
-                raw_blkparse_file_path, None)
         self.recorder.set_result_by_one_key(
                 'blkparse_read_bw',
-                blkresult.get_bandwidth_mb('read'))
+                tracestats.bandwidth_mb(summary, 'read'))
         self.recorder.set_result_by_one_key(
                 'blkparse_write_bw',
-                blkresult.get_bandwidth_mb('write'))
+                tracestats.bandwidth_mb(summary, 'write'))
         self.recorder.set_result_by_one_key(
                 'blkparse_duration',
-                blkresult.get_duration())
+                summary['duration'])
 
     def print_statistics(self):
         print '++++++++++++++++++++ statistics ++++++++++++++++++'
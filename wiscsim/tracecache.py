@@ -0,0 +1,177 @@
+import hashlib
+import json
+import os
+import tempfile
+
+from commons import *
+from utilities import utils
+import bintrace
+import traceindex
+
+
+CACHE_SUFFIX = '.bin'
+HASH_INDEX_NAME = 'hash-index.json'
+
+
+def file_digest(path, chunk_bytes=4*MB):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        while True:
+            data = f.read(chunk_bytes)
+            if data == '':
+                break
+            h.update(data)
+    return h.hexdigest()
+
+
+class TraceCache(object):
+    """
+    Decoded event files, stored in the binary trace format (see bintrace)
+    and shared by all the simulations that use the same trace.
+
+    An entry is keyed by the content of the event file plus everything that
+    affects decoding: sector_size, dev_padding and event_file_column_names.
+    Entries are evicted in LRU order (by file mtime, which is bumped on every
+    hit) when the cache is larger than max_bytes.
+
+    The cache directory can be shared by concurrent processes: entries are
+    written to temporary files and renamed into place.
+    """
+    def __init__(self, cache_dir, max_bytes=10*GB):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        utils.prepare_dir(cache_dir)
+
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, conf, path):
+        schema = {
+            'digest': self._digest(path),
+            'sector_size': conf['sector_size'],
+            'dev_padding': conf['dev_padding'],
+            'event_file_column_names': list(conf['event_file_column_names']),
+            'bintrace_version': bintrace.VERSION,
+            }
+        return hashlib.sha1(json.dumps(schema, sort_keys=True)).hexdigest()
+
+    def entry_path(self, key):
+        return os.path.join(self.cache_dir, key + CACHE_SUFFIX)
+
+    def get_path(self, conf, path):
+        """
+        Return the path of the cache entry of event file path, creating the
+        entry if needed.
+        """
+        entry_path = self.entry_path(self.key(conf, path))
+        if os.path.exists(entry_path):
+            self.hits += 1
+            # mark as recently used
+            os.utime(entry_path, None)
+            return entry_path
+
+        self.misses += 1
+        fd, tmp_path = tempfile.mkstemp(prefix='tmp-', suffix='.part',
+                dir=self.cache_dir)
+        os.close(fd)
+        try:
+            bintrace.convert_text_to_binary(path, tmp_path,
+                    conf['event_file_column_names'])
+            os.rename(tmp_path, entry_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        self.evict(keep=entry_path)
+        return entry_path
+
+    def event_iterator(self, conf, path, trace_readings=None):
+        return bintrace.BinaryEventIterator(conf, self.get_path(conf, path),
+                trace_readings=trace_readings)
+
+    def entries(self):
+        """
+        Return [(mtime, size, path), ...] of all entries, oldest first
+        """
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(CACHE_SUFFIX):
+                continue
+            entry_path = os.path.join(self.cache_dir, name)
+            try:
+                st = os.stat(entry_path)
+            except OSError:
+                # removed by another process
+                continue
+            entries.append((st.st_mtime, st.st_size, entry_path))
+        entries.sort()
+        return entries
+
+    def total_bytes(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self, keep=None):
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry_path in entries:
+            if total <= self.max_bytes:
+                break
+            if entry_path == keep:
+                continue
+            # the seek index of an entry goes with it
+            for victim in (entry_path, traceindex.index_path_of(entry_path)):
+                try:
+                    os.remove(victim)
+                except OSError:
+                    pass
+            total -= size
+
+    def _digest(self, path):
+        """
+        Hashing a large trace takes a while, so digests are remembered by
+        (path, size, mtime).
+        """
+        st = os.stat(path)
+        stamp = '{}:{}:{}'.format(os.path.abspath(path), st.st_size,
+                st.st_mtime)
+
+        index_path = os.path.join(self.cache_dir, HASH_INDEX_NAME)
+        index = {}
+        if os.path.exists(index_path):
+            try:
+                with open(index_path, 'r') as f:
+                    index = json.load(f)
+            except ValueError:
+                index = {}
+
+        digest = index.get(stamp, None)
+        if digest is None:
+            digest = file_digest(path)
+            index[stamp] = digest
+            fd, tmp_path = tempfile.mkstemp(prefix='tmp-',
+                    dir=self.cache_dir)
+            with os.fdopen(fd, 'w') as f:
+                json.dump(index, f)
+            os.rename(tmp_path, index_path)
+
+        return str(digest)
+
+
+def resolve_event_file(conf, path):
+    """
+    Same as bintrace.resolve_event_file(), but goes through the trace cache
+    if conf['trace_cache_dir'] is set.
+    """
+    cache_dir = conf.get('trace_cache_dir', None)
+    if cache_dir is None or bintrace.is_binary_trace(path):
+        return bintrace.resolve_event_file(path)
+
+    cache = TraceCache(cache_dir,
+            max_bytes=conf.get('trace_cache_max_bytes', 10*GB))
+    return cache.get_path(conf, path)
+
+
+def event_iterator(conf, path, trace_readings=None):
+    return bintrace.event_iterator(conf, resolve_event_file(conf, path),
+            trace_readings=trace_readings)
+
@@ -0,0 +1,298 @@
+"""
+Sidecar index of an event file, for replaying a window of a long trace
+without reading its prefix.
+
+Every `interval` events, the index records
+    (event number, position, timestamp, read bytes, write bytes, discard bytes)
+where position is the byte offset of the line in a text event file, or the
+event number in a binary trace (see bintrace), and the byte counts are the
+cumulative sizes of the 'D' events *before* that event.
+"""
+import bisect
+import hashlib
+import json
+import os
+import tempfile
+
+from commons import *
+import bintrace
+import hostevent
+from pyreuse.general import compressedfile
+
+
+INDEX_VERSION = 1
+INDEX_SUFFIX = '.idx'
+DEFAULT_INTERVAL = 10000
+
+# columns of an index entry
+EVENT_NO, POSITION, TIMESTAMP, READ_BYTES, WRITE_BYTES, DISCARD_BYTES = \
+        range(6)
+
+
+def index_path_of(path):
+    return path + INDEX_SUFFIX
+
+
+def fingerprint(path, content_addressed=False, sample_bytes=64*KB):
+    """
+    Size and a hash of the head and tail of path, plus its mtime unless
+    path is content_addressed. Entries of the trace cache are named by
+    their content, so the sample is enough for them, and the cache touches
+    them on every hit. Other files may be rewritten with the same head and
+    tail.
+    """
+    st = os.stat(path)
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        h.update(f.read(sample_bytes))
+        if st.st_size > sample_bytes:
+            f.seek(max(sample_bytes, st.st_size - sample_bytes))
+            h.update(f.read(sample_bytes))
+    if content_addressed:
+        return '{}:{}'.format(st.st_size, h.hexdigest())
+    return '{}:{!r}:{}'.format(st.st_size, st.st_mtime, h.hexdigest())
+
+
+def in_trace_cache(conf, path):
+    """
+    Whether path is an entry of the trace cache of conf (see tracecache)
+    """
+    cache_dir = conf.get('trace_cache_dir', None)
+    return cache_dir is not None and \
+            os.path.dirname(os.path.abspath(path)) == \
+            os.path.abspath(cache_dir)
+
+
+def _to_float(value):
+    if value is None or value == 'NA':
+        return None
+    value = float(value)
+    if value != value:
+        # NaN in binary traces
+        return None
+    return value
+
+
+def _text_records(path, event_file_column_names):
+    """
+    Yield (position, timestamp, operation, size, action) of every event
+    """
+    i_op = event_file_column_names.index('operation')
+    i_size = event_file_column_names.index('size')
+    if 'timestamp' in event_file_column_names:
+        i_ts = event_file_column_names.index('timestamp')
+    else:
+        i_ts = None
+    if 'action' in event_file_column_names:
+        i_action = event_file_column_names.index('action')
+    else:
+        i_action = None
+
+    pos = 0
+    with open(path, 'rb') as f:
+        for line in f:
+            line_pos = pos
+            pos += len(line)
+            items = line.split()
+            if len(items) == 0:
+                continue
+            if i_ts is None:
+                ts = None
+            else:
+                ts = items[i_ts]
+            if i_action is None:
+                action = 'D'
+            else:
+                action = items[i_action]
+            yield line_pos, ts, items[i_op], int(items[i_size]), action
+
+
+# operation names in text event files, by bintrace operation code
+OPERATION_NAMES = ('read', 'write', 'discard')
+
+def _binary_records(path):
+    reader = bintrace.BinaryTraceReader(path)
+    try:
+        for i, row in enumerate(reader.iter_rows()):
+            offset, size, timestamp, pre_wait_time, pid, op_code, action, \
+                    sync = row
+            yield i, timestamp, OPERATION_NAMES[op_code], size, chr(action)
+    finally:
+        reader.close()
+
+
+class TraceIndex(object):
+    def __init__(self, path, binary, interval, entries, n_events, source):
+        self.path = path
+        self.binary = binary
+        self.interval = interval
+        self.entries = entries
+        self.n_events = n_events
+        self.source = source
+
+        self._timestamps = [e[TIMESTAMP] for e in entries]
+        self._rw_bytes = [e[READ_BYTES] + e[WRITE_BYTES] for e in entries]
+
+    @classmethod
+    def build(cls, path, event_file_column_names,
+            interval=DEFAULT_INTERVAL, content_addressed=False):
+        """
+        Scan the event file at path once and index it
+        """
+        if compressedfile.is_compressed(path):
+            raise RuntimeError("Cannot index compressed file {}".format(path))
+
+        binary = bintrace.is_binary_trace(path)
+        if binary:
+            records = _binary_records(path)
+        else:
+            records = _text_records(path, event_file_column_names)
+
+        cum = {'read': 0, 'write': 0, 'discard': 0}
+        entries = []
+        n = 0
+        for pos, ts, op, size, action in records:
+            if n % interval == 0:
+                entries.append([n, pos, _to_float(ts),
+                    cum['read'], cum['write'], cum['discard']])
+            if action == 'D':
+                cum[op] += size
+            n += 1
+
+        return cls(path, binary, interval, entries, n,
+                fingerprint(path, content_addressed))
+
+    @classmethod
+    def load(cls, path, content_addressed=False):
+        """
+        Load the sidecar index of path. Return None if it does not exist
+        or is out of date.
+        """
+        idx_path = index_path_of(path)
+        if not os.path.exists(idx_path):
+            return None
+        try:
+            with open(idx_path, 'r') as f:
+                d = json.load(f)
+        except ValueError:
+            return None
+        if d.get('version') != INDEX_VERSION or \
+                d.get('source') != fingerprint(path, content_addressed):
+            return None
+        return cls(path, d['binary'], d['interval'], d['entries'],
+                d['n_events'], d['source'])
+
+    def save(self):
+        d = {'version': INDEX_VERSION,
+             'source': self.source,
+             'binary': self.binary,
+             'interval': self.interval,
+             'n_events': self.n_events,
+             'entries': self.entries,
+            }
+        idx_path = index_path_of(self.path)
+        fd, tmp_path = tempfile.mkstemp(prefix='tmp-',
+                dir=os.path.dirname(os.path.abspath(idx_path)))
+        with os.fdopen(fd, 'w') as f:
+            json.dump(d, f)
+        os.rename(tmp_path, idx_path)
+
+    def entry_for_time(self, t):
+        """
+        The last entry whose event is before time t
+        """
+        if None in self._timestamps:
+            raise RuntimeError("{} has no timestamps".format(self.path))
+        i = bisect.bisect_left(self._timestamps, t) - 1
+        return self.entries[max(i, 0)]
+
+    def entry_for_bytes(self, rw_bytes):
+        """
+        The last entry with less than rw_bytes of reads and writes before it
+        """
+        i = bisect.bisect_left(self._rw_bytes, rw_bytes) - 1
+        return self.entries[max(i, 0)]
+
+
+def get_index(conf, path):
+    """
+    Load the index of path, building and saving it if needed
+    """
+    content_addressed = in_trace_cache(conf, path)
+    index = TraceIndex.load(path, content_addressed)
+    if index is None:
+        index = TraceIndex.build(path, conf['event_file_column_names'],
+                conf.get('trace_index_interval', DEFAULT_INTERVAL),
+                content_addressed)
+        index.save()
+    return index
+
+
+class WindowedEventIterator(object):
+    """
+    Events of path from start_at_bytes (of reads and writes) or
+    start_at_time, up to (not including) end_at_time. The index is used to
+    seek close to the start, then the few events before it are skipped.
+    The reads of the events are counted in trace_readings if it is given.
+    """
+    def __init__(self, conf, path, start_at_bytes=None, start_at_time=None,
+            end_at_time=None, trace_readings=None):
+        self.conf = conf
+        self.path = path
+        self.start_at_bytes = start_at_bytes
+        self.start_at_time = start_at_time
+        self.end_at_time = end_at_time
+        self.trace_readings = trace_readings
+
+    def _start_entry(self, index):
+        entries = [index.entries[0]]
+        if self.start_at_bytes is not None:
+            entries.append(index.entry_for_bytes(self.start_at_bytes))
+        if self.start_at_time is not None:
+            entries.append(index.entry_for_time(self.start_at_time))
+        # both conditions must hold, so start from the later one
+        return max(entries, key=lambda e: e[EVENT_NO])
+
+    def _seek(self, entry, binary):
+        if binary:
+            return bintrace.BinaryEventIterator(self.conf, self.path,
+                    start_event=entry[POSITION],
+                    trace_readings=self.trace_readings)
+        else:
+            return hostevent.EventIterator(self.conf,
+                    hostevent.FileLineIterator(self.path,
+                        start_offset=entry[POSITION],
+                        trace_readings=self.trace_readings))
+
+    def __iter__(self):
+        if self.start_at_bytes is None and self.start_at_time is None:
+            events = bintrace.event_iterator(self.conf, self.path,
+                    trace_readings=self.trace_readings)
+            rw_bytes = 0
+        else:
+            index = get_index(self.conf, self.path)
+            if index.n_events == 0:
+                return
+            entry = self._start_entry(index)
+            events = self._seek(entry, index.binary)
+            rw_bytes = entry[READ_BYTES] + entry[WRITE_BYTES]
+
+        started = False
+        for event in events:
+            if not started:
+                if self.start_at_bytes is not None and \
+                        rw_bytes < self.start_at_bytes:
+                    if event.action == 'D' and \
+                            event.operation in (OP_READ, OP_WRITE):
+                        rw_bytes += event.size
+                    continue
+                if self.start_at_time is not None and \
+                        float(event.timestamp) < self.start_at_time:
+                    continue
+                started = True
+
+            if self.end_at_time is not None and \
+                    float(event.timestamp) >= self.end_at_time:
+                break
+
+            yield event
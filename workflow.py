@@ -6,6 +6,7 @@ from commons import *
 from utilities.utils import *
 import wiscsim
 from wiscsim.simulator import create_simulator
+from wiscsim import profiling
 import workrunner
 
 
@@ -17,6 +18,8 @@ def run_workflow(conf):
 class Workflow(object):
     def __init__(self, conf):
         self.conf = conf
+        # progress.TraceReadings of the workload's event files, if it has
+        self.trace_readings = None
 
     def run(self):
         self._save_conf()
@@ -41,11 +44,13 @@ class Workflow(object):
         if workload_src == WLRUNNER:
             runner = workrunner.wlrunner.WorkloadRunner(self.conf)
             event_iter = runner.run()
+            self.trace_readings = runner.trace_readings
         elif workload_src == LBAGENERATOR:
             classname = self.conf['lba_workload_class']
             cls = eval("workrunner.lbaworkloadgenerator.{}".format(classname))
             lbagen = cls(self.conf)
             event_iter = lbagen
+            self.trace_readings = getattr(lbagen, 'trace_readings', None)
         elif workload_src == LBAMULTIPROC:
             classname = self.conf['lba_workload_class']
             cls = "workrunner.lbaworkloadgenerator.{}".format(classname)
@@ -61,8 +66,16 @@ class Workflow(object):
         if self.conf['enable_simulation'] is not True:
             return
 
+        if self.conf['workload_src'] == WLRUNNER and \
+                workrunner.onlinesim.is_enabled(self.conf):
+            # simulated while the workload ran
+            return
+
         simulator = create_simulator(self.conf['simulator_class'], self.conf,
-                event_iter )
-        simulator.run()
+                event_iter, trace_readings=self.trace_readings)
+        if self.conf.get('profile_simulation', False) is True:
+            profiling.profile(simulator.run, self.conf['result_dir'])
+        else:
+            simulator.run()
 
 
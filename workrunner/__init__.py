@@ -1,2 +1,3 @@
 import wlrunner
 import lbaworkloadgenerator
+import onlinesim
@@ -3,7 +3,7 @@ import random
 
 import config
 import workload
-from wiscsim import hostevent
+from wiscsim import checkpoint, hostevent, progress, tracecache, traceindex
 from commons import *
 
 from pyreuse.general.zipf import ZipfGenerator
@@ -399,15 +399,12 @@ class AccessesWithDist(LBAWorkloadGenerator):
 
 
 class BarrierGen(object):
-    def __init__(self, n_ncq_slots):
-        self.n_ncq_slots = n_ncq_slots
-
+    """
+    The NCQ drains the requests before a barrier and holds back the ones
+    after it, see NCQSingleQueue
+    """
     def barrier_events(self):
-        for i in range(self.n_ncq_slots):
-            yield hostevent.ControlEvent(operation=OP_NOOP)
         yield hostevent.ControlEvent(operation=OP_BARRIER)
-        for i in range(self.n_ncq_slots):
-            yield hostevent.ControlEvent(operation=OP_NOOP)
 
 
 class BlktraceEvents(LBAWorkloadGenerator):
@@ -424,16 +421,31 @@ class BlktraceEvents(LBAWorkloadGenerator):
 
         self.stop_on_bytes = self.conf['stop_sim_on_bytes']
 
+        # replay only a window of the target workload, located with
+        # wiscsim/traceindex.py
+        lba_confs = self.conf['lba_workload_configs']
+        self.start_at_bytes = lba_confs.get('start_at_bytes', None)
+        self.start_at_time = lba_confs.get('start_at_time', None)
+        self.end_at_time = lba_confs.get('end_at_time', None)
+
         if str(self.stop_on_bytes).lower() in ('inf', 'infinity', 'infinit'):
             self.stop_on_bytes = float('inf')
 
+        # what is read of the event files, for the simulator's progress
+        self.trace_readings = progress.TraceReadings()
+
     def __iter__(self):
-        barriergen = BarrierGen(self.conf.ssd_ncq_depth())
+        barriergen = BarrierGen()
 
         yield hostevent.ControlEvent(operation=OP_DISABLE_RECORDER)
 
-        # mkfs events
-        for event in self.prepfs_events():
+        # mkfs events, unless the simulation starts from a checkpoint
+        # taken after them
+        if self.conf.get('checkpoint_restore_path', None) is None:
+            for event in self.prepfs_events():
+                yield event
+
+        for event in checkpoint.save_events(self.conf):
             yield event
 
         # target workload event
@@ -449,23 +461,28 @@ class BlktraceEvents(LBAWorkloadGenerator):
         yield hostevent.ControlEvent(operation=OP_REC_BW)
 
     def prepfs_events(self):
-        prepfs_line_iter = hostevent.FileLineIterator(self.mkfs_event_path)
-        event_prepfs_iter = hostevent.EventIterator(self.conf, prepfs_line_iter)
+        event_prepfs_iter = tracecache.event_iterator(self.conf,
+                self.mkfs_event_path, trace_readings=self.trace_readings)
 
         for event in event_prepfs_iter:
             yield event
 
     def target_workload_events(self):
         # special event indicates the start of workload
-        barriergen = BarrierGen(self.conf.ssd_ncq_depth())
+        barriergen = BarrierGen()
         yield hostevent.ControlEvent(operation=OP_ENABLE_RECORDER)
         for req in barriergen.barrier_events():
             yield req
         yield hostevent.ControlEvent(operation=OP_REC_TIMESTAMP,
                 arg1='interest_workload_start')
 
-        workload_line_iter = hostevent.FileLineIterator(self.ftlsim_event_path)
-        event_workload_iter = hostevent.EventIterator(self.conf, workload_line_iter)
+        event_workload_iter = traceindex.WindowedEventIterator(self.conf,
+                tracecache.resolve_event_file(self.conf,
+                    self.ftlsim_event_path),
+                start_at_bytes=self.start_at_bytes,
+                start_at_time=self.start_at_time,
+                end_at_time=self.end_at_time,
+                trace_readings=self.trace_readings)
 
         total_rw_bytes = 0
         for event in event_workload_iter:
@@ -484,7 +501,7 @@ class BlktraceEvents(LBAWorkloadGenerator):
                 arg1='interest_workload_end')
 
     def gc_event(self):
-        barriergen = BarrierGen(self.conf.ssd_ncq_depth())
+        barriergen = BarrierGen()
         if self.conf['do_gc_after_workload'] is True:
             for req in barriergen.barrier_events():
                 yield req
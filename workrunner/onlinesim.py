@@ -0,0 +1,180 @@
+"""
+Simulate while the workload runs.
+
+blkparse's stdout is parsed into events as it is printed, and the events are
+sent in batches through a bounded queue to a simulator running in another
+process. No blkparse output or event file is written.
+
+    WorkloadRunner (main thread)   starts and stops tracing, runs workloads
+    feeder thread                  blkparse stdout -> events -> queue
+    simulator process              queue -> SimulatorDESNew
+
+If the simulator falls behind, the queue fills up, the feeder blocks and so
+does blkparse. Keep online_queue_batches large enough, otherwise blktrace
+may drop events (it reports them when it stops).
+"""
+import heapq
+import multiprocessing
+import Queue
+import threading
+
+from pyreuse.sysutils import blocktrace
+from wiscsim import hostevent
+from wiscsim.simulator import create_simulator
+from commons import *
+
+
+def is_enabled(conf):
+    return conf.get('online_simulation', False) is True and \
+            conf['enable_blktrace'] is True and \
+            conf['enable_simulation'] is True
+
+
+TRANSLATION = {'read': OP_READ, 'write': OP_WRITE, 'discard': OP_DISCARD}
+
+def row_to_event(row, sector_size):
+    """
+    The Event that the event file line of row would be decoded to.
+    pre_wait_time is filled later.
+    """
+    return hostevent.new_event(sector_size, int(row['pid']),
+            TRANSLATION[row['operation']], row['offset'], row['size'],
+            row['timestamp'], 'NA', row['sync'], row['action'])
+
+
+def _sorted_in_window(line_iter, sector_size, padding_bytes, reorder_events):
+    heap = []
+    seq = 0
+    for line in line_iter:
+        line = line.strip()
+        if not blocktrace.is_data_line(line):
+            continue
+        row = blocktrace.parse_data_line(line, sector_size, padding_bytes)
+        event = row_to_event(row, sector_size)
+
+        heapq.heappush(heap, (float(row['timestamp']), seq, event))
+        seq += 1
+        if len(heap) > reorder_events:
+            yield heapq.heappop(heap)
+
+    while len(heap) > 0:
+        yield heapq.heappop(heap)
+
+
+def blkparse_events(line_iter, sector_size, padding_bytes=0,
+        reorder_events=0):
+    """
+    Yield the events of blkparse output lines. Events are sorted by time
+    within a window of reorder_events events, and pre_wait_time is the time
+    since the previous event, as in sorted event files.
+    """
+    prev_ts = None
+    for ts, _, event in _sorted_in_window(line_iter, sector_size,
+            padding_bytes, reorder_events):
+        if prev_ts is None:
+            event.pre_wait_time = 0.0
+        else:
+            # may be negative if the window was too small
+            event.pre_wait_time = max(ts - prev_ts, 0.0)
+        prev_ts = ts
+        yield event
+
+
+def queue_events(queue):
+    """
+    Yield the events of batches from queue, until None
+    """
+    while True:
+        batch = queue.get()
+        if batch is None:
+            break
+        for event in batch:
+            yield event
+
+
+def _simulate_from_queue(conf, queue):
+    simulator = create_simulator(conf['simulator_class'], conf,
+            queue_events(queue))
+    simulator.run()
+
+
+class OnlineSimulation(object):
+    def __init__(self, conf):
+        self.conf = conf
+        self.batch_events = conf['online_batch_events']
+        self.queue = multiprocessing.Queue(
+                maxsize=conf['online_queue_batches'])
+
+        # blktrace | blkparse processes, one per traced phase, handed from
+        # the main thread to the feeder
+        self._tracers = Queue.Queue()
+        self._feeder = None
+        self._feeder_error = None
+        self._sim_proc = None
+
+    def traced_events(self):
+        """
+        Events of the next traced phase, from start_tracing() to
+        stop_tracing(). Must be iterated in the same order as phases are
+        traced.
+        """
+        proc = self._tracers.get()
+        for event in blkparse_events(proc.stdout,
+                sector_size=self.conf['sector_size'],
+                padding_bytes=self.conf['dev_padding'],
+                reorder_events=self.conf['online_reorder_events']):
+            yield event
+        proc.wait()
+
+    def start(self, event_iter):
+        """
+        Start the simulator and feed it event_iter
+        """
+        self._sim_proc = multiprocessing.Process(target=_simulate_from_queue,
+                args=(self.conf, self.queue))
+        self._sim_proc.start()
+
+        self._feeder = threading.Thread(target=self._feed, args=(event_iter,))
+        self._feeder.daemon = True
+        self._feeder.start()
+
+    def _feed(self, event_iter):
+        try:
+            batch = []
+            for event in event_iter:
+                batch.append(event)
+                if len(batch) >= self.batch_events:
+                    self.queue.put(batch)
+                    batch = []
+            if len(batch) > 0:
+                self.queue.put(batch)
+        except Exception as e:
+            self._feeder_error = e
+        finally:
+            self.queue.put(None)
+
+    def start_tracing(self, dev, trace_filter=None):
+        proc = blocktrace.start_blktrace_pipe(dev, trace_filter)
+        self._tracers.put(proc)
+
+    def stop_tracing(self):
+        blocktrace.stop_blktrace_pipe()
+
+    def finish(self):
+        """
+        Wait for the simulator to process all events
+        """
+        self._feeder.join()
+        self._sim_proc.join()
+        if self._feeder_error is not None:
+            raise RuntimeError("Feeding online simulation failed: {}".format(
+                self._feeder_error))
+        if self._sim_proc.exitcode != 0:
+            raise RuntimeError("Online simulation failed ({})".format(
+                self._sim_proc.exitcode))
+
+    def abort(self):
+        self.stop_tracing()
+        if self._sim_proc is not None and self._sim_proc.is_alive():
+            self._sim_proc.terminate()
+            self._sim_proc.join()
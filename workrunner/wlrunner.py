@@ -9,7 +9,8 @@ import config
 import cpuhandler
 import filesystem
 import fshelper
-from wiscsim import hostevent
+import onlinesim
+from wiscsim import hostevent, bintrace, checkpoint, progress
 from utilities import utils
 import workload
 
@@ -17,15 +18,12 @@ from commons import *
 
 
 class BarrierGen(object):
-    def __init__(self, n_ncq_slots):
-        self.n_ncq_slots = n_ncq_slots
-
+    """
+    The NCQ drains the requests before a barrier and holds back the ones
+    after it, see NCQSingleQueue
+    """
     def barrier_events(self):
-        for i in range(self.n_ncq_slots):
-            yield hostevent.ControlEvent(operation=OP_NOOP)
         yield hostevent.ControlEvent(operation=OP_BARRIER)
-        for i in range(self.n_ncq_slots):
-            yield hostevent.ControlEvent(operation=OP_NOOP)
 
 
 class WorkloadRunner(object):
@@ -47,9 +45,15 @@ class WorkloadRunner(object):
             to_ftlsim_path = self.conf.get_ftlsim_events_output_path_mkfs(),
             sector_size = self.conf['sector_size'],
             padding_bytes = self.conf['dev_padding'],
-            do_sort = self.conf['sort_block_trace']
+            do_sort = self.conf['sort_block_trace'],
+            sort_mem_budget = self.conf.get('sort_block_trace_mem_budget', None),
+            binary_trace = self.conf.get('blktrace_binary_output', False),
+            parse_workers = self.conf.get('blkparse_workers', 1)
             )
 
+        # what is read of the event files, for the simulator's progress
+        self.trace_readings = progress.TraceReadings()
+
         # blktracer for running workload
         self.blktracer = blocktrace.BlockTraceManager(
             dev = self.conf['device_path'],
@@ -58,7 +62,10 @@ class WorkloadRunner(object):
             to_ftlsim_path = self.conf.get_ftlsim_events_output_path(),
             sector_size = self.conf['sector_size'],
             padding_bytes = self.conf['dev_padding'],
-            do_sort = self.conf['sort_block_trace']
+            do_sort = self.conf['sort_block_trace'],
+            sort_mem_budget = self.conf.get('sort_block_trace_mem_budget', None),
+            binary_trace = self.conf.get('blktrace_binary_output', False),
+            parse_workers = self.conf.get('blkparse_workers', 1)
             )
 
         self.aging_workload = eval("workload.{wlclass}(confobj = self.conf, " \
@@ -176,7 +183,9 @@ class WorkloadRunner(object):
     def run(self):
         self.__set_linux_environment()
 
-        if self.conf['enable_blktrace'] == True:
+        if onlinesim.is_enabled(self.conf):
+            return self.run_with_online_simulation()
+        elif self.conf['enable_blktrace'] == True:
             return self.run_with_blktrace()
         else:
             return self.run_without_blktrace()
@@ -218,10 +227,7 @@ class WorkloadRunner(object):
             # strat blktrace
             # This is only for making and mounting file system, because we
             # want to separate them with workloads.
-            if self.conf['trace_issue_and_complete'] is True:
-                trace_filter=['issue', 'complete']
-            else:
-                trace_filter=['issue']
+            trace_filter = self._trace_filter()
 
             self.blktracer_prepfs.start_tracing_and_collecting(trace_filter=trace_filter)
             time.sleep(1)
@@ -242,6 +248,8 @@ class WorkloadRunner(object):
             self.blktracer_prepfs.stop_tracing_and_collecting()
             time.sleep(1)
             self.blktracer_prepfs.create_event_file_from_blkparse()
+            self._convert_event_file(
+                    self.conf.get_ftlsim_events_output_path_mkfs())
 
             self.blktracer.start_tracing_and_collecting(trace_filter=trace_filter)
 
@@ -274,12 +282,83 @@ class WorkloadRunner(object):
             self.blktracer.stop_tracing_and_collecting()
             utils.shcmd("sync")
             self.blktracer.create_event_file_from_blkparse()
+            self._convert_event_file(self.conf.get_ftlsim_events_output_path())
             # self.remove_raw_trace()
             return self.get_event_iterator()
         finally:
             # always try to clean up the blktrace processes
             self.blktracer.stop_tracing_and_collecting()
 
+    def run_with_online_simulation(self):
+        """
+        Same phases as run_with_blktrace(), but the simulator runs while
+        they are traced (see onlinesim.py). Return None, since there is
+        nothing left to simulate.
+        """
+        online = onlinesim.OnlineSimulation(self.conf)
+        online.start(self.get_event_iterator(
+            prepfs_iter=online.traced_events(),
+            workload_iter=online.traced_events()))
+
+        try:
+            cpuhandler.set_cpus(self.conf['n_online_cpus'])
+
+            self.prepare_device()
+
+            trace_filter = self._trace_filter()
+            online.start_tracing(self.conf['device_path'], trace_filter)
+
+            self.build_fs()
+
+            print '----------------------------------------------------'
+            print '---------Running Aging Workload-------------------'
+            print '----------------------------------------------------'
+            self.aging_workload.run()
+            utils.drop_caches()
+
+            time.sleep(1)
+            online.stop_tracing()
+
+            online.start_tracing(self.conf['device_path'], trace_filter)
+
+            print 'Running workload ..................'
+            self._pre_target_workload()
+
+            print '----------------------------------------------------'
+            print '---------Running       TARGET workload-------------------'
+            print '----------------------------------------------------'
+            start_time = datetime.datetime.now()
+            self.workload.run()
+            end_time = datetime.datetime.now()
+
+            app_duration = end_time - start_time
+            print 'Application duration >>>>>>>>>', app_duration.total_seconds()
+            self.write_app_duration(app_duration.total_seconds())
+
+            self._post_target_workload()
+            time.sleep(1) # has to sleep here so the blktrace gets all the data
+            online.stop_tracing()
+        except Exception:
+            online.abort()
+            raise
+
+        online.finish()
+        return None
+
+    def _trace_filter(self):
+        if self.conf['trace_issue_and_complete'] is True:
+            return ['issue', 'complete']
+        else:
+            return ['issue']
+
+    def _convert_event_file(self, event_file_path):
+        if self.conf.get('binary_event_file', False) is not True:
+            return
+
+        bintrace.convert_text_to_binary(event_file_path,
+                bintrace.binary_path_of(event_file_path),
+                self.conf['event_file_column_names'])
+
     def write_app_duration(self, secs):
         path = os.path.join(self.conf['result_dir'], 'app_duration.txt')
         with open(path, 'w') as f:
@@ -323,17 +402,30 @@ class WorkloadRunner(object):
 
         utils.table_to_file(extents_list, extent_path, width=0)
 
-    def get_event_iterator(self):
-        barriergen = BarrierGen(self.conf.ssd_ncq_depth())
+    def get_event_iterator(self, prepfs_iter=None, workload_iter=None):
+        """
+        prepfs_iter and workload_iter are the events of the two traced
+        phases. None: read them from the event files.
+        """
+        barriergen = BarrierGen()
 
         yield hostevent.ControlEvent(operation=OP_DISABLE_RECORDER)
 
-        # mkfs events
-        for event in self.prepfs_events():
+        # mkfs events, unless the simulation starts from a checkpoint
+        # taken after them
+        if self.conf.get('checkpoint_restore_path', None) is None:
+            for event in self.prepfs_events(prepfs_iter):
+                yield event
+        elif prepfs_iter is not None:
+            # online simulation, the traced phase has to be read anyway
+            for event in prepfs_iter:
+                pass
+
+        for event in checkpoint.save_events(self.conf):
             yield event
 
         # target workload event
-        for event in self.target_workload_events():
+        for event in self.target_workload_events(workload_iter):
             yield event
 
         # may send gc trigger
@@ -344,26 +436,28 @@ class WorkloadRunner(object):
             yield req
         yield hostevent.ControlEvent(operation=OP_REC_BW)
 
-    def prepfs_events(self):
-        prepfs_line_iter = hostevent.FileLineIterator(
-            self.conf.get_ftlsim_events_output_path_mkfs())
-        event_prepfs_iter = hostevent.EventIterator(self.conf, prepfs_line_iter)
+    def prepfs_events(self, event_prepfs_iter=None):
+        if event_prepfs_iter is None:
+            event_prepfs_iter = bintrace.event_iterator(self.conf,
+                self.conf.get_ftlsim_events_output_path_mkfs(),
+                trace_readings=self.trace_readings)
 
         for event in event_prepfs_iter:
             yield event
 
-    def target_workload_events(self):
+    def target_workload_events(self, event_workload_iter=None):
         # special event indicates the start of workload
-        barriergen = BarrierGen(self.conf.ssd_ncq_depth())
+        barriergen = BarrierGen()
         yield hostevent.ControlEvent(operation=OP_ENABLE_RECORDER)
         for req in barriergen.barrier_events():
             yield req
         yield hostevent.ControlEvent(operation=OP_REC_TIMESTAMP,
                 arg1='interest_workload_start')
 
-        workload_line_iter = hostevent.FileLineIterator(
-            self.conf.get_ftlsim_events_output_path())
-        event_workload_iter = hostevent.EventIterator(self.conf, workload_line_iter)
+        if event_workload_iter is None:
+            event_workload_iter = bintrace.event_iterator(self.conf,
+                self.conf.get_ftlsim_events_output_path(),
+                trace_readings=self.trace_readings)
 
         for event in event_workload_iter:
             yield event
@@ -374,7 +468,7 @@ class WorkloadRunner(object):
                 arg1='interest_workload_end')
 
     def gc_event(self):
-        barriergen = BarrierGen(self.conf.ssd_ncq_depth())
+        barriergen = BarrierGen()
         if self.conf['do_gc_after_workload'] is True:
             for req in barriergen.barrier_events():
                 yield req